@@ -0,0 +1,393 @@
+"""
+Headless HTTP API for the reply pipeline.
+
+Exposes OCR, context retrieval, reply generation, tone adjustment and conversation
+starters without Streamlit, so compute can scale (and be load-tested) independently
+of UI sessions. Run with:
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+Every request is traced under a request id (taken from a valid incoming X-Request-ID,
+else generated) and the id is echoed in the X-Request-ID response header.
+
+Every pipeline request takes a slot from a bounded worker pool. Requests beyond
+API_MAX_CONCURRENCY wait in a queue of up to API_MAX_QUEUE; past that (or after
+waiting API_QUEUE_TIMEOUT_SECONDS) they get 429 with a Retry-After estimate.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
+
+from image_prep import prepare_image_for_vision
+from llm_backend import LLMUnavailableError, llm
+from metrics import CONTENT_TYPE, REGISTRY, callback_metric
+from model_router import is_auto, router
+from ocr import extract_text_from_image_async
+from semantic_cache import resolve_scope
+from starters import generate_starters, generate_starters_async
+from suggestor import (
+    DEFAULT_PRINCIPLES,
+    build_reply_messages,
+    clean_reply,
+    generate_adjusted_tone_async,
+    generate_suggested_reply_async,
+    get_context_for_reply_async,
+    lookup_cached_reply_async,
+)
+from tracing import start_trace, wrap
+
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "8"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "32"))
+API_QUEUE_TIMEOUT_SECONDS = float(os.getenv("API_QUEUE_TIMEOUT_SECONDS", "10"))
+API_MAX_IMAGE_BYTES = int(os.getenv("API_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+# Incoming request ids are reused as trace ids only if they are already in trace-id form.
+_TRACE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ====== ADMISSION CONTROL ======
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """Bounded concurrency with a bounded wait queue. Single event loop, so no locking needed."""
+
+    def __init__(self, max_concurrency=API_MAX_CONCURRENCY, max_queue=API_MAX_QUEUE,
+                 queue_timeout=API_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = None
+        self.active = 0
+        self.queued = 0
+        self.avg_seconds = 2.0
+        self.stats = {"accepted": 0, "rejected": 0, "timed_out": 0}
+
+    def retry_after(self):
+        # Time for the queue ahead to drain through the pool, at least a second.
+        backlog = self.queued + self.active
+        return max(1, int(round(backlog * self.avg_seconds / max(1, self.max_concurrency))))
+
+    async def acquire(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.active + self.queued >= self.max_concurrency + self.max_queue:
+            self.stats["rejected"] += 1
+            raise Overloaded(self.retry_after())
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise Overloaded(self.retry_after())
+        finally:
+            self.queued -= 1
+        self.active += 1
+        self.stats["accepted"] += 1
+        return time.time()
+
+    def release(self, started_at):
+        self.active -= 1
+        self.avg_seconds = 0.2 * (time.time() - started_at) + 0.8 * self.avg_seconds
+        self._semaphore.release()
+
+    def snapshot(self):
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "avg_seconds": round(self.avg_seconds, 3),
+            **self.stats,
+        }
+
+
+pool = WorkerPool()
+app = FastAPI(title="Huddle Assistant API")
+
+API_POOL = callback_metric("api_pool", "API worker pool: active/queued requests and admission outcomes.", "gauge", ["field"])
+API_POOL.add_source(lambda: [({"field": k}, v) for k, v in pool.snapshot().items()])
+
+
+@app.middleware("http")
+async def _trace_request(request: Request, call_next):
+    incoming_id = request.headers.get("x-request-id", "").lower()
+    request_id = incoming_id if _TRACE_ID_PATTERN.match(incoming_id) else None
+    with start_trace(f"{request.method} {request.url.path}", request_id=request_id) as root:
+        response = await call_next(request)
+        root.set(status_code=response.status_code)
+    if root.trace_id:
+        response.headers["X-Request-ID"] = root.trace_id
+    return response
+
+
+@app.exception_handler(Overloaded)
+async def _overloaded_handler(request, exc):
+    return JSONResponse(
+        status_code=429,
+        content={"error": "overloaded", "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def run_in_pool(coro):
+    """Runs coro inside a worker slot (raises Overloaded -> 429 if none is available)."""
+    try:
+        started_at = await pool.acquire()
+    except Overloaded:
+        coro.close()
+        raise
+    try:
+        return await coro
+    finally:
+        pool.release(started_at)
+
+
+def slot_release(started_at):
+    """Returns an async callable that releases the worker slot exactly once, however often it is called."""
+    released = False
+
+    async def _release():
+        nonlocal released
+        if not released:
+            released = True
+            pool.release(started_at)
+
+    return _release
+
+
+def stream_in_pool(release, events):
+    """
+    Wraps a blocking generator of event dicts as server-sent events. The worker slot
+    (already acquired) is held until the stream finishes or the client disconnects.
+    The response's background task releases it even if the generator never runs.
+    """
+    async def _sse():
+        try:
+            async for event in iterate_in_threadpool(events):
+                yield f"data: {json.dumps(event)}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            await release()
+
+    return StreamingResponse(_sse(), media_type="text/event-stream", background=BackgroundTask(release))
+
+
+def _decode_image(image_base64):
+    try:
+        image_bytes = base64.b64decode(image_base64, validate=True)
+    except Exception:
+        raise HTTPException(status_code=400, detail="image_base64 is not valid base64.")
+    if len(image_bytes) > API_MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large.")
+    return image_bytes
+
+
+# ====== REQUEST MODELS ======
+
+class OCRRequest(BaseModel):
+    image_base64: str
+
+
+class ContextRequest(BaseModel):
+    screenshot_text: str
+    user_draft: str = ""
+
+
+class ReplyRequest(BaseModel):
+    screenshot_text: str
+    user_draft: str = ""
+    model: str = "Auto"
+    principles: str | None = None
+    huddle_context: str | None = None
+    doc_context: str | None = None
+    is_regeneration: bool = False
+    fresh: bool = False
+    user_id: str | None = None
+    stream: bool = False
+
+
+class ToneRequest(BaseModel):
+    reply: str
+    tone: str
+    model: str = "Auto"
+
+
+class StartersRequest(BaseModel):
+    text: str | None = None
+    image_base64: str | None = None
+    n: int = 3
+    bypass_cache: bool = False
+    stream: bool = False
+
+
+# ====== ENDPOINTS ======
+
+@app.get("/healthz")
+async def healthz():
+    return {
+        "ok": llm.available(),
+        "pool": pool.snapshot(),
+        "llm": {"providers": [p.name for p in llm.providers], **llm.stats},
+        "router": router.snapshot(),
+    }
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/v1/ocr")
+async def ocr_endpoint(body: OCRRequest):
+    image_bytes = _decode_image(body.image_base64)
+    text = await run_in_pool(extract_text_from_image_async(image_bytes))
+    return {"text": text}
+
+
+@app.post("/v1/context")
+async def context_endpoint(body: ContextRequest):
+    huddle_context, doc_context, doc_matches = await run_in_pool(
+        get_context_for_reply_async(body.screenshot_text, body.user_draft)
+    )
+    return {"huddle_context": huddle_context, "doc_context": doc_context, "doc_matches": doc_matches}
+
+
+async def _resolve_context(body):
+    if body.huddle_context is not None and body.doc_context is not None:
+        return body.huddle_context, body.doc_context
+    huddle_context, doc_context, _ = await get_context_for_reply_async(body.screenshot_text, body.user_draft)
+    return huddle_context, doc_context
+
+
+@app.post("/v1/reply")
+async def reply_endpoint(body: ReplyRequest):
+    principles = body.principles or DEFAULT_PRINCIPLES
+    if not body.stream:
+        async def _reply():
+            cache_scope = resolve_scope(body.user_id)
+            # Checked before _resolve_context so a cache hit skips retrieval too.
+            cache_checked = not (body.fresh or body.is_regeneration)
+            if cache_checked:
+                cached_reply = await lookup_cached_reply_async(
+                    body.screenshot_text, body.user_draft, body.model, cache_scope=cache_scope
+                )
+                if cached_reply:
+                    return cached_reply
+            huddle_context, doc_context = await _resolve_context(body)
+            return await generate_suggested_reply_async(
+                body.screenshot_text, body.user_draft, principles, body.model,
+                huddle_context, doc_context,
+                is_regeneration=body.is_regeneration, fresh=body.fresh,
+                cache_scope=cache_scope, cache_checked=cache_checked
+            )
+
+        reply = await run_in_pool(_reply())
+        if reply.startswith("Error:"):
+            raise HTTPException(status_code=502, detail=reply)
+        return {"reply": reply}
+
+    # Streaming bypasses the semantic cache and the router's downgrade retry; tokens are
+    # forwarded as they arrive and the cleaned full reply is sent as the final event.
+    release = slot_release(await pool.acquire())
+    try:
+        huddle_context, doc_context = await _resolve_context(body)
+        model = router.choose(body.screenshot_text, body.user_draft, body.is_regeneration)[0] if is_auto(body.model) else body.model
+        messages, _ = await asyncio.to_thread(
+            build_reply_messages, body.screenshot_text, body.user_draft, principles, huddle_context, doc_context,
+            model, is_regeneration=body.is_regeneration
+        )
+
+        def _events():
+            parts = []
+            try:
+                for _, delta in llm.stream(messages, model, temperature=0.75 if body.is_regeneration else 0.65,
+                                           max_tokens=400, timeout=router.deadline(model)):
+                    parts.append(delta)
+                    yield {"delta": delta}
+            except LLMUnavailableError as e:
+                yield {"error": str(e)}
+                return
+            yield {"reply": clean_reply("".join(parts)), "model": model}
+
+        return stream_in_pool(release, _events())
+    except BaseException:
+        await release()
+        raise
+
+
+@app.post("/v1/tone")
+async def tone_endpoint(body: ToneRequest):
+    adjusted = await run_in_pool(generate_adjusted_tone_async(body.reply, body.tone, body.model))
+    return {"reply": adjusted}
+
+
+@app.post("/v1/starters")
+async def starters_endpoint(body: StartersRequest):
+    if not body.text and not body.image_base64:
+        raise HTTPException(status_code=400, detail="Provide text and/or image_base64.")
+    n = max(1, min(body.n, 5))
+    image_bytes = _decode_image(body.image_base64) if body.image_base64 else b""
+    image_hash = hashlib.sha256(image_bytes or (body.text or "").encode("utf-8")).hexdigest()
+
+    async def _prepare():
+        text = body.text
+        if text is None and image_bytes:
+            text = await extract_text_from_image_async(image_bytes)
+        image_url = None
+        if image_bytes:
+            image_url = (await asyncio.to_thread(prepare_image_for_vision, image_bytes))["data_url"]
+        return text or "", image_url
+
+    if not body.stream:
+        async def _starters():
+            text, image_url = await _prepare()
+            return await generate_starters_async(text, image_hash, image_url, n=n, bypass_cache=body.bypass_cache)
+
+        starters, prompt_version = await run_in_pool(_starters())
+        return {"starters": starters, "prompt_version": prompt_version}
+
+    release = slot_release(await pool.acquire())
+    try:
+        text, image_url = await _prepare()
+
+        def _events():
+            # generate_starters reports partials through a callback; a producer thread feeds them
+            # to this generator so each choice's text-so-far is forwarded as it grows.
+            events = queue.Queue()
+
+            def _produce():
+                try:
+                    starters, prompt_version = generate_starters(
+                        text, image_hash, image_url, n=n, bypass_cache=body.bypass_cache,
+                        on_partial=lambda index, text_so_far: events.put({"index": index, "text": text_so_far}),
+                    )
+                    events.put({"starters": starters, "prompt_version": prompt_version})
+                except Exception as e:
+                    events.put({"error": str(e)})
+                finally:
+                    events.put(None)
+
+            threading.Thread(target=wrap(_produce), name="api-starters-stream", daemon=True).start()
+            while (event := events.get()) is not None:
+                yield event
+
+        return stream_in_pool(release, _events())
+    except BaseException:
+        await release()
+        raise
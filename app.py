@@ -14,6 +14,9 @@ import os
 
 load_dotenv()
 
+import metrics
+metrics.start_http_server()  # no-op unless METRICS_PORT is set; runs once per process
+
 st.set_page_config(page_title="Huddle Play Assistant", page_icon="🤝", layout="centered")
 
 init_session_state()
@@ -0,0 +1,80 @@
+"""
+Shared asyncio event loop for the async core.
+
+One loop runs on a daemon thread for the whole process. Async pipeline functions
+(OCR, embeddings, Qdrant, LLM) are scheduled on it, so many in-flight user requests
+are multiplexed on a single thread. Sync callers use run_sync, which blocks only the
+calling thread until the coroutine finishes.
+"""
+import asyncio
+import contextvars
+import threading
+
+from metrics import QUEUE_DEPTH
+
+_loop = None
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop():
+    """Returns the shared event loop, starting its thread on first use."""
+    global _loop, _loop_thread
+    if _loop is None or not _loop_thread.is_alive():
+        with _loop_lock:
+            if _loop is None or not _loop_thread.is_alive():
+                _loop = asyncio.new_event_loop()
+                _loop_thread = threading.Thread(target=_run_loop, args=(_loop,), name="async-core", daemon=True)
+                _loop_thread.start()
+    return _loop
+
+
+async def _in_context(coro, context):
+    # Tasks start from the loop thread's context; carry over the caller's (e.g. the current trace span).
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def submit(coro):
+    """Schedules coro on the shared loop and returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(_in_context(coro, contextvars.copy_context()), get_loop())
+
+
+def run_sync(coro, timeout=None):
+    """Runs coro on the shared loop and waits for its result (thin sync wrapper for existing callers)."""
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync called from the async-core loop; await the coroutine instead.")
+    return submit(coro).result(timeout)
+
+
+def _pending_tasks():
+    if _loop is None or not _loop.is_running():
+        return []
+    return [({"queue": "async_core_tasks"}, len(asyncio.all_tasks(_loop)))]
+
+
+QUEUE_DEPTH.add_source(_pending_tasks)
+
+
+_per_loop_clients = {}
+
+
+def loop_local(name, factory):
+    """
+    Returns one client per (name, running loop). Async SDK clients (grpc, httpx) are bound
+    to the loop they were created on, so they are cached per loop rather than per process.
+    """
+    loop = asyncio.get_running_loop()
+    key = (name, id(loop))
+    client = _per_loop_clients.get(key)
+    if client is None:
+        client = factory()
+        _per_loop_clients[key] = client
+    return client
@@ -0,0 +1,227 @@
+"""
+Batch reply suggestions for a folder (or manifest) of screenshots.
+
+    python batch.py screenshots/ --out results.jsonl
+    python batch.py manifest.csv --out results.jsonl --concurrency 4 --rate 30
+
+A folder input takes every image in it; a draft is read from a sidecar "<image stem>.txt"
+when present, else --draft. A manifest is a .csv (columns: image, draft, optional id) or
+.jsonl (same keys); relative image paths resolve against the manifest's folder.
+
+Each item runs OCR -> retrieval -> generation through the same async core the app uses,
+with at most --concurrency items in flight and at most --rate item starts per minute.
+Results are appended to the JSONL output as they finish, so the output doubles as the
+checkpoint: re-running skips items already written with status "ok" (errors are retried).
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp"}
+STAGES = ("ocr", "cache", "context", "generate")
+
+
+# ====== INPUTS ======
+
+def load_items(source, default_draft=""):
+    """Returns [{"id", "image", "draft"}] from a folder or a .csv/.jsonl manifest."""
+    if os.path.isdir(source):
+        items = []
+        for name in sorted(os.listdir(source)):
+            stem, ext = os.path.splitext(name)
+            if ext.lower() not in IMAGE_EXTENSIONS:
+                continue
+            draft_path = os.path.join(source, f"{stem}.txt")
+            draft = default_draft
+            if os.path.exists(draft_path):
+                with open(draft_path, encoding="utf-8") as f:
+                    draft = f.read().strip()
+            items.append({"id": name, "image": os.path.join(source, name), "draft": draft})
+        return items
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding="utf-8") as f:
+        if source.lower().endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    items = []
+    for row in rows:
+        image = (row.get("image") or "").strip()
+        if not image:
+            continue
+        items.append({
+            "id": (row.get("id") or image).strip(),
+            "image": image if os.path.isabs(image) else os.path.join(base_dir, image),
+            "draft": (row.get("draft") or default_draft).strip(),
+        })
+    return items
+
+
+def load_completed_ids(out_path):
+    """Item ids already written successfully to the output (the resume checkpoint)."""
+    completed = set()
+    if not os.path.exists(out_path):
+        return completed
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a torn last line from an interrupted run
+            if record.get("status") == "ok":
+                completed.add(record.get("id"))
+    return completed
+
+
+# ====== RATE LIMITING ======
+
+class RateLimiter:
+    """Spaces item starts evenly at `per_minute` (0 disables the limit)."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# ====== PIPELINE ======
+
+async def process_item(item, model_name, principles):
+    from ocr import extract_text_from_image_async
+    from suggestor import generate_suggested_reply_async, get_context_for_reply_async, lookup_cached_reply_async
+    from tracing import current_request_id
+
+    timings = {}
+    record = {"id": item["id"], "image": item["image"], "draft": item["draft"], "trace_id": current_request_id()}
+
+    start = time.perf_counter()
+    screenshot_text = await extract_text_from_image_async(item["image"])
+    timings["ocr"] = time.perf_counter() - start
+    record["screenshot_text"] = screenshot_text
+    if not screenshot_text:
+        record.update(status="error", error="OCR returned no text", timings=timings)
+        return record
+
+    start = time.perf_counter()
+    reply = await lookup_cached_reply_async(screenshot_text, item["draft"], model_name)
+    timings["cache"] = time.perf_counter() - start
+    record["cached"] = bool(reply)
+    if not reply:
+        start = time.perf_counter()
+        huddle_context, doc_context, _ = await get_context_for_reply_async(screenshot_text, item["draft"])
+        timings["context"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reply = await generate_suggested_reply_async(
+            screenshot_text, item["draft"], principles, model_name, huddle_context, doc_context,
+            cache_checked=True
+        )
+        timings["generate"] = time.perf_counter() - start
+
+    if reply.startswith("Error:"):
+        record.update(status="error", error=reply, timings=timings)
+    else:
+        record.update(status="ok", reply=reply, timings=timings)
+    return record
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def print_report(records, elapsed):
+    ok = sum(1 for r in records if r.get("status") == "ok")
+    print(f"\n📊 Batch done: {len(records)} processed ({ok} ok, {len(records) - ok} failed) in {elapsed:.1f}s")
+    if records and elapsed > 0:
+        print(f"   Throughput: {len(records) / elapsed * 60:.1f} items/min")
+    for stage in STAGES:
+        samples = [r["timings"][stage] for r in records if stage in r.get("timings", {})]
+        if samples:
+            print(
+                f"   {stage:<9} n={len(samples):<4} mean={sum(samples) / len(samples):.2f}s "
+                f"p50={_percentile(samples, 50):.2f}s p95={_percentile(samples, 95):.2f}s"
+            )
+
+
+async def run_batch(items, out_path, concurrency=4, rate_per_minute=0, model_name="Auto", principles=None):
+    from tracing import start_trace
+
+    if principles is None:
+        from suggestor import DEFAULT_PRINCIPLES
+        principles = DEFAULT_PRINCIPLES
+    completed = load_completed_ids(out_path)
+    pending = [item for item in items if item["id"] not in completed]
+    print(f"🗂️ {len(items)} items, {len(items) - len(pending)} already done, {len(pending)} to process")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate_per_minute)
+    records = []
+    started = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out:
+        async def _run(item):
+            async with semaphore:
+                await limiter.wait()
+                try:
+                    # Each item is its own trace, so its spans can be found by the record's trace_id.
+                    with start_trace("batch.item", item_id=item["id"]):
+                        record = await process_item(item, model_name, principles)
+                except Exception as e:
+                    record = {"id": item["id"], "image": item["image"], "status": "error", "error": str(e)}
+            # Written (and flushed) per item so an interrupted run resumes from here.
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            records.append(record)
+            print(f"[{len(records)}/{len(pending)}] {record['status']}: {item['id']}")
+
+        await asyncio.gather(*(_run(item) for item in pending))
+
+    print_report(records, time.perf_counter() - started)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate reply suggestions for a batch of screenshots.")
+    parser.add_argument("source", help="Folder of screenshots, or a .csv/.jsonl manifest (image, draft[, id])")
+    parser.add_argument("--out", default="batch_results.jsonl", help="JSONL output (also the resume checkpoint)")
+    parser.add_argument("--draft", default="", help="Draft used when an item has none")
+    parser.add_argument("--model", default="Auto", help='Model name, or "Auto" to let the router choose')
+    parser.add_argument("--concurrency", type=int, default=4, help="Items in flight at once")
+    parser.add_argument("--rate", type=float, default=0, help="Max item starts per minute (0 = unlimited)")
+    args = parser.parse_args(argv)
+
+    items = load_items(args.source, args.draft)
+    if not items:
+        print(f"❌ No items found in {args.source}")
+        return 1
+    records = asyncio.run(run_batch(
+        items, args.out, concurrency=max(1, args.concurrency), rate_per_minute=args.rate, model_name=args.model
+    ))
+    return 0 if all(r.get("status") == "ok" for r in records) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,564 @@
+"""
+Local stand-ins for OpenAI, Qdrant, Google Vision and Notion.
+
+Each fake speaks just enough of the real wire protocol for the app's own clients
+(openai, qdrant-client, google-cloud-vision, notion-client) to run unmodified against
+it, adds a configurable latency with jitter to every call, and counts calls per route.
+Responses are deterministic for a given seed so runs are comparable across revisions.
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+EMBEDDING_DIM = 1536
+
+
+class Latency:
+    """Gaussian latency: mean_ms +/- jitter_ms (one standard deviation), never negative."""
+
+    def __init__(self, mean_ms=0.0, jitter_ms=0.0, seed=0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_seconds(self):
+        with self._lock:
+            ms = self._rng.gauss(self.mean_ms, self.jitter_ms) if self.jitter_ms else self.mean_ms
+        return max(0.0, ms) / 1000
+
+    def sleep(self):
+        delay = self.sample_seconds()
+        if delay:
+            time.sleep(delay)
+
+    def describe(self):
+        return {"mean_ms": self.mean_ms, "jitter_ms": self.jitter_ms}
+
+
+def fake_embedding(text, dim=EMBEDDING_DIM):
+    """Deterministic unit vector per text, so identical texts always match exactly."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+# ====== HTTP PLUMBING ======
+
+class FakeHTTPService:
+    """Threaded HTTP server routing (method, path regex) -> handler(match, body) -> (status, json)."""
+
+    name = "fake"
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+        self.routes = []
+        self._server = None
+        self._thread = None
+
+    def route(self, method, pattern, handler, label, latency=None):
+        """Registers a route; latency overrides the service-wide latency for this route."""
+        self.routes.append((method, re.compile(f"^{pattern}$"), handler, label, latency))
+
+    def _dispatch(self, method, path, body):
+        for route_method, pattern, handler, label, latency in self.routes:
+            match = pattern.match(path) if route_method == method else None
+            if match:
+                with self._calls_lock:
+                    self.calls[label] += 1
+                (latency or self.latency).sleep()
+                return handler(match, body)
+        with self._calls_lock:
+            self.calls[f"unhandled {method} {path}"] += 1
+        return 404, {"status": {"error": f"{self.name}: no route for {method} {path}"}}
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except json.JSONDecodeError:
+                    body = {}
+                status, payload = service._dispatch(method, urlparse(self.path).path, body)
+                if isinstance(payload, StreamBody):
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for chunk in payload.chunks:
+                        data = chunk.encode("utf-8")
+                        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                        if payload.delay:
+                            time.sleep(payload.delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_PATCH(self):
+                self._handle("PATCH")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"{self.name}-server", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset_calls(self):
+        with self._calls_lock:
+            self.calls.clear()
+
+
+class StreamBody:
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+
+
+# ====== OPENAI ======
+
+class FakeOpenAI(FakeHTTPService):
+    name = "openai"
+
+    def __init__(self, latency=None, embedding_latency=None, reply_words=40, token_delay_ms=0.0):
+        super().__init__(latency)
+        self.reply_words = reply_words
+        self.token_delay = token_delay_ms / 1000
+        self.route("POST", r"/v1/chat/completions", self._chat, "chat.completions")
+        self.route("POST", r"/v1/embeddings", self._embeddings, "embeddings", latency=embedding_latency)
+
+    def _reply_text(self, messages, index):
+        seed = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8") + bytes([index])).hexdigest()
+        rng = random.Random(seed)
+        words = ["that", "sounds", "great", "what", "got", "you", "started", "love", "this", "tell", "me", "more"]
+        return " ".join(rng.choice(words) for _ in range(self.reply_words)).capitalize() + "?"
+
+    def _chat(self, match, body):
+        n = int(body.get("n") or 1)
+        model = body.get("model", "gpt-4o")
+        prompt_tokens = sum(len(json.dumps(m.get("content", ""))) // 4 for m in body.get("messages", []))
+        texts = [self._reply_text(body.get("messages", []), i) for i in range(n)]
+        created = int(time.time())
+        if body.get("stream"):
+            chunks = []
+            for i, text in enumerate(texts):
+                for word in text.split(" "):
+                    chunks.append("data: " + json.dumps({
+                        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": i, "delta": {"content": word + " "}, "finish_reason": None}],
+                    }) + "\n\n")
+            chunks.append("data: [DONE]\n\n")
+            return 200, StreamBody(chunks, self.token_delay)
+        return 200, {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+            "choices": [
+                {"index": i, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                for i, text in enumerate(texts)
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.reply_words * n,
+                "total_tokens": prompt_tokens + self.reply_words * n,
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        }
+
+    def _embeddings(self, match, body):
+        inputs = body.get("input")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+        return 200, {
+            "object": "list",
+            "model": body.get("model", "text-embedding-3-small"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(str(text))} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+
+# ====== QDRANT ======
+
+def _select_payload(payload, with_payload):
+    if with_payload in (None, False):
+        return None
+    if with_payload is True:
+        return dict(payload)
+    if isinstance(with_payload, dict):
+        include = with_payload.get("include")
+        if include is not None:
+            return {k: v for k, v in payload.items() if k in include}
+        exclude = with_payload.get("exclude") or []
+        return {k: v for k, v in payload.items() if k not in exclude}
+    return {k: v for k, v in payload.items() if k in with_payload}
+
+
+def _matches_condition(payload, condition):
+    key = condition.get("key")
+    match = condition.get("match") or {}
+    value = payload.get(key)
+    if "value" in match:
+        return value == match["value"]
+    if "any" in match:
+        return value in match["any"]
+    if "except" in match:
+        return value not in match["except"]
+    return True
+
+
+def _matches_filter(payload, flt):
+    if not flt:
+        return True
+    must = flt.get("must") or []
+    should = flt.get("should") or []
+    must_not = flt.get("must_not") or []
+    if not all(_matches_condition(payload, c) for c in must):
+        return False
+    if should and not any(_matches_condition(payload, c) for c in should):
+        return False
+    return not any(_matches_condition(payload, c) for c in must_not)
+
+
+def _normalize_id(point_id):
+    if isinstance(point_id, int):
+        return point_id
+    try:
+        return str(uuid.UUID(str(point_id)))
+    except ValueError:
+        return point_id
+
+
+class FakeQdrant(FakeHTTPService):
+    """In-memory Qdrant REST subset: collections, payload indexes, upsert/delete, search/query, scroll, retrieve."""
+
+    name = "qdrant"
+
+    def __init__(self, latency=None):
+        super().__init__(latency)
+        self.collections = {}
+        self._lock = threading.Lock()
+        c = r"/collections/(?P<name>[^/]+)"
+        self.route("GET", r"/", lambda m, b: (200, {"title": "qdrant - vector search engine", "version": "1.14.0"}), "version")
+        self.route("GET", r"/collections", self._list, "collections.list")
+        self.route("GET", c, self._info, "collections.get")
+        self.route("GET", c + r"/exists", self._exists, "collections.exists")
+        self.route("PUT", c, self._create, "collections.create")
+        self.route("DELETE", c, self._delete_collection, "collections.delete")
+        self.route("PUT", c + r"/index", self._ok_operation, "collections.index")
+        self.route("PUT", c + r"/points", self._upsert, "points.upsert")
+        self.route("POST", c + r"/points/delete", self._delete_points, "points.delete")
+        self.route("POST", c + r"/points/search", self._search, "points.search")
+        self.route("POST", c + r"/points/query", self._query, "points.query")
+        self.route("POST", c + r"/points/scroll", self._scroll, "points.scroll")
+        self.route("POST", c + r"/points", self._retrieve, "points.retrieve")
+
+    @staticmethod
+    def _ok(result):
+        return 200, {"result": result, "status": "ok", "time": 0.0}
+
+    def _missing(self, name):
+        return 404, {"status": {"error": f"Not found: Collection `{name}` doesn't exist!"}, "time": 0.0}
+
+    def _list(self, match, body):
+        return self._ok({"collections": [{"name": name} for name in self.collections]})
+
+    def _exists(self, match, body):
+        return self._ok({"exists": match["name"] in self.collections})
+
+    def _info(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is None:
+            return self._missing(match["name"])
+        count = len(collection["points"])
+        return self._ok({
+            "status": "green",
+            "optimizer_status": "ok",
+            "vectors_count": count,
+            "indexed_vectors_count": 0,
+            "points_count": count,
+            "segments_count": 1,
+            "config": {
+                "params": {
+                    "vectors": collection["vectors"],
+                    "shard_number": 1,
+                    "replication_factor": 1,
+                    "write_consistency_factor": 1,
+                    "on_disk_payload": True,
+                },
+                "hnsw_config": {"m": 16, "ef_construct": 100, "full_scan_threshold": 10000,
+                                "max_indexing_threads": 0, "on_disk": False},
+                "optimizer_config": {"deleted_threshold": 0.2, "vacuum_min_vector_number": 1000,
+                                     "default_segment_number": 0, "max_segment_size": None,
+                                     "memmap_threshold": None, "indexing_threshold": 20000,
+                                     "flush_interval_sec": 5, "max_optimization_threads": None},
+                "wal_config": {"wal_capacity_mb": 32, "wal_segments_ahead": 0},
+            },
+            "payload_schema": collection["payload_schema"],
+        })
+
+    def _create(self, match, body):
+        with self._lock:
+            self.collections[match["name"]] = {
+                "vectors": body.get("vectors") or {"size": EMBEDDING_DIM, "distance": "Cosine"},
+                "points": {},
+                "payload_schema": {},
+            }
+        return self._ok(True)
+
+    def _delete_collection(self, match, body):
+        with self._lock:
+            self.collections.pop(match["name"], None)
+        return self._ok(True)
+
+    def _ok_operation(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is not None and body.get("field_name"):
+            schema = body.get("field_schema")
+            data_type = schema if isinstance(schema, str) else (schema or {}).get("type", "keyword")
+            collection["payload_schema"][body["field_name"]] = {"data_type": data_type, "points": 0}
+        return self._ok({"operation_id": 0, "status": "completed"})
+
+    def _upsert(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is None:
+            return self._missing(match["name"])
+        points = body.get("points")
+        if points is None and body.get("batch"):
+            batch = body["batch"]
+            payloads = batch.get("payloads") or [{}] * len(batch["ids"])
+            points = [{"id": i, "vector": v, "payload": p} for i, v, p in zip(batch["ids"], batch["vectors"], payloads)]
+        with self._lock:
+            for point in points or []:
+                collection["points"][_normalize_id(point["id"])] = (point.get("vector"), point.get("payload") or {})
+        return self._ok({"operation_id": 0, "status": "completed"})
+
+    def _delete_points(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is None:
+            return self._missing(match["name"])
+        with self._lock:
+            if "points" in body:
+                for point_id in body["points"]:
+                    collection["points"].pop(_normalize_id(point_id), None)
+            elif "filter" in body:
+                doomed = [pid for pid, (_, payload) in collection["points"].items() if _matches_filter(payload, body["filter"])]
+                for point_id in doomed:
+                    del collection["points"][point_id]
+        return self._ok({"operation_id": 0, "status": "completed"})
+
+    def _scored(self, collection, vector, body, limit):
+        if isinstance(vector, dict):  # named vector form {"name": ..., "vector": [...]}
+            vector = vector.get("vector")
+        with self._lock:
+            items = list(collection["points"].items())
+        hits = []
+        for point_id, (point_vector, payload) in items:
+            if not point_vector or not _matches_filter(payload, body.get("filter")):
+                continue
+            score = sum(a * b for a, b in zip(vector, point_vector))
+            if body.get("score_threshold") is not None and score < body["score_threshold"]:
+                continue
+            hits.append((score, point_id, payload))
+        hits.sort(key=lambda h: -h[0])
+        return [
+            {"id": point_id, "version": 0, "score": score,
+             "payload": _select_payload(payload, body.get("with_payload")), "vector": None}
+            for score, point_id, payload in hits[:limit]
+        ]
+
+    def _search(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is None:
+            return self._missing(match["name"])
+        return self._ok(self._scored(collection, body["vector"], body, int(body.get("limit", 10))))
+
+    def _query(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is None:
+            return self._missing(match["name"])
+        query = body.get("query")
+        if isinstance(query, dict):
+            query = query.get("nearest", query)
+        return self._ok({"points": self._scored(collection, query, body, int(body.get("limit", 10)))})
+
+    def _scroll(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is None:
+            return self._missing(match["name"])
+        with self._lock:
+            items = sorted(collection["points"].items(), key=lambda item: str(item[0]))
+        items = [(pid, payload) for pid, (_, payload) in items if _matches_filter(payload, body.get("filter"))]
+        offset = body.get("offset")
+        start = 0
+        if offset is not None:
+            ids = [str(pid) for pid, _ in items]
+            start = ids.index(str(_normalize_id(offset))) if str(_normalize_id(offset)) in ids else len(items)
+        limit = int(body.get("limit") or 10)
+        page = items[start:start + limit]
+        next_offset = items[start + limit][0] if start + limit < len(items) else None
+        with_payload = body.get("with_payload", True)
+        return self._ok({
+            "points": [{"id": pid, "payload": _select_payload(payload, with_payload), "vector": None} for pid, payload in page],
+            "next_page_offset": next_offset,
+        })
+
+    def _retrieve(self, match, body):
+        collection = self.collections.get(match["name"])
+        if collection is None:
+            return self._missing(match["name"])
+        with_payload = body.get("with_payload", True)
+        points = []
+        for point_id in body.get("ids", []):
+            found = collection["points"].get(_normalize_id(point_id))
+            if found:
+                points.append({"id": _normalize_id(point_id), "payload": _select_payload(found[1], with_payload), "vector": None})
+        return self._ok(points)
+
+
+# ====== NOTION ======
+
+class FakeNotion(FakeHTTPService):
+    """Serves a deterministic huddle database to databases.query with cursor pagination."""
+
+    name = "notion"
+
+    def __init__(self, latency=None, pages=50, seed=0):
+        super().__init__(latency)
+        rng = random.Random(seed)
+        self.pages = [self._page(i, rng) for i in range(pages)]
+        self.route("POST", r"/v1/databases/(?P<db>[^/]+)/query", self._query, "databases.query")
+
+    @staticmethod
+    def _rich_text(text):
+        return {"rich_text": [{"type": "text", "plain_text": text, "text": {"content": text}}]}
+
+    def _page(self, i, rng):
+        topics = ["new job", "kids' school", "weekend hike", "side income", "gym routine", "moving house"]
+        topic = rng.choice(topics)
+        return {
+            "object": "page",
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "last_edited_time": f"2025-01-{1 + i % 28:02d}T10:00:00.000Z",
+            "properties": {
+                "Screenshot Text": self._rich_text(f"Friend {i}: Been so busy with the {topic} lately!"),
+                "User Draft": self._rich_text(f"Ask how the {topic} is going"),
+                "AI Suggested": self._rich_text(f"Sounds like a lot! How's the {topic} treating you?"),
+                "User Final": self._rich_text(f"Wow, how is the {topic} going so far?"),
+            },
+        }
+
+    def _query(self, match, body):
+        page_size = int(body.get("page_size") or 100)
+        start = int(body.get("start_cursor") or 0)
+        results = self.pages[start:start + page_size]
+        has_more = start + page_size < len(self.pages)
+        return 200, {
+            "object": "list",
+            "results": results,
+            "has_more": has_more,
+            "next_cursor": str(start + page_size) if has_more else None,
+        }
+
+
+# ====== GOOGLE VISION (gRPC) ======
+
+class FakeVision:
+    """
+    Plaintext gRPC ImageAnnotator answering BatchAnnotateImages with fixed OCR text.
+    Point ocr.py at it with VISION_API_ENDPOINT=<host:port>.
+    """
+
+    name = "vision"
+
+    def __init__(self, latency=None, text=None):
+        self.latency = latency or Latency()
+        self.text = text or "Friend: Just got back from the gym, so tired!\nMe: Haha nice, how long have you been going?"
+        self.calls = Counter()
+        self._server = None
+        self.port = None
+
+    def _annotate(self, request, context):
+        from google.cloud.vision_v1.types import AnnotateImageResponse, BatchAnnotateImagesResponse, TextAnnotation
+        self.calls["BatchAnnotateImages"] += 1
+        self.latency.sleep()
+        return BatchAnnotateImagesResponse(responses=[
+            AnnotateImageResponse(full_text_annotation=TextAnnotation(text=self.text))
+            for _ in request.requests
+        ])
+
+    def start(self):
+        from concurrent import futures
+
+        import grpc
+        from google.cloud.vision_v1.types import BatchAnnotateImagesRequest, BatchAnnotateImagesResponse
+
+        handler = grpc.method_handlers_generic_handler("google.cloud.vision.v1.ImageAnnotator", {
+            "BatchAnnotateImages": grpc.unary_unary_rpc_method_handler(
+                self._annotate,
+                request_deserializer=BatchAnnotateImagesRequest.deserialize,
+                response_serializer=BatchAnnotateImagesResponse.serialize,
+            ),
+        })
+        self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+        self._server.add_generic_rpc_handlers((handler,))
+        self.port = self._server.add_insecure_port("127.0.0.1:0")
+        self._server.start()
+        return self
+
+    @property
+    def endpoint(self):
+        return f"127.0.0.1:{self.port}"
+
+    def stop(self):
+        if self._server:
+            self._server.stop(0)
+
+    def reset_calls(self):
+        self.calls.clear()
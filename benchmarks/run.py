@@ -0,0 +1,287 @@
+"""
+End-to-end pipeline benchmark against local fake services.
+
+    python -m benchmarks.run --iterations 30 --concurrency 4
+    python -m benchmarks.run --openai-ms 1200 --jitter 0.3 --compare benchmarks/results/<older>.json
+
+Starts fake OpenAI, Qdrant, Vision and Notion servers (benchmarks/fake_services.py), points
+the app at them through its normal environment variables, and drives the real code paths:
+embed_huddles_qdrant, embed_documents_parallel, extract_text_from_image,
+get_context_for_reply, generate_suggested_reply and the full OCR -> retrieve -> generate chain.
+Reports per-stage p50/p95/p99, throughput and calls made to each fake service, and writes
+the results as JSON (tagged with the git revision) for comparison between revisions.
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks.fake_services import FakeNotion, FakeOpenAI, FakeQdrant, FakeVision, Latency
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+DRAFTS = [
+    "Ask how the gym is going",
+    "Say congrats on the new job and ask what they're enjoying",
+    "Mention I started something on the side and ask if they're open to extra income",
+    "Check in about the weekend hike",
+    "Ask how the kids are settling into school",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+# ====== SETUP ======
+
+def start_services(args):
+    def latency(mean_ms, seed):
+        return Latency(mean_ms, mean_ms * args.jitter, seed=args.seed + seed)
+
+    services = {
+        "openai": FakeOpenAI(latency(args.openai_ms, 1), embedding_latency=latency(args.embed_ms, 2)).start(),
+        "qdrant": FakeQdrant(latency(args.qdrant_ms, 3)).start(),
+        "notion": FakeNotion(latency(args.notion_ms, 4), pages=args.pages, seed=args.seed).start(),
+    }
+    try:
+        services["vision"] = FakeVision(latency(args.vision_ms, 5)).start()
+    except ImportError as e:
+        print(f"⚠️ Fake Vision unavailable ({e}); OCR stages will be skipped.")
+    return services
+
+
+def configure_environment(services):
+    """Must run before any app module is imported: they read their config at import time."""
+    os.environ.update({
+        "OPENAI_API_KEY": "bench-key",
+        "OPENAI_BASE_URL": f"{services['openai'].url}/v1",
+        "GEMINI_API_KEY": "",
+        "GOOGLE_API_KEY": "",
+        "QDRANT_URL": services["qdrant"].url,
+        "QDRANT_RESET_COLLECTION": "false",
+        "NOTION_API_KEY": "bench-key",
+        "NOTION_BASE_URL": services["notion"].url,
+        "NOTION_MEMORY_DB_ID": "bench-db",
+        "SEMANTIC_CACHE": "false",
+    })
+    os.environ.pop("QDRANT_API_KEY", None)
+    if "vision" in services:
+        os.environ["VISION_API_ENDPOINT"] = services["vision"].endpoint
+
+
+def make_screenshot_bytes():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (390, 844), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_pdf_dir(docs, paragraphs=30):
+    import fitz
+
+    pdf_dir = tempfile.mkdtemp(prefix="bench-docs-")
+    sentence = "Lead with curiosity, listen for their why, and invite them to learn more when the timing feels right. "
+    for i in range(docs):
+        doc = fitz.open()
+        for p in range(paragraphs):
+            page = doc.new_page() if p % 10 == 0 else doc[-1]
+            page.insert_text((40, 60 + (p % 10) * 60), f"Guide {i} section {p}. " + sentence * 2, fontsize=8)
+        doc.save(os.path.join(pdf_dir, f"guide_{i}.pdf"))
+    return pdf_dir
+
+
+# ====== STAGES ======
+
+def _require_text(text):
+    # ocr.extract_text_from_image reports failures as an empty string.
+    if not text:
+        raise RuntimeError("OCR returned no text")
+    return text
+
+
+def run_stage(name, fn, iterations, concurrency, services):
+    """Runs fn(i) `iterations` times across `concurrency` threads and returns the stage summary."""
+    for service in services.values():
+        service.reset_calls()
+    durations, errors = [], []
+
+    def _one(i):
+        start = time.perf_counter()
+        try:
+            result = fn(i)
+            if isinstance(result, str) and result.startswith("Error:"):
+                raise RuntimeError(result)
+        except Exception as e:
+            errors.append(str(e))
+            return
+        durations.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_one, range(iterations)))
+    wall = time.perf_counter() - wall_start
+
+    summary = {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "ok": len(durations),
+        "errors": len(errors),
+        "wall_seconds": wall,
+        "throughput_per_second": len(durations) / wall if wall else None,
+        "mean": sum(durations) / len(durations) if durations else None,
+        "min": min(durations) if durations else None,
+        "max": max(durations) if durations else None,
+        "p50": percentile(durations, 50),
+        "p95": percentile(durations, 95),
+        "p99": percentile(durations, 99),
+        "calls": {svc_name: dict(service.calls) for svc_name, service in services.items() if service.calls},
+    }
+    if errors:
+        summary["first_error"] = errors[0]
+    print(f"   {name:<26} ok={summary['ok']}/{iterations} p50={_ms(summary['p50'])} p95={_ms(summary['p95'])} "
+          f"p99={_ms(summary['p99'])} {summary['throughput_per_second'] or 0:.2f}/s")
+    return summary
+
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def run_benchmarks(args, services):
+    # App modules are imported only now, after configure_environment().
+    from doc_embedder import embed_documents_parallel
+    from notion_embedder import embed_huddles_qdrant
+    from ocr import extract_text_from_image
+    from suggestor import DEFAULT_PRINCIPLES, generate_suggested_reply, get_context_for_reply
+
+    screenshot_bytes = make_screenshot_bytes()
+    screenshot_text = services["vision"].text if "vision" in services else "Friend: Just got back from the gym!"
+    stages = {}
+
+    print("🏁 Ingest")
+    stages["embed_huddles_full"] = run_stage("embed_huddles_full", lambda i: embed_huddles_qdrant(), 1, 1, services)
+    stages["embed_huddles_incremental"] = run_stage(
+        "embed_huddles_incremental", lambda i: embed_huddles_qdrant(), 1, 1, services
+    )
+    if args.docs:
+        pdf_dir = make_pdf_dir(args.docs)
+        stages["embed_docs"] = run_stage(
+            "embed_docs", lambda i: embed_documents_parallel(pdf_dir, "docs_memory", 1536), 1, 1, services
+        )
+
+    print(f"🏁 Request path ({args.iterations} iterations, concurrency {args.concurrency})")
+    n, c = args.iterations, args.concurrency
+    if "vision" in services:
+        stages["ocr"] = run_stage("ocr", lambda i: _require_text(extract_text_from_image(screenshot_bytes)), n, c, services)
+    stages["context"] = run_stage(
+        "context", lambda i: get_context_for_reply(screenshot_text, DRAFTS[i % len(DRAFTS)]), n, c, services
+    )
+    context = get_context_for_reply(screenshot_text, DRAFTS[0])
+    stages["generate"] = run_stage(
+        "generate",
+        lambda i: generate_suggested_reply(
+            screenshot_text, DRAFTS[i % len(DRAFTS)], DEFAULT_PRINCIPLES, args.model,
+            context[0], context[1], use_cache=False
+        ),
+        n, c, services
+    )
+
+    def _end_to_end(i):
+        text = _require_text(extract_text_from_image(screenshot_bytes)) if "vision" in services else screenshot_text
+        draft = DRAFTS[i % len(DRAFTS)]
+        huddle_ctx, doc_ctx, _ = get_context_for_reply(text, draft)
+        return generate_suggested_reply(text, draft, DEFAULT_PRINCIPLES, args.model, huddle_ctx, doc_ctx, use_cache=False)
+
+    stages["end_to_end"] = run_stage("end_to_end", _end_to_end, n, c, services)
+    return stages
+
+
+# ====== REPORTING ======
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n🔍 vs {baseline.get('revision', '?')[:10]} ({baseline_path})")
+    for name, stage in results["stages"].items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            continue
+        cells = []
+        for metric in ("p50", "p95", "p99"):
+            if stage.get(metric) and old.get(metric):
+                delta = (stage[metric] - old[metric]) / old[metric] * 100
+                cells.append(f"{metric} {_ms(old[metric])}→{_ms(stage[metric])} ({delta:+.0f}%)")
+        print(f"   {name:<26} " + "  ".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the reply pipeline against local fake services.")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model", default="gpt-4o", help='Reply model, or "Auto" to include routing')
+    parser.add_argument("--openai-ms", type=float, default=700, help="Mean chat completion latency")
+    parser.add_argument("--embed-ms", type=float, default=150, help="Mean embeddings latency")
+    parser.add_argument("--qdrant-ms", type=float, default=15)
+    parser.add_argument("--vision-ms", type=float, default=400)
+    parser.add_argument("--notion-ms", type=float, default=250)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency std-dev as a fraction of each mean")
+    parser.add_argument("--pages", type=int, default=60, help="Huddle pages served by fake Notion")
+    parser.add_argument("--docs", type=int, default=3, help="PDFs generated for embed_documents_parallel (0 skips)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="Results JSON path (default: benchmarks/results/<rev>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    services = start_services(args)
+    configure_environment(services)
+    revision = git_revision()
+    try:
+        stages = run_benchmarks(args, services)
+    finally:
+        for service in services.values():
+            service.stop()
+
+    results = {
+        "revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("out", "compare")
+        },
+        "stages": stages,
+    }
+    out_path = args.out
+    if not out_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out_path = os.path.join(RESULTS_DIR, f"{revision[:10]}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {out_path}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0 if all(stage["errors"] == 0 for stage in stages.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
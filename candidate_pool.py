@@ -0,0 +1,139 @@
+"""
+Per-request pool of pre-generated alternative replies for Regenerate.
+
+Opt-in (CANDIDATE_POOL=true). Once the user has clicked Regenerate, a background thread
+asks the model for several distinct angles in one call, drops near-duplicates (by embedding
+similarity against each other and everything already shown) and queues them. Later
+Regenerates pop the next unseen candidate instantly and a refill is started whenever the
+pool runs low. Refills are speculative spend, so they are capped per request and per hour.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from encoder import encode
+from metrics import QUEUE_DEPTH
+from tracing import span, wrap
+
+CANDIDATE_POOL_ENABLED = os.getenv("CANDIDATE_POOL", "false").lower() == "true"
+CANDIDATE_POOL_SIZE = int(os.getenv("CANDIDATE_POOL_SIZE", "3"))
+CANDIDATE_POOL_LOW_WATER = int(os.getenv("CANDIDATE_POOL_LOW_WATER", "1"))
+CANDIDATE_DUPLICATE_THRESHOLD = float(os.getenv("CANDIDATE_DUPLICATE_THRESHOLD", "0.92"))
+CANDIDATE_POOL_MAX_REFILLS_PER_REQUEST = int(os.getenv("CANDIDATE_POOL_MAX_REFILLS_PER_REQUEST", "2"))
+CANDIDATE_POOL_MAX_REFILLS_PER_HOUR = int(os.getenv("CANDIDATE_POOL_MAX_REFILLS_PER_HOUR", "60"))
+REFILL_THREAD_NAME = "candidate-pool-refill"
+QUEUE_DEPTH.add_source(
+    lambda: [({"queue": "candidate_pool_refills"}, sum(1 for t in threading.enumerate() if t.name == REFILL_THREAD_NAME))]
+)
+
+_refill_calls = deque()
+_refill_budget_lock = threading.Lock()
+
+
+def _take_refill_budget():
+    now = time.time()
+    with _refill_budget_lock:
+        while _refill_calls and now - _refill_calls[0] > 3600:
+            _refill_calls.popleft()
+        if len(_refill_calls) >= CANDIDATE_POOL_MAX_REFILLS_PER_HOUR:
+            return False
+        _refill_calls.append(now)
+        return True
+
+
+def request_key(screenshot_text, user_draft, model_name):
+    raw = f"{model_name}\x00{screenshot_text}\x00{user_draft}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def dedupe_by_similarity(candidates, existing=(), threshold=CANDIDATE_DUPLICATE_THRESHOLD):
+    """Keeps candidates whose cosine similarity to every kept/existing reply is below threshold."""
+    candidates = [c for c in candidates if c]
+    if not candidates:
+        return []
+    texts = list(existing) + candidates
+    vectors = np.asarray(encode(texts), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+    kept_vectors = list(vectors[:len(existing)])
+    kept = []
+    for text, vector in zip(candidates, vectors[len(existing):]):
+        if kept_vectors and max(float(np.dot(vector, v)) for v in kept_vectors) >= threshold:
+            continue
+        kept.append(text)
+        kept_vectors.append(vector)
+    return kept
+
+
+class CandidatePool:
+    def __init__(self, key, shown_reply=None):
+        self.key = key
+        self._candidates = deque()
+        self._seen = [shown_reply] if shown_reply else []
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._refills = 0
+
+    def pop(self):
+        """Returns the next unseen candidate, or None if the pool is empty."""
+        with self._lock:
+            if not self._candidates:
+                return None
+            reply = self._candidates.popleft()
+            self._seen.append(reply)
+            return reply
+
+    def mark_seen(self, reply):
+        with self._lock:
+            if reply and reply not in self._seen:
+                self._seen.append(reply)
+
+    def needs_refill(self):
+        with self._lock:
+            return (
+                CANDIDATE_POOL_ENABLED
+                and not self._refilling
+                and self._refills < CANDIDATE_POOL_MAX_REFILLS_PER_REQUEST
+                and len(self._candidates) <= CANDIDATE_POOL_LOW_WATER
+            )
+
+    def refill_async(self, generate_candidates, n=CANDIDATE_POOL_SIZE):
+        """
+        Starts a background refill. generate_candidates(n) must return a list of reply strings.
+        Returns False if the pool is disabled, a refill is already running, or a refill cap is reached.
+        """
+        if not CANDIDATE_POOL_ENABLED:
+            return False
+        with self._lock:
+            if self._refilling or self._refills >= CANDIDATE_POOL_MAX_REFILLS_PER_REQUEST:
+                return False
+            if not _take_refill_budget():
+                print(f"Candidate pool: hourly refill cap ({CANDIDATE_POOL_MAX_REFILLS_PER_HOUR}) reached, skipping")
+                return False
+            self._refilling = True
+            self._refills += 1
+
+        def _run():
+            try:
+                with span("candidate_pool.refill", n=n) as s:
+                    candidates = generate_candidates(n)
+                    with self._lock:
+                        existing = list(self._seen) + list(self._candidates)
+                    fresh = dedupe_by_similarity(candidates, existing)
+                    with self._lock:
+                        self._candidates.extend(fresh)
+                    s.set(generated=len(candidates), kept=len(fresh))
+                print(f"Candidate pool: +{len(fresh)} of {len(candidates)} generated ({len(self._candidates)} queued)")
+            except Exception as e:
+                print(f"Candidate pool refill failed: {e}")
+            finally:
+                with self._lock:
+                    self._refilling = False
+
+        # wrap() keeps the refill's spans under the request that triggered it.
+        threading.Thread(target=wrap(_run), name=REFILL_THREAD_NAME, daemon=True).start()
+        return True
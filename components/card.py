@@ -1,6 +1,7 @@
 # components/card.py
 
 import streamlit as st
+import html
 import re
 import uuid
 import streamlit.components.v1 as components
@@ -113,3 +114,22 @@ def render_polished_card(label, text_content, auto_copy=True):
     </script>
     """
     components.html(script_to_run, height=0)
+
+def render_streaming_card(placeholder, label, text_content):
+    """
+    Lightweight card for text that is still arriving (no copy button or clipboard script).
+    Rendered into an st.empty() placeholder so each update replaces the previous one.
+    """
+    safe_text = html.escape(str(text_content).strip()).replace("\n", "<br>")
+    placeholder.markdown(
+        f"""
+    <div class="custom-card">
+        <div class="card-header-h4">
+            <span>✉️ {label}</span>
+        </div>
+        <div class="clear-both"></div>
+        <div>{safe_text or "…"}</div>
+    </div>
+    """,
+        unsafe_allow_html=True,
+    )
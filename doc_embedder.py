@@ -1,6 +1,7 @@
 from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct, VectorParams, Distance
 from vectorizer import embed_batch
+from qdrant_helpers import make_preview
 import os
 import fitz  # PyMuPDF
 from dotenv import load_dotenv
@@ -50,6 +51,7 @@ def process_file(path, filename, VECTOR_SIZE):
                     vector=vector,
                     payload={
                         "document": chunk,
+                        "preview": make_preview(chunk),
                         "source": filename
                     }
                 )
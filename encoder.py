@@ -0,0 +1,166 @@
+"""
+Process-wide MiniLM sentence encoder shared by every Streamlit session.
+
+The model is loaded once per process and all encode calls go through a single
+worker thread that micro-batches concurrent requests, so one copy of the weights
+lives in RAM and simultaneous queries share a forward pass.
+"""
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from metrics import QUEUE_DEPTH
+
+ENCODER_MODEL_NAME = os.getenv("ENCODER_MODEL_NAME", "all-MiniLM-L6-v2")
+# "torch" (default), "onnx" (needs optimum[onnxruntime]) or "openvino".
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch").lower()
+# "int8" applies dynamic int8 quantization to the Linear layers of the torch backend.
+ENCODER_QUANTIZE = os.getenv("ENCODER_QUANTIZE", "int8").lower()
+ENCODER_MAX_BATCH = int(os.getenv("ENCODER_MAX_BATCH", "32"))
+ENCODER_BATCH_WAIT_MS = float(os.getenv("ENCODER_BATCH_WAIT_MS", "5"))
+# Upper bound on one encode call, including the model load (and download) on first use.
+ENCODER_TIMEOUT_SECONDS = float(os.getenv("ENCODER_TIMEOUT_SECONDS", "120"))
+
+_model = None
+_model_lock = threading.Lock()
+_requests = queue.Queue()
+_worker = None
+QUEUE_DEPTH.add_source(lambda: [({"queue": "encoder"}, _requests.qsize())])
+
+
+def _load_model():
+    from sentence_transformers import SentenceTransformer
+
+    if ENCODER_BACKEND != "torch":
+        try:
+            model = SentenceTransformer(ENCODER_MODEL_NAME, device="cpu", backend=ENCODER_BACKEND)
+            print(f"✅ Encoder loaded: {ENCODER_MODEL_NAME} ({ENCODER_BACKEND} backend)")
+            return model
+        except Exception as e:
+            print(f"⚠️ Encoder backend '{ENCODER_BACKEND}' unavailable ({e}). Falling back to torch.")
+
+    import torch
+
+    torch.set_num_threads(max(1, min(4, os.cpu_count() or 1)))
+    model = SentenceTransformer(ENCODER_MODEL_NAME, device="cpu")
+    if ENCODER_QUANTIZE == "int8":
+        try:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        except Exception as e:
+            print(f"⚠️ int8 quantization failed ({e}). Using fp32 weights.")
+    model.eval()
+    print(f"✅ Encoder loaded: {ENCODER_MODEL_NAME} (torch backend, quantize={ENCODER_QUANTIZE})")
+    return model
+
+
+def get_model():
+    """Returns the shared SentenceTransformer, loading it on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = _load_model()
+    return _model
+
+
+def _fail_queued(error):
+    while True:
+        try:
+            _, future = _requests.get_nowait()
+        except queue.Empty:
+            return
+        if future.set_running_or_notify_cancel():
+            future.set_exception(error)
+
+
+def _run_worker():
+    global _worker
+    try:
+        model = get_model()
+    except Exception as e:
+        print(f"❌ Encoder model failed to load: {e}")
+        # The next encode call starts a fresh worker (and retries the load); fail everyone already waiting.
+        with _model_lock:
+            _worker = None
+        _fail_queued(e)
+        return
+
+    while True:
+        batch = []
+        texts_count = 0
+        item = _requests.get()
+        # Collect whatever else arrives within the batching window.
+        while True:
+            # Requests whose caller timed out while they were queued are cancelled; skip them.
+            if item[1].set_running_or_notify_cancel():
+                batch.append(item)
+                texts_count += len(item[0])
+            if texts_count >= ENCODER_MAX_BATCH:
+                break
+            try:
+                item = _requests.get(timeout=ENCODER_BATCH_WAIT_MS / 1000)
+            except queue.Empty:
+                break
+        if not batch:
+            continue
+
+        all_texts = [text for texts, _ in batch for text in texts]
+        try:
+            vectors = model.encode(all_texts, batch_size=ENCODER_MAX_BATCH, convert_to_numpy=True)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            continue
+
+        offset = 0
+        for texts, future in batch:
+            future.set_result(vectors[offset:offset + len(texts)])
+            offset += len(texts)
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is None or not _worker.is_alive():
+        with _model_lock:
+            if _worker is None or not _worker.is_alive():
+                _worker = threading.Thread(target=_run_worker, name="encoder-worker", daemon=True)
+                _worker.start()
+
+
+def encode(texts):
+    """
+    Encodes a string or list of strings with the shared encoder.
+    :return: a numpy array (one row per text, or a single vector for a string).
+    """
+    single = isinstance(texts, str)
+    batch = [texts] if single else list(texts)
+    if not batch:
+        return []
+    _ensure_worker()
+    future = Future()
+    _requests.put((batch, future))
+    try:
+        vectors = future.result(timeout=ENCODER_TIMEOUT_SECONDS)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
+    return vectors[0] if single else vectors
+
+
+async def encode_async(texts):
+    """Awaitable encode: queues the texts for the worker without blocking the event loop."""
+    single = isinstance(texts, str)
+    batch = [texts] if single else list(texts)
+    if not batch:
+        return []
+    _ensure_worker()
+    future = Future()
+    _requests.put((batch, future))
+    vectors = await asyncio.wait_for(asyncio.wrap_future(future), ENCODER_TIMEOUT_SECONDS)
+    return vectors[0] if single else vectors
+
+
+def embedding_dimension():
+    return get_model().get_sentence_embedding_dimension()
@@ -38,6 +38,15 @@ try:
 except Exception as e:
     print("⚠️ Memory sync failed to start via Popen:", e)
 
+# Optionally start the headless HTTP API alongside Streamlit
+if os.getenv("START_API", "false").lower() == "true":
+    api_port = os.getenv("API_PORT", "8000")
+    try:
+        print(f"Starting HTTP API on port {api_port}...")
+        subprocess.Popen(["uvicorn", "api:app", "--host", "0.0.0.0", f"--port={api_port}"])
+    except Exception as e:
+        print("⚠️ HTTP API failed to start via Popen:", e)
+
 # Start Streamlit
 streamlit_command = [
     "streamlit", "run", "app.py",
@@ -1,10 +1,11 @@
 from notion_client import Client
 import os
 from dotenv import load_dotenv
+from metrics import NOTION_LATENCY, NOTION_REQUESTS, track
 
 load_dotenv()
 
-notion = Client(auth=os.getenv("NOTION_API_KEY"))
+notion = Client(auth=os.getenv("NOTION_API_KEY"), base_url=os.getenv("NOTION_BASE_URL", "https://api.notion.com"))
 database_id = os.getenv("NOTION_MEMORY_DB_ID")
 
 def fetch_huddles():
@@ -12,10 +13,11 @@ def fetch_huddles():
     start_cursor = None
 
     while True:
-        response = notion.databases.query(
-            database_id=database_id,
-            start_cursor=start_cursor
-        )
+        with track(NOTION_REQUESTS, NOTION_LATENCY, operation="databases.query"):
+            response = notion.databases.query(
+                database_id=database_id,
+                start_cursor=start_cursor
+            )
 
         pages = response.get("results", [])
 
@@ -34,7 +36,11 @@ def fetch_huddles():
             huddles.append({
                 "id": page_id,
                 "text": full_text,
-                "last_edited": last_edited
+                "last_edited": last_edited,
+                "screenshot": screenshot_text,
+                "draft": user_draft,
+                "ai": ai_suggested,
+                "final": user_final
             })
 
         if not response.get("has_more"):
@@ -0,0 +1,124 @@
+import base64
+import io
+import math
+import os
+
+from PIL import Image, ImageOps
+
+# ====== CONSTANTS =======
+# GPT-4o "high" detail first fits the image inside 2048x2048, then scales the
+# shortest side down to 768px and bills 170 tokens per 512px tile (+85 base).
+# Anything sent above that resolution is bytes on the wire the model never sees.
+VISION_MAX_LONG_SIDE = 2048
+VISION_MAX_SHORT_SIDE = int(os.getenv("VISION_IMAGE_SHORT_SIDE", "768"))
+VISION_TILE_SIZE = 512
+VISION_BASE_TOKENS = 85
+VISION_TOKENS_PER_TILE = 170
+
+VISION_IMAGE_FORMAT = os.getenv("VISION_IMAGE_FORMAT", "JPEG").upper()
+VISION_IMAGE_QUALITY = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png", "GIF": "image/gif"}
+_MAGIC_NUMBERS = [(b"\xff\xd8\xff", "JPEG"), (b"\x89PNG\r\n\x1a\n", "PNG"), (b"GIF8", "GIF")]
+
+
+def _fit_within(width, height, max_long_side, max_short_side):
+    scale = min(1.0, max_long_side / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, max_short_side / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _detect_format(image_bytes):
+    """The image's real format from PIL's header parse, else from its magic number (JPEG if unknown)."""
+    try:
+        image_format = Image.open(io.BytesIO(image_bytes)).format
+        if image_format in _MIME_TYPES:
+            return image_format
+    except Exception:
+        pass
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "WEBP"
+    for magic, image_format in _MAGIC_NUMBERS:
+        if image_bytes.startswith(magic):
+            return image_format
+    return "JPEG"
+
+
+def estimate_image_tokens(width, height, detail="high"):
+    """
+    Estimates the prompt tokens GPT-4o bills for an image of the given size.
+    """
+    if detail == "low":
+        return VISION_BASE_TOKENS
+    width, height = _fit_within(width, height, VISION_MAX_LONG_SIDE, 768)
+    tiles = math.ceil(width / VISION_TILE_SIZE) * math.ceil(height / VISION_TILE_SIZE)
+    return VISION_BASE_TOKENS + VISION_TOKENS_PER_TILE * tiles
+
+
+def prepare_image_for_vision(image_bytes, max_short_side=None, image_format=None, quality=None):
+    """
+    Downscales and recompresses an uploaded image before it is sent to a vision model.
+    - Applies the EXIF orientation, then drops all metadata.
+    - Resizes to the model's effective tile resolution (never upscales).
+    - Re-encodes to a compact JPEG/WebP at the target quality.
+    :return: dict with the data URL, the encoded bytes and before/after size and token stats.
+             Falls back to the original bytes if the image can't be processed.
+    """
+    max_short_side = max_short_side or VISION_MAX_SHORT_SIDE
+    image_format = (image_format or VISION_IMAGE_FORMAT).upper()
+    quality = quality or VISION_IMAGE_QUALITY
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        original_format = image.format
+        original_size = image.size
+        image = ImageOps.exif_transpose(image)
+
+        target_size = _fit_within(image.width, image.height, VISION_MAX_LONG_SIDE, max_short_side)
+        if target_size != image.size:
+            image = image.resize(target_size, Image.LANCZOS)
+
+        if image_format == "JPEG" and image.mode != "RGB":
+            # JPEG has no alpha channel; flatten onto white like a story background.
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, quality=quality, optimize=True)
+        prepared_bytes = buffer.getvalue()
+    except Exception as e:
+        print(f"Vision prep Error: {e}. Sending original image.")
+        return {
+            "data_url": f"data:{_MIME_TYPES[_detect_format(image_bytes)]};base64,{base64.b64encode(image_bytes).decode('utf-8')}",
+            "bytes": image_bytes,
+            "original_bytes": len(image_bytes),
+            "prepared_bytes": len(image_bytes),
+            "original_tokens": None,
+            "prepared_tokens": None,
+        }
+
+    # Keep the original if it was already smaller (e.g. a tiny, well-compressed JPEG).
+    mime_type = _MIME_TYPES.get(image_format, "image/jpeg")
+    if len(prepared_bytes) >= len(image_bytes) and original_size == image.size and original_format == image_format:
+        prepared_bytes = image_bytes
+
+    stats = {
+        "data_url": f"data:{mime_type};base64,{base64.b64encode(prepared_bytes).decode('utf-8')}",
+        "bytes": prepared_bytes,
+        "original_bytes": len(image_bytes),
+        "prepared_bytes": len(prepared_bytes),
+        "original_tokens": estimate_image_tokens(*original_size),
+        "prepared_tokens": estimate_image_tokens(*image.size),
+    }
+    print(
+        f"Vision prep: {original_size[0]}x{original_size[1]} {original_format} "
+        f"({stats['original_bytes'] / 1024:.0f} KB, ~{stats['original_tokens']} tokens) -> "
+        f"{image.width}x{image.height} {image_format} "
+        f"({stats['prepared_bytes'] / 1024:.0f} KB, ~{stats['prepared_tokens']} tokens). "
+        f"Saved {(stats['original_bytes'] - stats['prepared_bytes']) / 1024:.0f} KB "
+        f"and ~{stats['original_tokens'] - stats['prepared_tokens']} tokens."
+    )
+    return stats
@@ -0,0 +1,207 @@
+"""
+In-process BM25 index over the text stored in Qdrant collections.
+
+Built once per collection from the point payloads (one scroll, no vectors), and updated
+in place when the app stores a new point. After LEXICAL_INDEX_TTL_SECONDS the stale index
+keeps serving while a background thread rebuilds it; failed builds back off exponentially
+instead of re-scrolling Qdrant on every request.
+Unigrams and bigrams are indexed so exact objection phrases ("pyramid scheme",
+"how much do you make") score as phrases rather than loose word overlap.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from qdrant_helpers import get_qdrant_client, read_text_field
+
+LEXICAL_INDEX_TTL_SECONDS = int(os.getenv("LEXICAL_INDEX_TTL_SECONDS", "600"))
+LEXICAL_INDEX_RETRY_SECONDS = int(os.getenv("LEXICAL_INDEX_RETRY_SECONDS", "30"))
+LEXICAL_INDEX_MAX_RETRY_SECONDS = 600
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "i", "if", "in", "is",
+    "it", "its", "me", "my", "of", "on", "or", "so", "that", "the", "this", "to", "was",
+    "we", "with",
+}
+
+
+def tokenize(text):
+    words = _TOKEN_RE.findall((text or "").lower())
+    terms = [w for w in words if w not in _STOPWORDS]
+    # Bigrams keep stopwords so phrases like "how much do you make" survive.
+    terms.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+class BM25Index:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.doc_terms = {}          # point_id -> Counter of terms
+        self.doc_lengths = {}        # point_id -> number of terms
+        self.payloads = {}           # point_id -> {"preview": ..., "source": ...}
+        self.postings = defaultdict(set)
+        self.total_length = 0
+        self.loaded_at = 0.0
+
+    def add(self, point_id, text, payload=None):
+        terms = Counter(tokenize(text))
+        with self._lock:
+            self._remove_locked(point_id)
+            self.doc_terms[point_id] = terms
+            self.doc_lengths[point_id] = sum(terms.values())
+            self.total_length += self.doc_lengths[point_id]
+            self.payloads[point_id] = payload or {}
+            for term in terms:
+                self.postings[term].add(point_id)
+
+    def _remove_locked(self, point_id):
+        terms = self.doc_terms.pop(point_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(point_id, 0)
+        self.payloads.pop(point_id, None)
+        for term in terms:
+            self.postings[term].discard(point_id)
+
+    def search(self, query, limit=10):
+        """Returns [(point_id, score)] best first."""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs or not query_terms:
+                return []
+            avg_length = self.total_length / n_docs
+            scores = defaultdict(float)
+            for term in query_terms:
+                matching = self.postings.get(term)
+                if not matching:
+                    continue
+                idf = math.log(1 + (n_docs - len(matching) + 0.5) / (len(matching) + 0.5))
+                for point_id in matching:
+                    tf = self.doc_terms[point_id][term]
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[point_id] / avg_length)
+                    scores[point_id] += idf * tf * (BM25_K1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_build_locks = {}      # collection -> lock held only while that collection's first build runs
+_rebuilding = set()    # collections with a background rebuild in flight
+_failures = {}         # collection -> (retry_at, backoff seconds) after a failed build
+
+
+def _payload_text(payload):
+    return read_text_field(payload, "document") or payload.get("text") or payload.get("preview") or ""
+
+
+def _build_index(collection_name, client=None):
+    client = client or get_qdrant_client()
+    index = BM25Index()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=256,
+            offset=offset,
+            with_payload=["document", "document_zstd", "text", "preview", "source"],
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            text = _payload_text(payload)
+            if text:
+                index.add(point.id, text, {
+                    "preview": payload.get("preview") or text[:400],
+                    "source": payload.get("source", "unknown source"),
+                })
+        if offset is None:
+            break
+    index.loaded_at = time.time()
+    print(f"✅ Lexical index built for '{collection_name}': {len(index.doc_terms)} documents")
+    return index
+
+
+def _build_and_store(collection_name, client=None):
+    """Builds the index and swaps it in. Returns None (and backs off) if the build fails."""
+    try:
+        index = _build_index(collection_name, client)
+    except Exception as e:
+        with _indexes_lock:
+            backoff = min(_failures.get(collection_name, (0, LEXICAL_INDEX_RETRY_SECONDS / 2))[1] * 2,
+                          LEXICAL_INDEX_MAX_RETRY_SECONDS)
+            _failures[collection_name] = (time.time() + backoff, backoff)
+        print(f"⚠️ Lexical index build failed for '{collection_name}': {e}. Retrying in {backoff:.0f}s.")
+        return None
+    with _indexes_lock:
+        _indexes[collection_name] = index
+        _failures.pop(collection_name, None)
+    return index
+
+
+def _rebuild_in_background(collection_name, client):
+    def _run():
+        try:
+            _build_and_store(collection_name, client)
+        finally:
+            with _indexes_lock:
+                _rebuilding.discard(collection_name)
+
+    threading.Thread(target=_run, name="lexical-index-rebuild", daemon=True).start()
+
+
+def get_lexical_index(collection_name, client=None):
+    """
+    Returns the collection's BM25 index. The first call builds it; once it is stale it keeps
+    being served while a background rebuild runs. Never blocks on another collection's build.
+    """
+    index = _indexes.get(collection_name)
+    if index and time.time() - index.loaded_at < LEXICAL_INDEX_TTL_SECONDS:
+        return index
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        failure = _failures.get(collection_name)
+        if failure and time.time() < failure[0]:
+            return index or BM25Index()
+        if index is not None:
+            if collection_name not in _rebuilding:
+                _rebuilding.add(collection_name)
+                _rebuild_in_background(collection_name, client)
+            return index
+        build_lock = _build_locks.setdefault(collection_name, threading.Lock())
+
+    # First build: concurrent callers for this collection wait for one scroll instead of each running it.
+    with build_lock:
+        index = _indexes.get(collection_name)
+        if index is not None:
+            return index
+        failure = _failures.get(collection_name)
+        if failure and time.time() < failure[0]:
+            return BM25Index()
+        return _build_and_store(collection_name, client) or BM25Index()
+
+
+def add_to_lexical_index(collection_name, point_id, text, payload=None):
+    """Keeps an already-loaded index in step with a point written at ingest."""
+    index = _indexes.get(collection_name)
+    if index is not None:
+        index.add(point_id, text, payload)
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """
+    Fuses several best-first lists of point ids.
+    :return: [(point_id, fused_score)] best first.
+    """
+    scores = defaultdict(float)
+    for ranked in ranked_lists:
+        for rank, point_id in enumerate(ranked):
+            scores[point_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
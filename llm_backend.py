@@ -0,0 +1,439 @@
+"""
+Provider-agnostic chat completion backend.
+
+Messages use the OpenAI chat format everywhere in the app; each provider converts them.
+OpenAI is the primary provider and Gemini the secondary. Every call gets a timeout,
+each provider sits behind a circuit breaker, and non-streaming calls are hedged: if the
+primary hasn't answered within its recent p95 latency, the same request is fired at the
+secondary and whichever finishes first wins. The policy lives in acomplete(); complete()
+runs it on the shared async loop for sync callers.
+"""
+import asyncio
+import base64
+import os
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from async_runtime import loop_local, run_sync
+from metrics import LLM_LATENCY, LLM_REQUESTS, record_llm_usage, track
+from tracing import span
+
+load_dotenv()
+
+LLM_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() == "true"
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1.5"))
+LLM_HEDGE_MAX_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MAX_DELAY_SECONDS", "8"))
+# Hedge delay before enough latency samples exist to estimate a p95.
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "4"))
+LLM_HEDGE_MIN_SAMPLES = 20
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+GEMINI_MODEL_LARGE = os.getenv("GEMINI_MODEL_LARGE", "gemini-1.5-pro")
+GEMINI_MODEL_SMALL = os.getenv("GEMINI_MODEL_SMALL", "gemini-1.5-flash")
+# OpenAI model names that map to Gemini's small tier on failover; everything else maps to large.
+_SMALL_OPENAI_MODELS = {"gpt-3.5-turbo", "gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1-nano"}
+
+
+class LLMUnavailableError(Exception):
+    """Every provider timed out, failed, or is behind an open circuit breaker."""
+
+
+class LLMResult:
+    def __init__(self, texts, provider, model, usage=None):
+        self.texts = texts
+        self.provider = provider
+        self.model = model
+        # {"prompt_tokens", "completion_tokens", "cached_tokens"}
+        self.usage = usage or {}
+
+    @property
+    def text(self):
+        return self.texts[0] if self.texts else ""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; after the cooldown lets a single trial call through."""
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.time() - self._opened_at >= self.cooldown else "open"
+
+    def is_available(self):
+        """Non-mutating check used to plan which providers may be tried."""
+        return self.state != "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at < self.cooldown or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def release_trial(self):
+        """Frees a half-open trial slot for a call that ended without an outcome (cancelled or abandoned)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"⚠️ LLM circuit breaker opened for {self.name}")
+                self._opened_at = time.time()
+
+
+class LatencyWindow:
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+# ====== PROVIDERS ======
+
+class OpenAIProvider:
+    name = "openai"
+
+    def __init__(self):
+        from openai import OpenAI
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set.")
+        # The backend does its own failover, so keep client-side retries short.
+        self.client = OpenAI(api_key=api_key, max_retries=1)
+        self._api_key = api_key
+
+    def model_for(self, model_name):
+        return model_name
+
+    def _async_client(self):
+        from openai import AsyncOpenAI
+        return loop_local("openai-llm", lambda: AsyncOpenAI(api_key=self._api_key, max_retries=1))
+
+    async def acomplete(self, messages, model, temperature, max_tokens, n, timeout):
+        response = await self._async_client().chat.completions.create(
+            model=model, messages=messages, temperature=temperature,
+            max_tokens=max_tokens, n=n, timeout=timeout
+        )
+        return self._result(response, model)
+
+    def _result(self, response, model):
+        usage = {}
+        if getattr(response, "usage", None):
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+            }
+        texts = [choice.message.content or "" for choice in response.choices]
+        return LLMResult(texts, self.name, model, usage)
+
+    def stream(self, messages, model, temperature, max_tokens, n, timeout):
+        """Yields (choice index, text delta) as tokens arrive."""
+        stream = self.client.chat.completions.create(
+            model=model, messages=messages, temperature=temperature,
+            max_tokens=max_tokens, n=n, timeout=timeout, stream=True
+        )
+        for chunk in stream:
+            for choice in chunk.choices:
+                delta = choice.delta.content if choice.delta else None
+                if delta:
+                    yield choice.index, delta
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self):
+        import google.generativeai as genai
+        api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable not set.")
+        genai.configure(api_key=api_key)
+        self.genai = genai
+
+    def model_for(self, model_name):
+        return GEMINI_MODEL_SMALL if model_name in _SMALL_OPENAI_MODELS else GEMINI_MODEL_LARGE
+
+    @staticmethod
+    def _convert(messages):
+        system_parts = []
+        contents = []
+        for message in messages:
+            content = message["content"]
+            if message["role"] == "system":
+                system_parts.append(content)
+                continue
+            parts = []
+            if isinstance(content, str):
+                parts.append(content)
+            else:
+                for part in content:
+                    if part.get("type") == "text":
+                        parts.append(part["text"])
+                    elif part.get("type") == "image_url":
+                        url = part["image_url"]["url"]
+                        if url.startswith("data:"):
+                            header, data = url.split(",", 1)
+                            mime_type = header[len("data:"):].split(";")[0]
+                            parts.append({"mime_type": mime_type, "data": base64.b64decode(data)})
+            contents.append({"role": "model" if message["role"] == "assistant" else "user", "parts": parts})
+        return "\n\n".join(system_parts) or None, contents
+
+    def _request(self, messages, model, temperature, max_tokens, n, timeout):
+        system_instruction, contents = self._convert(messages)
+        gemini_model = self.genai.GenerativeModel(model, system_instruction=system_instruction)
+        kwargs = {
+            "generation_config": self.genai.GenerationConfig(
+                candidate_count=n, temperature=temperature, max_output_tokens=max_tokens
+            ),
+            "request_options": {"timeout": timeout},
+        }
+        return gemini_model, contents, kwargs
+
+    def complete(self, messages, model, temperature, max_tokens, n, timeout):
+        gemini_model, contents, kwargs = self._request(messages, model, temperature, max_tokens, n, timeout)
+        return self._result(gemini_model.generate_content(contents, **kwargs), model)
+
+    async def acomplete(self, messages, model, temperature, max_tokens, n, timeout):
+        gemini_model, contents, kwargs = self._request(messages, model, temperature, max_tokens, n, timeout)
+        return self._result(await gemini_model.generate_content_async(contents, **kwargs), model)
+
+    def _result(self, response, model):
+        texts = []
+        for candidate in response.candidates:
+            parts = getattr(candidate.content, "parts", []) or []
+            texts.append("".join(getattr(p, "text", "") for p in parts))
+        usage = {}
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata:
+            usage = {
+                "prompt_tokens": metadata.prompt_token_count,
+                "completion_tokens": metadata.candidates_token_count,
+                "cached_tokens": getattr(metadata, "cached_content_token_count", 0) or 0,
+            }
+        return LLMResult(texts, self.name, model, usage)
+
+    def stream(self, messages, model, temperature, max_tokens, n, timeout):
+        # Gemini can't stream multiple candidates; return them whole.
+        result = self.complete(messages, model, temperature, max_tokens, n, timeout)
+        for index, text in enumerate(result.texts):
+            yield index, text
+
+
+# ====== BACKEND ======
+
+class LLMBackend:
+    def __init__(self, providers):
+        self.providers = providers
+        self.breakers = {p.name: CircuitBreaker(p.name) for p in providers}
+        self.latency = {p.name: LatencyWindow() for p in providers}
+        self.stats = {"hedged": 0, "hedge_wins": 0, "failovers": 0}
+
+    def available(self):
+        return bool(self.providers)
+
+    def hedge_delay(self, provider):
+        window = self.latency[provider.name]
+        if len(window) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return min(LLM_HEDGE_MAX_DELAY_SECONDS, max(LLM_HEDGE_MIN_DELAY_SECONDS, window.percentile(95)))
+
+    def complete(self, messages, model, temperature=0.7, max_tokens=400, n=1,
+                 timeout=LLM_DEFAULT_TIMEOUT_SECONDS, hedge=None):
+        """
+        Returns an LLMResult from the first provider to succeed.
+        Raises LLMUnavailableError if every allowed provider fails or times out.
+        Sync wrapper around acomplete(); must not be called from the async-core loop.
+        """
+        return run_sync(self.acomplete(messages, model, temperature, max_tokens, n, timeout, hedge))
+
+    async def _acall(self, provider, messages, model, temperature, max_tokens, n, timeout):
+        start = time.time()
+        try:
+            provider_model = provider.model_for(model)
+            with span("llm.provider", provider=provider.name, model=provider_model) as s, \
+                    track(LLM_REQUESTS, LLM_LATENCY, provider=provider.name, model=provider_model):
+                result = await asyncio.wait_for(
+                    provider.acomplete(messages, provider_model, temperature, max_tokens, n, timeout),
+                    timeout
+                )
+                s.set(**(result.usage or {}))
+            record_llm_usage(provider.name, provider_model, result.usage)
+        except Exception:
+            self.breakers[provider.name].record_failure()
+            raise
+        except BaseException:
+            # A losing hedge is cancelled: not a failure, but it may hold the half-open trial.
+            self.breakers[provider.name].release_trial()
+            raise
+        self.breakers[provider.name].record_success()
+        self.latency[provider.name].add(time.time() - start)
+        return result
+
+    async def acomplete(self, messages, model, temperature=0.7, max_tokens=400, n=1,
+                        timeout=LLM_DEFAULT_TIMEOUT_SECONDS, hedge=None):
+        """
+        Hedged, failing-over completion. Provider calls run as tasks on the running loop;
+        losing hedged requests are cancelled rather than left running.
+        Returns an LLMResult or raises LLMUnavailableError.
+        """
+        hedge = LLM_HEDGING if hedge is None else hedge
+        candidates = [p for p in self.providers if self.breakers[p.name].is_available()]
+        if not candidates:
+            raise LLMUnavailableError("All LLM providers are unavailable (circuit breakers open).")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pending = {}
+        launch_reasons = {}
+        errors = []
+        remaining_candidates = list(candidates)
+
+        def _launch(reason):
+            while remaining_candidates:
+                provider = remaining_candidates.pop(0)
+                if not self.breakers[provider.name].allow():
+                    continue
+                remaining = max(0.5, deadline - loop.time())
+                task = asyncio.ensure_future(
+                    self._acall(provider, messages, model, temperature, max_tokens, n, remaining)
+                )
+                pending[task] = provider
+                launch_reasons[task] = reason
+                return provider
+            return None
+
+        primary = _launch("primary")
+        try:
+            while pending:
+                can_add = bool(remaining_candidates)
+                wait_for = deadline - loop.time()
+                if can_add and hedge and len(pending) == 1:
+                    wait_for = min(wait_for, self.hedge_delay(primary))
+                if wait_for <= 0 and not can_add:
+                    break
+                done, _ = await asyncio.wait(list(pending), timeout=max(0.0, wait_for),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append(f"{provider.name}: {e or type(e).__name__}")
+                        continue
+                    if launch_reasons[task] == "hedge":
+                        self.stats["hedge_wins"] += 1
+                    return result
+
+                if not done and can_add and loop.time() < deadline:
+                    if _launch("hedge"):
+                        self.stats["hedged"] += 1
+                        print(f"LLM: {primary.name} slower than hedge delay ({self.hedge_delay(primary):.1f}s); hedged")
+                elif not pending and can_add:
+                    if _launch("failover"):
+                        self.stats["failovers"] += 1
+                        print(f"LLM: failing over after error ({errors[-1]})")
+                elif not done and loop.time() >= deadline:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Let the losers unwind so their breakers are settled before the caller moves on.
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        for task, provider in pending.items():
+            errors.append(f"{provider.name}: timed out after {timeout:.0f}s")
+        raise LLMUnavailableError("; ".join(errors) or "LLM request timed out.")
+
+    def stream(self, messages, model, temperature=0.7, max_tokens=400, n=1,
+               timeout=LLM_DEFAULT_TIMEOUT_SECONDS):
+        """
+        Yields (choice index, text delta). Not hedged; fails over to the next provider
+        only if the current one errors before producing any output.
+        """
+        errors = []
+        for provider in self.providers:
+            breaker = self.breakers[provider.name]
+            if not breaker.allow():
+                continue
+            produced = False
+            start = time.time()
+            provider_model = provider.model_for(model)
+            try:
+                # Streams report no token usage, so only the request outcome and latency are recorded.
+                with track(LLM_REQUESTS, LLM_LATENCY, provider=provider.name, model=provider_model):
+                    for index, delta in provider.stream(messages, provider_model, temperature, max_tokens, n, timeout):
+                        produced = True
+                        yield index, delta
+                breaker.record_success()
+                self.latency[provider.name].add(time.time() - start)
+                return
+            except Exception as e:
+                breaker.record_failure()
+                if produced:
+                    raise
+                errors.append(f"{provider.name}: {e}")
+                print(f"LLM stream: {provider.name} failed before first token ({e})")
+            except BaseException:
+                # The consumer stopped early (GeneratorExit) or was cancelled; free a half-open trial.
+                breaker.release_trial()
+                raise
+        raise LLMUnavailableError("; ".join(errors) or "All LLM providers are unavailable.")
+
+
+def _build_providers():
+    providers = []
+    for provider_class in (OpenAIProvider, GeminiProvider):
+        try:
+            providers.append(provider_class())
+        except Exception as e:
+            print(f"LLM provider {provider_class.name} disabled: {e}")
+    return providers
+
+
+llm = LLMBackend(_build_providers())
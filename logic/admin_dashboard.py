@@ -0,0 +1,210 @@
+# logic/admin_dashboard.py
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+import tracing
+from metrics import (
+    CACHE_EVENTS, COST_USD, EMBED_LATENCY, EMBED_REQUESTS, LLM_LATENCY, LLM_REQUESTS, NOTION_LATENCY, NOTION_REQUESTS,
+    OCR_LATENCY, OCR_REQUESTS, QDRANT_LATENCY, QDRANT_REQUESTS, QUEUE_DEPTH, spend_history,
+)
+from profiler import profiling, recent_profiles
+from qdrant_helpers import get_qdrant_client
+
+SLOW_REQUEST_LIMIT = 5
+COLLECTION_SIZE_TTL_SECONDS = 30
+
+# ====== DATA ======
+
+def _counts(requests_counter, **match):
+    """(calls, non-ok calls, rate-limited calls) for the counter series matching `match`."""
+    calls = failed = rate_limited = 0
+    for labels, value in requests_counter.series():
+        if all(labels.get(k) == str(v) for k, v in match.items()):
+            calls += value
+            if labels["status"] != "ok":
+                failed += value
+            if labels["status"] == "rate_limited":
+                rate_limited += value
+    return calls, failed, rate_limited
+
+def _latency_row(stage, histogram, requests_counter, **match):
+    calls, failed, rate_limited = _counts(requests_counter, **match)
+    row = {"stage": stage, "calls": calls, "errors": failed, "429s": rate_limited}
+    for pct in (50, 95, 99):
+        value = histogram.quantile(pct / 100, **match)
+        row[f"p{pct} ms"] = None if value is None else round(value * 1000)
+    return row
+
+def stage_latency_rows():
+    """Per-stage call counts and latency percentiles from the metrics histograms."""
+    rows = [
+        _latency_row("OCR", OCR_LATENCY, OCR_REQUESTS),
+        _latency_row("Embeddings", EMBED_LATENCY, EMBED_REQUESTS),
+    ]
+    for operation in sorted({labels["operation"] for labels, *_ in QDRANT_LATENCY.series()}):
+        rows.append(_latency_row(f"Qdrant {operation}", QDRANT_LATENCY, QDRANT_REQUESTS, operation=operation))
+    for provider, model in sorted({(labels["provider"], labels["model"]) for labels, *_ in LLM_LATENCY.series()}):
+        rows.append(_latency_row(f"LLM {provider}/{model}", LLM_LATENCY, LLM_REQUESTS, provider=provider, model=model))
+    for operation in sorted({labels["operation"] for labels, *_ in NOTION_LATENCY.series()}):
+        rows.append(_latency_row(f"Notion {operation}", NOTION_LATENCY, NOTION_REQUESTS, operation=operation))
+    return [row for row in rows if row["calls"]]
+
+def cache_ratio_rows():
+    events = defaultdict(dict)
+    for labels, value in CACHE_EVENTS.series():
+        events[labels["cache"]][labels["event"]] = value
+    rows = []
+    for cache, counts in sorted(events.items()):
+        # Tone prefetch counts a wait on an in-flight prefetch as a hit as well.
+        hits = counts.get("hits", 0) + counts.get("waited", 0)
+        lookups = hits + counts.get("misses", 0)
+        rows.append({
+            "cache": cache,
+            "hit ratio": f"{hits / lookups:.0%}" if lookups else "-",
+            **counts,
+        })
+    return rows
+
+def queue_depth_rows():
+    return [{"queue": labels["queue"], "depth": value} for labels, value in QUEUE_DEPTH.series()]
+
+def collection_sizes():
+    """Point counts per Qdrant collection, cached briefly so reruns don't hit Qdrant every time."""
+    cached = st.session_state.get("admin_collection_sizes")
+    if cached and time.time() - cached[0] < COLLECTION_SIZE_TTL_SECONDS:
+        return cached[1]
+    client = get_qdrant_client()
+    sizes = []
+    for collection in client.get_collections().collections:
+        info = client.get_collection(collection.name)
+        sizes.append({"collection": collection.name, "points": info.points_count, "status": str(info.status)})
+    st.session_state.admin_collection_sizes = (time.time(), sizes)
+    return sizes
+
+def slow_requests(limit=SLOW_REQUEST_LIMIT):
+    """The slowest recent request traces from the tracing ring buffer, slowest first."""
+    traces = tracing.recent_traces(limit=200)
+    return sorted(traces, key=lambda t: t["root"]["duration_ms"], reverse=True)[:limit]
+
+def span_breakdown_rows(trace):
+    by_id = {s["span_id"]: s for s in trace["spans"]}
+    rows = []
+    for s in trace["spans"]:
+        depth, parent = 0, s["parent_id"]
+        while parent in by_id:
+            depth += 1
+            parent = by_id[parent]["parent_id"]
+        rows.append({
+            "span": "· " * depth + s["name"],
+            "ms": round(s["duration_ms"]),
+            "status": s["status"],
+            "attributes": ", ".join(f"{k}={v}" for k, v in s["attributes"].items()),
+        })
+    return rows
+
+# ====== PROFILING ======
+
+@contextmanager
+def profile_reply_request(name):
+    """Profiles the block if this session has profiling on, or asked for the next request only."""
+    enabled = st.session_state.get("profile_requests_checkbox", False) or st.session_state.pop("profile_next_request", False)
+    with profiling(name, enabled=enabled) as profile:
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.trace_id = st.session_state.get("last_trace_id")
+
+def render_profiler_controls():
+    st.markdown("#### 🔬 Profiler")
+    st.checkbox("Profile every reply request in this session", key="profile_requests_checkbox")
+    if st.button("Profile next request only", key="profile_next_request_button"):
+        st.session_state.profile_next_request = True
+    if st.session_state.get("profile_next_request"):
+        st.caption("The next Generate/Regenerate will be profiled.")
+
+    profiles = recent_profiles()
+    if not profiles:
+        st.caption("No profiles yet.")
+        return
+    labels = {}
+    for profile in profiles:
+        summary = profile.summary()
+        label = (f"{datetime.fromtimestamp(summary['started_at']).strftime('%H:%M:%S')} · {summary['name']} · "
+                 f"{summary['duration_ms'] / 1000:.2f}s · {summary['samples']} samples")
+        labels[label] = profile
+    choice = st.selectbox("Profile", list(labels), key="profile_choice")
+    profile = labels[choice]
+    if profile.trace_id:
+        st.caption(f"Trace id: {profile.trace_id}")
+    file_stem = f"reply-{datetime.fromtimestamp(profile.started_at).strftime('%Y%m%d-%H%M%S')}"
+    speedscope_col, flamegraph_col = st.columns(2)
+    with speedscope_col:
+        st.download_button("⬇️ speedscope", data=profile.to_speedscope(), file_name=f"{file_stem}.speedscope.json",
+                           mime="application/json", key="profile_download_speedscope")
+    with flamegraph_col:
+        st.download_button("⬇️ flamegraph", data=profile.to_collapsed(), file_name=f"{file_stem}.folded",
+                           mime="text/plain", key="profile_download_folded")
+
+# ====== RENDERING ======
+
+def render_performance_dashboard():
+    with st.sidebar.expander("📈 Performance", expanded=False):
+        if not st.checkbox("Show live metrics", key="admin_show_metrics"):
+            st.caption("Per-stage latency, slow requests, caches, queues and token spend for this app process.")
+            return
+        st.button("🔄 Refresh", key="admin_refresh_metrics")
+
+        st.markdown("#### ⏱️ Stage latency")
+        latency_rows = stage_latency_rows()
+        if latency_rows:
+            st.dataframe(pd.DataFrame(latency_rows), hide_index=True, use_container_width=True)
+        else:
+            st.caption("No calls recorded yet in this process.")
+
+        st.markdown("#### 🐢 Slowest recent requests")
+        slow = slow_requests()
+        if not tracing.enabled():
+            st.caption("Tracing is disabled (TRACING_EXPORTERS=none).")
+        elif not slow:
+            st.caption("No traced requests yet.")
+        else:
+            labels = {
+                f"{t['root']['duration_ms'] / 1000:.2f}s · {t['root']['name']} · "
+                f"{datetime.fromtimestamp(t['root']['start']).strftime('%H:%M:%S')}": t
+                for t in slow
+            }
+            choice = st.selectbox("Request", list(labels), key="admin_slow_request")
+            st.dataframe(pd.DataFrame(span_breakdown_rows(labels[choice])), hide_index=True, use_container_width=True)
+            st.caption(f"Trace id: {labels[choice]['trace_id']}")
+
+        st.markdown("#### 🎯 Caches")
+        cache_rows = cache_ratio_rows()
+        if cache_rows:
+            st.dataframe(pd.DataFrame(cache_rows).fillna(0), hide_index=True, use_container_width=True)
+
+        st.markdown("#### 📥 Background queues")
+        st.dataframe(pd.DataFrame(queue_depth_rows()), hide_index=True, use_container_width=True)
+
+        st.markdown("#### 🗄️ Qdrant collections")
+        try:
+            st.dataframe(pd.DataFrame(collection_sizes()), hide_index=True, use_container_width=True)
+        except Exception as e:
+            st.warning(f"Could not read collection sizes: {e}")
+
+        st.markdown("#### 💸 Token spend")
+        total_cost = sum(value for _, value in COST_USD.series())
+        st.markdown(f"Estimated spend since start: **${total_cost:.4f}**")
+        history = spend_history()
+        if history:
+            frame = pd.DataFrame(history)
+            frame["minute"] = pd.to_datetime(frame["minute"], unit="s")
+            st.line_chart(frame.set_index("minute")[["llm_tokens", "embedding_tokens"]])
+        else:
+            st.caption("No token usage recorded yet.")
@@ -9,16 +9,24 @@ import streamlit.components.v1 as components
 
 from memory import save_huddle_to_notion
 from memory_vector import embed_and_store_interaction, retrieve_similar_examples
-from suggestor import get_context_for_reply, generate_suggested_reply, generate_adjusted_tone
+from suggestor import DEFAULT_PRINCIPLES, get_context_for_reply, generate_suggested_reply, generate_reply_candidates, lookup_cached_reply
+from candidate_pool import CandidatePool, request_key
+from tone_prefetch import get_adjusted_tone, prefetch_tones_async, record_tone_use
 from ocr import extract_text_from_image
 from doc_embedder import embed_documents_parallel
 from notion_embedder import embed_huddles_qdrant
 from qdrant_client import QdrantClient
+from semantic_cache import resolve_scope
+from utils.state import cache_user_id
+from model_router import AUTO_MODEL
+from tracing import current_span, span, traced
+from logic.admin_dashboard import profile_reply_request, render_performance_dashboard, render_profiler_controls
 
 PDF_DIR = "public"
 COLLECTION_NAME = "docs_memory"
 HUDDLE_MEMORY_COLLECTION = "huddle_memory"
 VECTOR_SIZE = 1536
+TONE_OPTIONS = ["None", "Professional", "Casual", "Inspiring", "Empathetic", "Direct"]
 
 def huddle_play_tab(render_polished_card):
     # ---- Sidebar Settings ----
@@ -31,8 +39,8 @@ def huddle_play_tab(render_polished_card):
         st.markdown("#### AI Memory & Model Settings")
         model_choice = st.radio(
             "🤖 Choose AI Model",
-            options=["gpt-4o", "gpt-3.5-turbo"],
-            help="GPT-4o: best quality, GPT-3.5: fastest/cheapest",
+            options=[AUTO_MODEL, "gpt-4o", "gpt-3.5-turbo"],
+            help="Auto: picks per request by complexity and live latency. GPT-4o: best quality, GPT-3.5: fastest/cheapest",
             key="model_choice_radio"
         )
         st.markdown("---")
@@ -47,6 +55,10 @@ def huddle_play_tab(render_polished_card):
                 with st.spinner("Syncing Notion huddles..."):
                     embed_huddles_qdrant()
                 st.success("✅ Notion memory embedded successfully!")
+        st.markdown("---")
+        render_profiler_controls()
+
+    render_performance_dashboard()
 
     st.markdown("<div id='tab1-wrapper'>", unsafe_allow_html=True)
 
@@ -68,7 +80,8 @@ def huddle_play_tab(render_polished_card):
             keys_to_reset_for_new_image = [
                 "final_reply_collected", "adjusted_reply_collected", "doc_matches_for_display",
                 "screenshot_text_content", "similar_examples_retrieved",
-                "huddle_context_for_regen", "doc_context_for_regen", "principles_for_regen"
+                "huddle_context_for_regen", "doc_context_for_regen", "principles_for_regen",
+                "regen_candidate_pool"
             ]
             for key_to_clear in keys_to_reset_for_new_image:
                 if key_to_clear in st.session_state:
@@ -141,19 +154,18 @@ def huddle_play_tab(render_polished_card):
     col1_gen, col2_regen = st.columns(2)
     with col1_gen:
         if st.button("🚀 Generate AI Reply", key="generate_reply_button_main", use_container_width=True):
-            _handle_ai_generation_and_save(uploaded_image, render_polished_card, is_regeneration=False)
+            with profile_reply_request("generate"):
+                _handle_ai_generation_and_save(uploaded_image, render_polished_card, is_regeneration=False)
     with col2_regen:
         can_regenerate = bool(
             st.session_state.final_reply_collected and \
             st.session_state.screenshot_text_content and \
-            st.session_state.user_draft_current and \
-            st.session_state.huddle_context_for_regen is not None and \
-            st.session_state.doc_context_for_regen is not None and \
-            st.session_state.principles_for_regen is not None
+            st.session_state.user_draft_current
         )
         if st.button("🔄 Regenerate", key="regenerate_button_again", use_container_width=True, disabled=not can_regenerate):
             if can_regenerate:
-                _handle_ai_generation_and_save(uploaded_image, render_polished_card, is_regeneration=True)
+                with profile_reply_request("regenerate"):
+                    _handle_ai_generation_and_save(uploaded_image, render_polished_card, is_regeneration=True)
             else:
                 st.info("Generate an initial reply first, or ensure all inputs (image, draft) are present for context.")
 
@@ -164,7 +176,7 @@ def huddle_play_tab(render_polished_card):
         
         if "current_tone_selection" not in st.session_state:
             st.session_state.current_tone_selection = "None"
-        tone_options = ["None", "Professional", "Casual", "Inspiring", "Empathetic", "Direct"]
+        tone_options = TONE_OPTIONS
         try:
             current_tone_idx = tone_options.index(st.session_state.current_tone_selection) if st.session_state.current_tone_selection in tone_options else 0
         except ValueError:
@@ -179,8 +191,10 @@ def huddle_play_tab(render_polished_card):
         if st.session_state.current_tone_selection != "None" and st.button("🎯 Regenerate with Tone", key="regenerate_tone_button"):
             st.session_state.adjusted_reply_collected = None
             tone_generation_start_time = time.time()
+            record_tone_use(st.session_state.current_tone_selection)
             with st.spinner("🎨 Adjusting tone... Please wait."):
-                adjusted_reply = generate_adjusted_tone(
+                # Usually already prefetched in the background for this reply.
+                adjusted_reply = get_adjusted_tone(
                     st.session_state.final_reply_collected,
                     st.session_state.current_tone_selection,
                     st.session_state.model_choice_radio
@@ -301,6 +315,7 @@ def huddle_play_tab(render_polished_card):
             "huddle_context_for_regen": None,
             "doc_context_for_regen": None,
             "principles_for_regen": None,
+            "regen_candidate_pool": None,
         }
         for k_clear in session_keys_defaults.keys():
             if k_clear in st.session_state:
@@ -310,9 +325,11 @@ def huddle_play_tab(render_polished_card):
         st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
+@traced("huddle_play.reply", root=True)
 def _handle_ai_generation_and_save(current_uploaded_image, render_polished_card, is_regeneration=False):
-    # Import as needed to avoid circular imports
-    import time
+    # Root span of this request: OCR, retrieval, generation and persistence nest under its trace id.
+    request_span = current_span().set(regeneration=is_regeneration)
+    st.session_state.last_trace_id = request_span.trace_id
 
     if not current_uploaded_image and not st.session_state.screenshot_text_content:
         st.warning("Please upload an image.")
@@ -325,8 +342,6 @@ def _handle_ai_generation_and_save(current_uploaded_image, render_polished_card,
     if not is_regeneration:
         st.session_state.final_reply_collected = None
 
-    overall_processing_start_time = time.time()
-
     # --- OCR Handling ---
     if not is_regeneration or not st.session_state.screenshot_text_content:
         if current_uploaded_image:
@@ -335,7 +350,6 @@ def _handle_ai_generation_and_save(current_uploaded_image, render_polished_card,
                 with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp_file:
                     tmp_file.write(current_uploaded_image.getvalue())
                     tmp_path = tmp_file.name
-                ocr_start_time = time.time()
                 with st.spinner("🔍 Extracting text from screenshot..."):
                     st.session_state.screenshot_text_content = extract_text_from_image(tmp_path)
             finally:
@@ -356,43 +370,99 @@ def _handle_ai_generation_and_save(current_uploaded_image, render_polished_card,
                 st.session_state.user_draft_current
             )
 
+    model_name = st.session_state.model_choice_radio
+    cache_scope = resolve_scope(cache_user_id())
+
+    # --- Semantic Cache (before retrieval, so a hit skips it) ---
+    cached_reply = None
+    if not is_regeneration:
+        cached_reply = lookup_cached_reply(
+            st.session_state.screenshot_text_content,
+            st.session_state.user_draft_current,
+            model_name,
+            cache_scope=cache_scope
+        )
+
     # --- Context Retrieval for LLM ---
-    context_spinner_msg = "📚 Retrieving context for AI..."
-    with st.spinner(context_spinner_msg):
-        if is_regeneration and st.session_state.huddle_context_for_regen is not None and \
-           st.session_state.doc_context_for_regen is not None and \
-           st.session_state.principles_for_regen is not None:
-            huddle_ctx_to_use = st.session_state.huddle_context_for_regen
-            doc_ctx_to_use = st.session_state.doc_context_for_regen
-            principles_to_use = st.session_state.principles_for_regen
-        else:
-            huddle_ctx_to_use, doc_ctx_to_use, doc_matches_disp = get_context_for_reply(
-                st.session_state.screenshot_text_content,
-                st.session_state.user_draft_current
-            )
-            st.session_state.doc_matches_for_display = doc_matches_disp
-            principles_to_use = '''
-            1.  **Clarity & Impact:** Is the core message instantly understandable and engaging?
-            2.  **Curiosity, Not Persuasion:** Does the reply invite dialogue with genuine questions rather than trying to sell or convince?
-            3.  **Build Rapport:** Does it strengthen the connection with the recipient, reflecting empathy and understanding?
-            4.  **Concise & Authentic:** Is it brief, warm, and does it sound like a real person, not a script?
-            5.  **Strategic Next Step:** Does it naturally guide the conversation towards understanding their needs or openness, in line with the Huddle flow?
-            '''
-            st.session_state.huddle_context_for_regen = huddle_ctx_to_use
-            st.session_state.doc_context_for_regen = doc_ctx_to_use
-            st.session_state.principles_for_regen = principles_to_use
-
-    ai_spinner_msg = "🧠 Thinking of a new angle..." if is_regeneration else "🤖 Generating AI reply..."
-    with st.spinner(ai_spinner_msg):
-        generated_reply = generate_suggested_reply(
-            screenshot_text=st.session_state.screenshot_text_content,
-            user_draft=st.session_state.user_draft_current,
-            principles=principles_to_use,
-            model_name=st.session_state.model_choice_radio,
-            huddle_context_str=huddle_ctx_to_use,
-            doc_context_str=doc_ctx_to_use,
-            is_regeneration=is_regeneration
+    if cached_reply:
+        huddle_ctx_to_use, doc_ctx_to_use, principles_to_use = None, None, DEFAULT_PRINCIPLES
+        # Nothing was retrieved; Regenerate fetches the context itself when none is kept.
+        st.session_state.doc_matches_for_display = []
+        st.session_state.huddle_context_for_regen = None
+        st.session_state.doc_context_for_regen = None
+        st.session_state.principles_for_regen = None
+    else:
+        with st.spinner("📚 Retrieving context for AI..."):
+            if is_regeneration and st.session_state.huddle_context_for_regen is not None and \
+               st.session_state.doc_context_for_regen is not None and \
+               st.session_state.principles_for_regen is not None:
+                huddle_ctx_to_use = st.session_state.huddle_context_for_regen
+                doc_ctx_to_use = st.session_state.doc_context_for_regen
+                principles_to_use = st.session_state.principles_for_regen
+            else:
+                huddle_ctx_to_use, doc_ctx_to_use, doc_matches_disp = get_context_for_reply(
+                    st.session_state.screenshot_text_content,
+                    st.session_state.user_draft_current
+                )
+                st.session_state.doc_matches_for_display = doc_matches_disp
+                principles_to_use = DEFAULT_PRINCIPLES
+                st.session_state.huddle_context_for_regen = huddle_ctx_to_use
+                st.session_state.doc_context_for_regen = doc_ctx_to_use
+                st.session_state.principles_for_regen = principles_to_use
+
+    pool_key = request_key(st.session_state.screenshot_text_content, st.session_state.user_draft_current, model_name)
+    pool = st.session_state.get("regen_candidate_pool")
+    if pool is not None and pool.key != pool_key:
+        pool = None
+
+    # Runs on a background thread, so capture inputs now instead of reading session state there.
+    screenshot_for_pool = st.session_state.screenshot_text_content
+    draft_for_pool = st.session_state.user_draft_current
+
+    def _generate_candidates(n):
+        return generate_reply_candidates(
+            screenshot_for_pool,
+            draft_for_pool,
+            principles_to_use,
+            model_name,
+            huddle_ctx_to_use,
+            doc_ctx_to_use,
+            n=n
         )
+
+    generated_reply = cached_reply
+    if not generated_reply and is_regeneration and pool is not None:
+        generated_reply = pool.pop()
+        if generated_reply:
+            print("Regenerate: served from candidate pool")
+            request_span.set(candidate_pool_hit=True)
+    if not generated_reply:
+        ai_spinner_msg = "🧠 Thinking of a new angle..." if is_regeneration else "🤖 Generating AI reply..."
+        with st.spinner(ai_spinner_msg):
+            generated_reply = generate_suggested_reply(
+                screenshot_text=st.session_state.screenshot_text_content,
+                user_draft=st.session_state.user_draft_current,
+                principles=principles_to_use,
+                model_name=model_name,
+                huddle_context_str=huddle_ctx_to_use,
+                doc_context_str=doc_ctx_to_use,
+                is_regeneration=is_regeneration,
+                fresh=is_regeneration,
+                cache_scope=cache_scope,
+                cache_checked=not is_regeneration
+            )
+
+    # Once the user has asked for another angle, keep more ready in the background so the next
+    # Regenerate is instant. A first Generate never pays for candidates nobody may look at.
+    if isinstance(generated_reply, str) and not generated_reply.startswith("Error:"):
+        if pool is None:
+            pool = CandidatePool(pool_key, shown_reply=generated_reply)
+            st.session_state.regen_candidate_pool = pool
+        else:
+            pool.mark_seen(generated_reply)
+        if is_regeneration and pool.needs_refill():
+            pool.refill_async(_generate_candidates)
+        prefetch_tones_async(generated_reply, TONE_OPTIONS, model_name)
     st.session_state.final_reply_collected = generated_reply
 
     if isinstance(generated_reply, str) and generated_reply.startswith("Error:"):
@@ -412,7 +482,7 @@ def _handle_ai_generation_and_save(current_uploaded_image, render_polished_card,
 
     is_quality = len(failure_reasons) == 0
     if is_quality:
-        with st.spinner("💾 Saving huddle..."):
+        with st.spinner("💾 Saving huddle..."), span("persist"):
             embed_and_store_interaction(
                 screenshot_text=st.session_state.screenshot_text_content,
                 user_draft=st.session_state.user_draft_current,
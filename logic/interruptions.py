@@ -1,19 +1,46 @@
 # logic/interruptions.py
 
 import streamlit as st
-import base64
+import hashlib
 import io
 import os
 from PIL import Image
 import streamlit.components.v1 as components
 from ocr import extract_text_from_image
-from openai import OpenAI
+from image_prep import prepare_image_for_vision
+from components.card import render_streaming_card
+from starters import generate_starters
 from notion_client import Client
+from metrics import NOTION_LATENCY, NOTION_REQUESTS, track
+
+STORY_ASSETS_KEY = "story_assets"
+STREAM_STARTERS = os.getenv("STREAM_CONVERSATION_STARTERS", "true").lower() == "true"
+
+def _get_story_assets(image_bytes):
+    """
+    Returns the OCR text, decoded PIL image and (downscaled) data URL for an uploaded story.
+    Results are memoized in session state by the upload's content hash, so reruns
+    (button presses, edits) reuse them and only a new story triggers OCR again.
+    """
+    content_hash = hashlib.sha256(image_bytes).hexdigest()
+    assets = st.session_state.get(STORY_ASSETS_KEY)
+    if assets and assets.get("hash") == content_hash:
+        return assets, False
+
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    vision_image = prepare_image_for_vision(image_bytes)
+    assets = {
+        "hash": content_hash,
+        "image": image,
+        "text": extract_text_from_image(image_bytes),
+        "image_url": vision_image["data_url"],
+        "vision_stats": {k: v for k, v in vision_image.items() if k not in ("data_url", "bytes")},
+    }
+    st.session_state[STORY_ASSETS_KEY] = assets
+    return assets, True
 
 def interruptions_tab(render_polished_card):
-    # --- Setup OpenAI and Notion clients ---
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
     # Notion setup
     try:
         notion_api_key_env = os.getenv("NOTION_API_KEY")
@@ -48,10 +75,11 @@ def interruptions_tab(render_polished_card):
                 "Tone": {"rich_text": [{"text": {"content": str(analysis_type)}}]},
                 "Prompt Version": {"rich_text": [{"text": {"content": prompt_version}}]}
             }
-            notion.pages.create(
-                parent={"database_id": NOTION_DATABASE_ID},
-                properties=properties_payload
-            )
+            with track(NOTION_REQUESTS, NOTION_LATENCY, operation="pages.create"):
+                notion.pages.create(
+                    parent={"database_id": NOTION_DATABASE_ID},
+                    properties=properties_payload
+                )
             st.success("✅ Your version saved to Notion!")
         except Exception as e:
             st.error(f"Notion save failed: {e}")
@@ -75,13 +103,18 @@ def interruptions_tab(render_polished_card):
     )
 
     if uploaded_file:
-        image_bytes = uploaded_file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        image_bytes = uploaded_file.getvalue()
+        story_assets, is_new_story = _get_story_assets(image_bytes)
+        if is_new_story:
+            # Starters belong to the previous story; drop them so they are regenerated.
+            for key in ["conversation_starters", "user_edit", "prompt_version"]:
+                if key in st.session_state:
+                    del st.session_state[key]
+        image = story_assets["image"]
         st.image(image, caption="Uploaded Story", use_container_width=True)
 
-        text = extract_text_from_image(image_bytes)
-        base64_image = base64.b64encode(image_bytes).decode("utf-8")
-        image_url = f"data:image/png;base64,{base64_image}"
+        text = story_assets["text"]
+        image_url = story_assets["image_url"]
 
         st.markdown('<div id="storyTextAnchor"></div>', unsafe_allow_html=True)
 
@@ -102,92 +135,37 @@ def interruptions_tab(render_polished_card):
             """, height=0)
             st.session_state.scroll_to_story_text = False
 
-        def get_random_prompt():
-            import random
-            prompt_a = (
-                "You are an observant and thoughtful friend crafting Instagram story replies. "
-                "Your goal is to start genuine, warm, and curious conversations based strictly on the visible content. "
-                "Always reference what's actually there—no guessing or speculation. "
-                "Keep replies authentic, friendly, and simple. Use at most one emoji, only if it fits naturally."
+        def generate_multiple_conversation_starters(text, image_url=None, n=3, on_partial=None, bypass_cache=False):
+            """Generates n starters (streamed via on_partial if given) and records the A/B prompt version."""
+            starters, prompt_version = generate_starters(
+                text, story_assets["hash"], image_url, n=n, on_partial=on_partial, bypass_cache=bypass_cache
             )
-            prompt_b = (
-                "You are a friendly and engaging buddy replying to Instagram stories. "
-                "Your aim is to spark a fun and lighthearted chat by noticing something specific in the story. "
-                "Be curious and ask a simple question about what you see. "
-                "Keep it casual and use a single emoji to add a bit of personality."
-            )
-            return random.choice([(prompt_a, "A"), (prompt_b, "B")])
-
-        def generate_multiple_conversation_starters(text, image_url=None, n=3):
-            guidance_line = ""
-            if text.strip():
-                try:
-                    from tone_fetcher import retrieve_similar_tone_example
-                    human_example, _ = retrieve_similar_tone_example(text, "")
-                    if human_example:
-                        guidance_line = f"Previously, a human reply to similar text was: {human_example}"
-                    else:
-                        guidance_line = "No similar past reply available."
-                except Exception:
-                    guidance_line = "No guidance available."
-            else:
-                guidance_line = "No text provided for specific guidance retrieval."
-            
-            system_prompt, prompt_version = get_random_prompt()
             st.session_state.prompt_version = prompt_version
-
-            user_prompt_header = "A friend posted an Instagram story."
-            story_content_line = (
-                f"Story Content: {text.strip() if text.strip() else 'This is an IMAGE. Before replying, list to yourself the main objects, scene, or food you *see*. Your reply must mention or ask about one of these visible elements.'}"
-            )
-            guidance_line_to_include = guidance_line
-            user_prompt = f"""
-            {user_prompt_header}
-
-            {story_content_line}
-
-            Guidance from past similar interactions:
-            {guidance_line_to_include}
-
-            Your Task:
-            Write a short, warm, and curious reply based strictly on the visible story (or text, if present). The reply should feel human and authentic.
-
-            Instructions:
-            - If image only: Mention or ask about something clearly visible. Don't speculate beyond what's shown. If unclear, use a general but positive line.
-            - If text: Respond thoughtfully to the text. Use past guidance if helpful.
-            - Where possible, include a question at the end to prompt conversation.
-            - Be authentic and simple. Avoid being overly clever, eccentric, or bubbly.
-            - Use at most one emoji, only if it fits.
-            - Do **not** use quotation marks in your draft.
-            - Do **not** use any preamble—just write the message directly.
-            - If the image contains overlays, music tags, or device UI, **ignore** them and focus only on the central, main scene or food.
-
-            Examples:
-            Good: "That breakfast looks amazing! Enjoy!"
-            Bad: "Cool project! What are you building?"
-            """
-            messages_for_api = [{"role": "system", "content": system_prompt}]
-            user_content_list = [{"type": "text", "text": user_prompt.strip()}]
-            if image_url:
-                user_content_list.append({"type": "image_url", "image_url": {"url": image_url}})
-            messages_for_api.append({
-                "role": "user",
-                "content": user_content_list if image_url else user_prompt.strip()
-            })
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages_for_api,
-                max_tokens=150,
-                n=n,
-                temperature=1.0
-            )
-            completions = [choice.message.content.strip() for choice in response.choices]
-            return completions
+            return starters
+
+        def generate_starters_progressively(n=3, bypass_cache=False):
+            """Streams starters into placeholder cards, then clears them for the final cards."""
+            if not STREAM_STARTERS:
+                with st.spinner(f"🤖 Generating {n} options..."):
+                    return generate_multiple_conversation_starters(text, image_url, n=n, bypass_cache=bypass_cache)
+            placeholders = [st.empty() for _ in range(n)]
+
+            def on_partial(idx, partial_text):
+                render_streaming_card(placeholders[idx], f"Conversation Starter #{idx+1}", partial_text)
+
+            try:
+                with st.spinner(f"🤖 Generating {n} options..."):
+                    return generate_multiple_conversation_starters(
+                        text, image_url, n=n, on_partial=on_partial, bypass_cache=bypass_cache
+                    )
+            finally:
+                for placeholder in placeholders:
+                    placeholder.empty()
 
         conversation_starters = st.session_state.get("conversation_starters")
         if conversation_starters is None:
-            with st.spinner("🤖 Generating 3 options..."):
-                st.session_state.conversation_starters = generate_multiple_conversation_starters(text, image_url, n=3)
+            bypass_cache = st.session_state.pop("bypass_starter_cache", False)
+            st.session_state.conversation_starters = generate_starters_progressively(n=3, bypass_cache=bypass_cache)
             conversation_starters = st.session_state.conversation_starters
 
         conversation_starters = conversation_starters or []
@@ -219,13 +197,14 @@ def interruptions_tab(render_polished_card):
 
         with col2_regen:
             if st.button("🔄 Regenerate All", use_container_width=True):
-                replies = generate_multiple_conversation_starters(text, image_url)
-                st.session_state.conversation_starters = replies
-                st.session_state.user_edit = replies[0] if replies else ""
+                # Clear and rerun so the new starters stream into the card slots above.
+                st.session_state.conversation_starters = None
+                st.session_state.user_edit = ""
+                st.session_state.bypass_starter_cache = True
                 st.rerun()
 
         if st.button("➕ Start New Interruption", key="new_story_button", use_container_width=True):
-            for key in ["conversation_starters", "last_uploaded_story_name", "scroll_to_story_text", "user_edit", "prompt_version"]:
+            for key in ["conversation_starters", "last_uploaded_story_name", "scroll_to_story_text", "user_edit", "prompt_version", STORY_ASSETS_KEY]:
                 if key in st.session_state:
                     del st.session_state[key]
             st.session_state.uploader_key_tab2 += 1
@@ -2,27 +2,14 @@
 
 import streamlit as st
 from memory import load_all_interactions
+from objections import detect_objection_category
 
 def get_category(huddle):
     text = (huddle.get('screenshot_text', '') + ' ' + 
             huddle.get('user_draft', '') + ' ' + 
             huddle.get('ai_suggested', '')).lower()
 
-    if any(keyword in text for keyword in ["what's the business", "what is it", "what do you do", "side hustle", "what is this"]):
-        return "💼 What's the business?"
-    if any(keyword in text for keyword in ["property", "shares", "trading", "dropshipping", "like...?"]):
-        return "🤔 Is it like...?"
-    if any(keyword in text for keyword in ["make money", "how much", "charge", "income", "revenue", "profit"]):
-        return "💰 How do you make money?"
-    if any(keyword in text for keyword in ["mentor", "mentors", "mentorship", "coach", "coaching"]):
-        return "👥 Who are your mentors?"
-    if any(keyword in text for keyword in ["get connected", "get involved", "how did you get in", "how do i join", "selection process"]):
-        return "🤝 How do I get involved?"
-    if any(keyword in text for keyword in ["pyramid scheme", "ponzi"]):
-        return "⚠️ Is it a pyramid scheme?"
-    if any(keyword in text for keyword in ["skincare", "energy drinks", "makeup", "products", "selling", "sell"]):
-        return "💄 Product-related questions"
-    return "💬 General"
+    return detect_objection_category(text)
 
 def past_huddles_tab():
     st.subheader("📖 Past Huddle Interactions")
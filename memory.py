@@ -2,35 +2,40 @@ from notion_client import Client
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from metrics import NOTION_LATENCY, NOTION_REQUESTS, track
+from tracing import traced
 
 load_dotenv()
 
 notion = Client(auth=os.getenv("NOTION_API_KEY"))
 database_id = os.getenv("NOTION_MEMORY_DB_ID")
 
+@traced("persist.notion")
 def save_huddle_to_notion(screenshot_text, user_draft, ai_reply, user_final=None):
-    notion.pages.create(
-        parent={"database_id": database_id},
-        properties={
-            "Timestamp": {
-                "date": {"start": datetime.now().isoformat()}
-            },
-            "Screenshot Text": {
-                "rich_text": [{"text": {"content": screenshot_text[:2000]}}]
-            },
-            "User Draft": {
-                "rich_text": [{"text": {"content": user_draft[:2000]}}]
-            },
-            "AI Suggested": {
-                "rich_text": [{"text": {"content": ai_reply[:2000]}}]
-            },
-            "User Final": {
-                "rich_text": [{"text": {"content": user_final[:2000]}}] if user_final else []
+    with track(NOTION_REQUESTS, NOTION_LATENCY, operation="pages.create"):
+        notion.pages.create(
+            parent={"database_id": database_id},
+            properties={
+                "Timestamp": {
+                    "date": {"start": datetime.now().isoformat()}
+                },
+                "Screenshot Text": {
+                    "rich_text": [{"text": {"content": screenshot_text[:2000]}}]
+                },
+                "User Draft": {
+                    "rich_text": [{"text": {"content": user_draft[:2000]}}]
+                },
+                "AI Suggested": {
+                    "rich_text": [{"text": {"content": ai_reply[:2000]}}]
+                },
+                "User Final": {
+                    "rich_text": [{"text": {"content": user_final[:2000]}}] if user_final else []
+                }
             }
-        }
-    )
+        )
 def load_all_interactions():
-    results = notion.databases.query(database_id=database_id).get("results", [])
+    with track(NOTION_REQUESTS, NOTION_LATENCY, operation="databases.query"):
+        results = notion.databases.query(database_id=database_id).get("results", [])
     interactions = []
 
     for page in results:
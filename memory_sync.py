@@ -2,6 +2,7 @@
 
 from doc_embedder import embed_documents_parallel   # make sure this is the Qdrant version
 from notion_embedder import embed_huddles_qdrant  # your updated Qdrant embedder
+from qdrant_helpers import report_unindexed_filters
 import logging
 
 pdf_dir = "public"
@@ -23,3 +24,9 @@ try:
     logging.info("✅ Huddle memory embedded in Qdrant.")
 except Exception as e:
     logging.error(f"❌ Failed to embed huddles: {e}")
+
+try:
+    logging.info("🔍 Checking payload indexes for filtered fields")
+    report_unindexed_filters()
+except Exception as e:
+    logging.error(f"❌ Payload index check failed: {e}")
@@ -1,16 +1,20 @@
 import os
 from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct, VectorParams, Distance
-from openai import OpenAI
 from dotenv import load_dotenv
+from datetime import datetime, timezone
 import hashlib
+import uuid
+from qdrant_helpers import ensure_payload_indexes, get_async_qdrant_client, make_preview
+from lexical_index import add_to_lexical_index
+from vectorizer import embed_batch_async
+from async_runtime import run_sync
+from metrics import QDRANT_LATENCY, QDRANT_REQUESTS, track
+from tracing import span, traced
 
 load_dotenv()
 
-# Setup
-openai_api_key = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=openai_api_key)
-
+# Setup (the sync client is only used for collection setup; reads/writes go through the async core)
 qdrant = QdrantClient(
     url=os.getenv("QDRANT_URL"),
     api_key=os.getenv("QDRANT_API_KEY")
@@ -25,46 +29,61 @@ def ensure_collection():
             collection_name=COLLECTION_NAME,
             vectors_config=VectorParams(size=1536, distance=Distance.COSINE)
         )
+    ensure_payload_indexes(qdrant, COLLECTION_NAME)
 
 ensure_collection()
 
 # Embed with OpenAI
+async def get_embedding_async(text):
+    return (await embed_batch_async([text], model="text-embedding-ada-002"))[0]
+
 def get_embedding(text):
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-ada-002"
-    )
-    return response.data[0].embedding
+    return run_sync(get_embedding_async(text))
 
 # Store a new huddle
-def embed_and_store_interaction(screenshot_text, user_draft, ai_suggested, user_final=None):
+@traced("persist.qdrant")
+async def embed_and_store_interaction_async(screenshot_text, user_draft, ai_suggested, user_final=None):
     combined_text = f"{screenshot_text}\n\n{user_draft}"
-    vector = get_embedding(combined_text)
+    vector = await get_embedding_async(combined_text)
     metadata = {
+        "source": "huddle_play",
         "screenshot": screenshot_text,
         "draft": user_draft,
         "ai": ai_suggested,
-        "final": user_final or ""
+        "final": user_final or "",
+        "preview": make_preview(f"{combined_text}\n\n{ai_suggested}"),
+        "created_at": datetime.now(timezone.utc).isoformat()
     }
     uid = hashlib.md5((combined_text + ai_suggested).encode()).hexdigest()
-    qdrant.upsert(
-        collection_name=COLLECTION_NAME,
-        points=[PointStruct(id=uid, vector=vector, payload=metadata)]
-    )
+    with track(QDRANT_REQUESTS, QDRANT_LATENCY, operation="upsert", collection=COLLECTION_NAME):
+        await get_async_qdrant_client().upsert(
+            collection_name=COLLECTION_NAME,
+            points=[PointStruct(id=uid, vector=vector, payload=metadata)]
+        )
+    # Qdrant returns UUID ids in canonical hyphenated form; match it so fusion can dedupe.
+    add_to_lexical_index(COLLECTION_NAME, str(uuid.UUID(uid)), f"{combined_text}\n\n{ai_suggested}", {
+        "preview": metadata["preview"],
+        "source": metadata["source"],
+    })
 
-def retrieve_similar_examples(screenshot_text, user_draft, top_k=3, score_threshold=0.7):
+def embed_and_store_interaction(screenshot_text, user_draft, ai_suggested, user_final=None):
+    return run_sync(embed_and_store_interaction_async(screenshot_text, user_draft, ai_suggested, user_final))
+
+async def retrieve_similar_examples_async(screenshot_text, user_draft, top_k=3, score_threshold=0.7):
 
     query = f"{screenshot_text}\n\n{user_draft}"
-    vector = get_embedding(query)
+    vector = await get_embedding_async(query)
 
-    search_result = qdrant.search(
-        collection_name=COLLECTION_NAME,
-        query_vector=vector,
-        limit=top_k,
-        with_payload=True,
-        with_vectors=False,
-        score_threshold=score_threshold,
-    )
+    with span("qdrant.search", collection=COLLECTION_NAME, limit=top_k), \
+            track(QDRANT_REQUESTS, QDRANT_LATENCY, operation="search", collection=COLLECTION_NAME):
+        search_result = await get_async_qdrant_client().search(
+            collection_name=COLLECTION_NAME,
+            query_vector=vector,
+            limit=top_k,
+            with_payload=["screenshot", "draft", "ai", "boost"],
+            with_vectors=False,
+            score_threshold=score_threshold,
+        )
 
     examples = []
     for point in search_result:
@@ -82,3 +101,5 @@ def retrieve_similar_examples(screenshot_text, user_draft, top_k=3, score_thresh
 
     return examples
 
+def retrieve_similar_examples(screenshot_text, user_draft, top_k=3, score_threshold=0.7):
+    return run_sync(retrieve_similar_examples_async(screenshot_text, user_draft, top_k, score_threshold))
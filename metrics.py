@@ -0,0 +1,429 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Layers record into module-level instruments defined here:
+
+    with track(QDRANT_REQUESTS, QDRANT_LATENCY, operation="search", collection=name):
+        hits = await client.search(...)
+
+track() times the block and labels the request counter with the outcome (ok, error,
+timeout, rate_limited, cancelled), so rate-limit pressure shows up as its own series.
+record_llm_usage() / record_embedding_usage() add per-model token and cost counters.
+
+The registry is per process: the API serves it at GET /metrics, and a Streamlit process
+serves it on METRICS_PORT (start_http_server) when that variable is set.
+"""
+import asyncio
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = os.getenv("METRICS_PORT")
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+# USD per 1M tokens: (input, output). Cached prompt tokens are billed at CACHED_INPUT_DISCOUNT of input.
+# LLM_PRICES_JSON='{"my-model": [1.0, 4.0]}' adds or overrides entries.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-ada-002": (0.10, 0.0),
+}
+MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES_JSON", "{}")).items()})
+CACHED_INPUT_DISCOUNT = 0.5
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ====== INSTRUMENTS ======
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def series(self):
+        """[(labels dict, value)] for every label combination seen."""
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value) for key, value in items]
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.series()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label key -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2) + [0.0]
+            state[index] += 1  # index == len(buckets) is the +Inf bucket
+            state[-2] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def series(self):
+        """[(labels dict, cumulative bucket counts, count, sum)]."""
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        out = []
+        for key, state in items:
+            cumulative, running = [], 0
+            for count in state[:len(self.buckets) + 1]:
+                running += count
+                cumulative.append(running)
+            out.append((dict(zip(self.labelnames, key)), cumulative, state[-2], state[-1]))
+        return out
+
+    def quantile(self, q, **match):
+        """
+        Estimated q-quantile (0-1) over the series whose labels include `match`, interpolated
+        within buckets like Prometheus' histogram_quantile. None if nothing was observed.
+        """
+        merged, count = [0] * (len(self.buckets) + 1), 0
+        for labels, cumulative, series_count, _ in self.series():
+            if all(labels.get(k) == str(v) for k, v in match.items()):
+                merged = [a + b for a, b in zip(merged, cumulative)]
+                count += series_count
+        if not count:
+            return None
+        rank = q * count
+        for i, cumulative_count in enumerate(merged):
+            if cumulative_count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]  # beyond the last finite bucket
+                lower = self.buckets[i - 1] if i else 0.0
+                below = merged[i - 1] if i else 0
+                in_bucket = cumulative_count - below
+                return lower + (self.buckets[i] - lower) * ((rank - below) / in_bucket if in_bucket else 1)
+        return self.buckets[-1]
+
+    def samples(self):
+        samples = []
+        for labels, cumulative, count, total in self.series():
+            for bound, value in zip(self.buckets + (float("inf"),), cumulative):
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, value))
+            samples.append((f"{self.name}_count", labels, count))
+            samples.append((f"{self.name}_sum", labels, total))
+        return samples
+
+
+class CallbackMetric:
+    """A metric family whose values are read at scrape time from sources registered by other modules."""
+
+    def __init__(self, name, help_text, metric_type="gauge", labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.type = metric_type
+        self.labelnames = tuple(labelnames)
+        self._sources = []
+
+    def add_source(self, fn):
+        """fn() returns [(labels dict, value)]."""
+        self._sources.append(fn)
+        return fn
+
+    def series(self):
+        out = []
+        for fn in list(self._sources):
+            try:
+                out.extend(fn())
+            except Exception as e:
+                print(f"⚠️ Metrics source for {self.name} failed: {e}")
+        return out
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.series()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self):
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help_text, labelnames=()):
+    return REGISTRY.register(Counter(name, help_text, labelnames))
+
+
+def gauge(name, help_text, labelnames=()):
+    return REGISTRY.register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help_text, labelnames, buckets))
+
+
+def callback_metric(name, help_text, metric_type="gauge", labelnames=()):
+    return REGISTRY.register(CallbackMetric(name, help_text, metric_type, labelnames))
+
+
+# ====== PIPELINE METRICS ======
+
+OCR_REQUESTS = counter("ocr_requests_total", "Vision OCR calls by outcome.", ["status"])
+OCR_LATENCY = histogram("ocr_latency_seconds", "Vision OCR call latency.")
+
+EMBED_REQUESTS = counter("embedding_requests_total", "Embedding API calls by model and outcome.", ["model", "status"])
+EMBED_LATENCY = histogram("embedding_latency_seconds", "Embedding API call latency.", ["model"])
+EMBED_INPUTS = counter("embedding_inputs_total", "Texts sent for embedding.", ["model"])
+EMBED_TOKENS = counter("embedding_tokens_total", "Embedding tokens consumed.", ["model"])
+
+QDRANT_REQUESTS = counter("qdrant_requests_total", "Qdrant calls by operation, collection and outcome.",
+                          ["operation", "collection", "status"])
+QDRANT_LATENCY = histogram("qdrant_latency_seconds", "Qdrant call latency.", ["operation", "collection"])
+
+LLM_REQUESTS = counter("llm_requests_total", "LLM provider calls by model and outcome.", ["provider", "model", "status"])
+LLM_LATENCY = histogram("llm_latency_seconds", "LLM provider call latency.", ["provider", "model"],
+                        buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 12, 20, 30, 60))
+LLM_TOKENS = counter("llm_tokens_total", "LLM tokens by model and type (prompt, cached, completion).",
+                     ["provider", "model", "type"])
+
+NOTION_REQUESTS = counter("notion_requests_total", "Notion API calls by operation and outcome.", ["operation", "status"])
+NOTION_LATENCY = histogram("notion_latency_seconds", "Notion API call latency.", ["operation"])
+
+COST_USD = counter("model_cost_usd_total", "Estimated spend from token counts and MODEL_PRICES.", ["provider", "model"])
+CACHE_EVENTS = callback_metric("cache_events_total", "Cache hits, misses, bypasses and stores by cache.", "counter",
+                               ["cache", "event"])
+QUEUE_DEPTH = callback_metric("queue_depth", "Pending or in-flight work in background queues and pools.", "gauge",
+                              ["queue"])
+
+# Per-minute token and cost totals for the admin dashboard's spend-over-time view (last 24h).
+SPEND_HISTORY = deque(maxlen=24 * 60)
+_spend_lock = threading.Lock()
+
+
+def _record_spend(**amounts):
+    minute = int(time.time() // 60 * 60)
+    with _spend_lock:
+        if not SPEND_HISTORY or SPEND_HISTORY[-1]["minute"] != minute:
+            SPEND_HISTORY.append({"minute": minute, "llm_tokens": 0, "embedding_tokens": 0, "cost_usd": 0.0})
+        bucket = SPEND_HISTORY[-1]
+        for key, amount in amounts.items():
+            bucket[key] += amount
+
+
+def spend_history():
+    with _spend_lock:
+        return [dict(bucket) for bucket in SPEND_HISTORY]
+
+
+def _outcome(exc):
+    if isinstance(exc, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    if isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or "timeout" in type(exc).__name__.lower():
+        return "timeout"
+    status = getattr(exc, "status_code", None) or getattr(exc, "status", None) or getattr(exc, "code", None)
+    if status == 429 or "ratelimit" in type(exc).__name__.lower() or "resourceexhausted" in type(exc).__name__.lower():
+        return "rate_limited"
+    return "error"
+
+
+@contextmanager
+def track(requests_counter, latency_histogram, **labels):
+    """Times the block into latency_histogram and counts it in requests_counter with a status label."""
+    latency_labels = {k: v for k, v in labels.items() if k in latency_histogram.labelnames}
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        requests_counter.inc(status=_outcome(e), **labels)
+        latency_histogram.observe(time.perf_counter() - start, **latency_labels)
+        raise
+    requests_counter.inc(status="ok", **labels)
+    latency_histogram.observe(time.perf_counter() - start, **latency_labels)
+
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+    prices = MODEL_PRICES.get(model)
+    if not prices:
+        return 0.0
+    input_price, output_price = prices
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * input_price + cached_tokens * input_price * CACHED_INPUT_DISCOUNT
+            + completion_tokens * output_price) / 1_000_000
+
+
+def record_llm_usage(provider, model, usage):
+    if not usage:
+        return
+    prompt = usage.get("prompt_tokens") or 0
+    completion = usage.get("completion_tokens") or 0
+    cached = usage.get("cached_tokens") or 0
+    LLM_TOKENS.inc(prompt, provider=provider, model=model, type="prompt")
+    LLM_TOKENS.inc(cached, provider=provider, model=model, type="cached")
+    LLM_TOKENS.inc(completion, provider=provider, model=model, type="completion")
+    cost = estimate_cost(model, prompt, completion, cached)
+    COST_USD.inc(cost, provider=provider, model=model)
+    _record_spend(llm_tokens=prompt + completion, cost_usd=cost)
+
+
+def record_embedding_usage(model, inputs, tokens):
+    EMBED_INPUTS.inc(inputs, model=model)
+    if tokens:
+        EMBED_TOKENS.inc(tokens, model=model)
+        cost = estimate_cost(model, prompt_tokens=tokens)
+        COST_USD.inc(cost, provider="openai", model=model)
+        _record_spend(embedding_tokens=tokens, cost_usd=cost)
+
+
+def _process_samples():
+    samples = []
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    samples.append(({}, int(line.split()[1]) * 1024))
+    except OSError:
+        pass
+    return samples
+
+
+PROCESS_RSS = callback_metric("process_resident_memory_bytes", "Resident memory of this process.")
+PROCESS_RSS.add_source(_process_samples)
+PROCESS_THREADS = callback_metric("process_threads", "Live Python threads in this process.")
+PROCESS_THREADS.add_source(lambda: [({}, threading.active_count())])
+
+
+# ====== EXPOSITION ======
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port=None):
+    """Serves /metrics on a daemon thread (once per process). Returns the server, or None if no port."""
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+            except OSError as e:
+                print(f"⚠️ Metrics server not started on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"📈 Metrics served on :{port}/metrics")
+    return _server
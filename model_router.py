@@ -0,0 +1,122 @@
+"""
+Per-request model routing for reply generation.
+
+Picks the large or small model from cheap input features (length, detected objection
+category, regeneration flag) and each model's live latency/error EWMA, and gives every
+call a deadline after which the caller downgrades to the fallback model. While the large
+model is unhealthy, one request per ROUTER_PROBE_SECONDS is still sent to it as a probe so
+its EWMAs can recover.
+"""
+import os
+import threading
+import time
+
+from objections import GENERAL_CATEGORY, detect_objection_category
+from prompt_budget import count_tokens
+
+AUTO_MODEL = "Auto"
+LARGE_MODEL = os.getenv("ROUTER_LARGE_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o"))
+SMALL_MODEL = os.getenv("ROUTER_SMALL_MODEL", "gpt-3.5-turbo")
+
+# Inputs shorter than this with no objection detected count as simple follow-ups.
+ROUTER_SIMPLE_MAX_TOKENS = int(os.getenv("ROUTER_SIMPLE_MAX_TOKENS", "120"))
+ROUTER_DEADLINES = {
+    LARGE_MODEL: float(os.getenv("ROUTER_LARGE_DEADLINE_SECONDS", "12")),
+    SMALL_MODEL: float(os.getenv("ROUTER_SMALL_DEADLINE_SECONDS", "8")),
+}
+# The large model is skipped while its smoothed latency or error rate is above these.
+ROUTER_SLOW_SECONDS = float(os.getenv("ROUTER_SLOW_SECONDS", "9"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.3"))
+EWMA_ALPHA = 0.2
+# An unhealthy model only gets samples from probes, so let one request through this often.
+ROUTER_PROBE_SECONDS = float(os.getenv("ROUTER_PROBE_SECONDS", "30"))
+# Marks a choose() reason where the preferred large model was swapped for the small one.
+DOWNGRADED = "downgraded"
+
+
+def is_auto(model_name):
+    return not model_name or str(model_name).lower() == AUTO_MODEL.lower()
+
+
+def is_downgrade(route_reason):
+    return DOWNGRADED in (route_reason or "")
+
+
+class ModelRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency_ewma = {}
+        self.error_ewma = {}
+        self._last_probe = {}
+
+    def record(self, model_name, latency_seconds, ok=True):
+        with self._lock:
+            previous = self.latency_ewma.get(model_name)
+            if ok:
+                self.latency_ewma[model_name] = latency_seconds if previous is None else (
+                    EWMA_ALPHA * latency_seconds + (1 - EWMA_ALPHA) * previous
+                )
+            self.error_ewma[model_name] = EWMA_ALPHA * (0.0 if ok else 1.0) + (1 - EWMA_ALPHA) * self.error_ewma.get(model_name, 0.0)
+
+    def is_healthy(self, model_name):
+        with self._lock:
+            latency = self.latency_ewma.get(model_name)
+            errors = self.error_ewma.get(model_name, 0.0)
+        return (latency is None or latency <= ROUTER_SLOW_SECONDS) and errors <= ROUTER_MAX_ERROR_RATE
+
+    def admit(self, model_name):
+        """
+        True if model_name should take this request: it is healthy, or it is unhealthy but no
+        probe has been sent to it for ROUTER_PROBE_SECONDS (this call then claims the probe).
+        """
+        now = time.monotonic()
+        healthy = self.is_healthy(model_name)
+        with self._lock:
+            if healthy:
+                self._last_probe.pop(model_name, None)
+                return True
+            # The first probe is due one interval after the model was first seen unhealthy.
+            last = self._last_probe.setdefault(model_name, now)
+            if now - last < ROUTER_PROBE_SECONDS:
+                return False
+            self._last_probe[model_name] = now
+        print(f"Router: probing unhealthy {model_name}")
+        return True
+
+    def deadline(self, model_name):
+        return ROUTER_DEADLINES.get(model_name, ROUTER_DEADLINES[LARGE_MODEL])
+
+    def fallback(self, model_name):
+        return SMALL_MODEL if model_name != SMALL_MODEL else None
+
+    def choose(self, screenshot_text, user_draft, is_regeneration=False, probe=True):
+        """
+        Returns (model, reason). The large model handles objections, regenerations and long
+        inputs unless it is currently slow or failing; simple short follow-ups go to the small model.
+        probe=False only reads health and never claims a probe (for calls that won't hit the model).
+        """
+        category = detect_objection_category(f"{screenshot_text}\n{user_draft}")
+        input_tokens = count_tokens(screenshot_text) + count_tokens(user_draft)
+
+        if category != GENERAL_CATEGORY:
+            preferred, reason = LARGE_MODEL, f"objection: {category}"
+        elif is_regeneration:
+            preferred, reason = LARGE_MODEL, "regeneration"
+        elif input_tokens > ROUTER_SIMPLE_MAX_TOKENS:
+            preferred, reason = LARGE_MODEL, f"long input ({input_tokens} tokens)"
+        else:
+            preferred, reason = SMALL_MODEL, f"simple follow-up ({input_tokens} tokens)"
+
+        if preferred == LARGE_MODEL and not (self.admit(LARGE_MODEL) if probe else self.is_healthy(LARGE_MODEL)):
+            return SMALL_MODEL, f"{reason}; {DOWNGRADED}, {LARGE_MODEL} slow or failing"
+        return preferred, reason
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                model: {"latency_ewma": self.latency_ewma.get(model), "error_ewma": self.error_ewma.get(model, 0.0)}
+                for model in set(self.latency_ewma) | set(self.error_ewma)
+            }
+
+
+router = ModelRouter()
@@ -1,12 +1,38 @@
+def _huddle_payload(huddle):
+    """
+    Self-contained payload for a Notion huddle: structured fields plus a compact
+    "document" text and short "preview", so a search hit can feed the prompt directly.
+    """
+    from qdrant_helpers import make_preview, compress_text_field
+
+    parts = [
+        ("Screenshot", huddle.get("screenshot", "")),
+        ("User Draft", huddle.get("draft", "")),
+        ("AI Suggested", huddle.get("ai", "")),
+        ("User Final", huddle.get("final", "")),
+    ]
+    document = "\n".join(f"{label}: {value.strip()}" for label, value in parts if value and value.strip())
+    payload = {
+        "source": "notion",
+        "page_id": huddle["id"],
+        "last_edited": huddle["last_edited"],
+        "screenshot": huddle.get("screenshot", ""),
+        "draft": huddle.get("draft", ""),
+        "ai": huddle.get("ai", ""),
+        "final": huddle.get("final", ""),
+        "preview": make_preview(document),
+    }
+    return compress_text_field(payload, "document", document)
+
 def embed_huddles_qdrant():
     from huddle_fetcher import fetch_huddles
     from qdrant_client import QdrantClient
     from qdrant_client.models import (
         PointStruct, VectorParams, Distance,
-        Filter, FieldCondition, MatchValue
+        Filter, MatchValue, MatchAny, FilterSelector
     )
     from vectorizer import embed_batch
-    from uuid import uuid4
+    from qdrant_helpers import ensure_payload_indexes, field_condition
     import os
 
     client = QdrantClient(
@@ -38,26 +64,8 @@ def embed_huddles_qdrant():
         )
         print("✅ Collection created.")
 
-        # ✅ Add index so filtering by page_id works
-        client.create_payload_index(
-            collection_name=collection_name,
-            field_name="page_id",
-            field_schema="keyword"
-        )
-        print("✅ Index created on page_id.")
-
-    # ✅ Optional: ensure index exists even if collection wasn't recreated
-    try:
-        indexes = client.get_collection(collection_name).payload_schema
-        if "page_id" not in indexes:
-            client.create_payload_index(
-                collection_name=collection_name,
-                field_name="page_id",
-                field_schema="keyword"
-            )
-            print("✅ Index created on page_id (post-check).")
-    except Exception as e:
-        print(f"⚠️ Failed to verify or create index: {e}")
+    # ✅ Declare/verify every filtered payload index (page_id, source, last_edited, ...)
+    ensure_payload_indexes(client, collection_name)
 
     all_huddles = fetch_huddles()
     print(f"🔎 Found {len(all_huddles)} huddles from Notion")
@@ -70,7 +78,7 @@ def embed_huddles_qdrant():
                 collection_name=collection_name,
                 scroll_filter=Filter(
                     must=[
-                        FieldCondition(key="page_id", match=MatchValue(value=huddle["id"]))
+                        field_condition(collection_name, "page_id", MatchValue(value=huddle["id"]))
                     ]
                 ),
                 limit=1
@@ -82,7 +90,9 @@ def embed_huddles_qdrant():
 
         if (
             not existing_payload or
-            existing_payload.get("last_edited") != huddle["last_edited"]
+            existing_payload.get("last_edited") != huddle["last_edited"] or
+            # Points synced before payloads carried the huddle text are re-synced once.
+            ("document" not in existing_payload and "document_zstd" not in existing_payload)
         ):
             huddles_to_embed.append(huddle)
 
@@ -96,17 +106,20 @@ def embed_huddles_qdrant():
 
         points = [
             PointStruct(
-                id=str(uuid4()),
+                id=h["id"],  # Notion page ids are UUIDs, so updates overwrite in place
                 vector=vec,
-                payload={
-                    "source": "notion",
-                    "page_id": h["id"],
-                    "last_edited": h["last_edited"]
-                }
+                payload=_huddle_payload(h)
             )
             for h, vec in zip(batch, vectors)
         ]
 
+        # Drop earlier random-id points for these pages so they don't linger as dead hits.
+        client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(
+                filter=Filter(must=[field_condition(collection_name, "page_id", MatchAny(any=[h["id"] for h in batch]))])
+            )
+        )
         client.upsert(collection_name=collection_name, points=points)
         print(f"✅ Uploaded batch {i // batch_size + 1} with {len(points)} huddles")
 
@@ -0,0 +1,20 @@
+# objections.py
+# Keyword-based objection categories shared by the Past Huddles view and the model router.
+
+OBJECTION_CATEGORIES = [
+    ("💼 What's the business?", ["what's the business", "what is it", "what do you do", "side hustle", "what is this"]),
+    ("🤔 Is it like...?", ["property", "shares", "trading", "dropshipping", "like...?"]),
+    ("💰 How do you make money?", ["make money", "how much", "charge", "income", "revenue", "profit"]),
+    ("👥 Who are your mentors?", ["mentor", "mentors", "mentorship", "coach", "coaching"]),
+    ("🤝 How do I get involved?", ["get connected", "get involved", "how did you get in", "how do i join", "selection process"]),
+    ("⚠️ Is it a pyramid scheme?", ["pyramid scheme", "ponzi"]),
+    ("💄 Product-related questions", ["skincare", "energy drinks", "makeup", "products", "selling", "sell"]),
+]
+GENERAL_CATEGORY = "💬 General"
+
+def detect_objection_category(text):
+    text = (text or "").lower()
+    for category, keywords in OBJECTION_CATEGORIES:
+        if any(keyword in text for keyword in keywords):
+            return category
+    return GENERAL_CATEGORY
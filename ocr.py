@@ -3,17 +3,77 @@ import time
 from google.cloud import vision
 import io
 from dotenv import load_dotenv
+from async_runtime import loop_local, run_sync
+from metrics import OCR_LATENCY, OCR_REQUESTS, track
+from tracing import current_span, traced
 
 # Load environment variables (e.g., for GOOGLE_APPLICATION_CREDENTIALS if not set globally)
 load_dotenv()
 
-# Note: The Google Cloud Vision client (vision.ImageAnnotatorClient())
+# Note: The Google Cloud Vision client (vision.ImageAnnotatorAsyncClient())
 # will automatically use the GOOGLE_APPLICATION_CREDENTIALS environment variable
 # if it's set correctly.
 
-def extract_text_from_image(image_path_or_bytes):
+# host:port of a plaintext Vision-compatible gRPC endpoint (local stand-ins, e.g. the benchmarks).
+VISION_API_ENDPOINT = os.getenv("VISION_API_ENDPOINT")
+
+def _vision_client():
+    if VISION_API_ENDPOINT:
+        import grpc
+        from google.cloud.vision_v1.services.image_annotator.transports import ImageAnnotatorGrpcAsyncIOTransport
+        channel = grpc.aio.insecure_channel(VISION_API_ENDPOINT)
+        return vision.ImageAnnotatorAsyncClient(transport=ImageAnnotatorGrpcAsyncIOTransport(channel=channel))
+    return vision.ImageAnnotatorAsyncClient()
+
+def _load_image_content(image_path_or_bytes):
+    """Returns the image bytes from a path or bytes input, or None if they can't be loaded."""
+    content = None
+    if isinstance(image_path_or_bytes, str):  # If it's a file path
+        if not os.path.exists(image_path_or_bytes):
+            print(f"OCR Error: Image path does not exist: {image_path_or_bytes}")
+            return None
+        try:
+            with io.open(image_path_or_bytes, 'rb') as image_file:
+                content = image_file.read()
+            print(f"OCR: Successfully read {len(content)} bytes from path: {image_path_or_bytes}")
+        except Exception as e:
+            print(f"OCR Error: Failed to read image file from path {image_path_or_bytes}: {e}")
+            return None
+    elif isinstance(image_path_or_bytes, bytes):  # If it's already image bytes
+        content = image_path_or_bytes
+        print(f"OCR: Received {len(content)} bytes directly.")
+    else:
+        print(f"OCR Error: Invalid input type for OCR. Expected image path (str) or bytes. Got {type(image_path_or_bytes)}.")
+        return None
+
+    if not content: # Double check if content is None or empty after trying to load
+        print("OCR Error: Image content is empty or could not be loaded.")
+        return None
+    return content
+
+def _text_from_response(response):
+    if response.error.message:
+        # This means the API call itself had an issue (e.g., auth, permissions, invalid request)
+        print(f"OCR API Error: {response.error.message}")
+        raise Exception(f"Google Cloud Vision API Error: {response.error.message}")
+
+    extracted_text = ""
+    if response.full_text_annotation:
+        extracted_text = response.full_text_annotation.text
+        print(f"OCR: Successfully extracted text. Length: {len(extracted_text)}")
+        if not extracted_text.strip():
+             print("OCR Warning: Extracted text is empty or only whitespace. Full annotation might have details.")
+    else:
+        # This means the API call was successful, but it found no text annotations.
+        print("OCR Warning: No text found by API (full_text_annotation is missing or empty).")
+        print("OCR Debug: Full API Response object for no-text scenario:")
+        print(str(response)[:1000]) # Print first 1000 chars of response string
+    return extracted_text.strip()
+
+@traced("ocr")
+async def extract_text_from_image_async(image_path_or_bytes):
     """
-    Extracts text from an image using Google Cloud Vision API.
+    Extracts text from an image using the async Google Cloud Vision client.
     :param image_path_or_bytes: Path to the image file or the image bytes.
     :return: Extracted text as a string, or an empty string if an error occurs or no text is found.
     """
@@ -21,76 +81,40 @@ def extract_text_from_image(image_path_or_bytes):
     print(f"OCR: Starting text extraction. Input type: {type(image_path_or_bytes)}")
 
     try:
-        # Initialize client per call - generally robust.
+        # One async client per event loop; it reuses its gRPC channel across requests.
         # Ensure GOOGLE_APPLICATION_CREDENTIALS env var is set and points to a valid service account JSON key file.
-        gcv_client = vision.ImageAnnotatorClient()
+        gcv_client = loop_local("vision", _vision_client)
 
-        content = None
-        if isinstance(image_path_or_bytes, str):  # If it's a file path
-            if not os.path.exists(image_path_or_bytes):
-                print(f"OCR Error: Image path does not exist: {image_path_or_bytes}")
-                return ""
-            try:
-                with io.open(image_path_or_bytes, 'rb') as image_file:
-                    content = image_file.read()
-                print(f"OCR: Successfully read {len(content)} bytes from path: {image_path_or_bytes}")
-            except Exception as e:
-                print(f"OCR Error: Failed to read image file from path {image_path_or_bytes}: {e}")
-                return ""
-        elif isinstance(image_path_or_bytes, bytes):  # If it's already image bytes
-            content = image_path_or_bytes
-            print(f"OCR: Received {len(content)} bytes directly.")
-        else:
-            print(f"OCR Error: Invalid input type for OCR. Expected image path (str) or bytes. Got {type(image_path_or_bytes)}.")
+        content = _load_image_content(image_path_or_bytes)
+        if content is None:
             return ""
-
-        if not content: # Double check if content is None or empty after trying to load
-            print("OCR Error: Image content is empty or could not be loaded.")
-            return ""
-
-        # Prepare the image for the Vision API
-        image = vision.Image(content=content)
+        current_span().set(image_bytes=len(content))
 
         # Perform document text detection (generally good for screenshots with structured text)
         print("OCR: Sending request to Google Cloud Vision API (document_text_detection)...")
-        response = gcv_client.document_text_detection(image=image)
-
-        if response.error.message:
-            # This means the API call itself had an issue (e.g., auth, permissions, invalid request)
-            print(f"OCR API Error: {response.error.message}")
-            # You might want to raise an exception here or handle it more specifically
-            raise Exception(f"Google Cloud Vision API Error: {response.error.message}")
-
-        extracted_text = ""
-        if response.full_text_annotation:
-            extracted_text = response.full_text_annotation.text
-            print(f"OCR: Successfully extracted text. Length: {len(extracted_text)}")
-            if not extracted_text.strip():
-                 print("OCR Warning: Extracted text is empty or only whitespace. Full annotation might have details.")
-        else:
-            # This means the API call was successful, but it found no text annotations.
-            print("OCR Warning: No text found by API (full_text_annotation is missing or empty).")
-            print("OCR Debug: Full API Response object for no-text scenario:")
-            # Be cautious printing the full response if it could contain sensitive data,
-            # but for debugging 'no text' it can be very helpful.
-            # For now, let's just indicate its status.
-            print(str(response)[:1000]) # Print first 1000 chars of response string
-
-        end_time = time.time()
-        processing_time = end_time - start_time
+        # The async client has no document_text_detection helper; send the equivalent batch request.
+        with track(OCR_REQUESTS, OCR_LATENCY):
+            batch_response = await gcv_client.batch_annotate_images(requests=[vision.AnnotateImageRequest(
+                image=vision.Image(content=content),
+                features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+            )])
+            extracted_text = _text_from_response(batch_response.responses[0])
+        current_span().set(chars=len(extracted_text))
+
+        processing_time = time.time() - start_time
         print(f"OCR: Google Cloud Vision processing completed in {processing_time:.2f} seconds.")
-        
-        return extracted_text.strip()
+        return extracted_text
 
     except Exception as e:
-        end_time = time.time()
-        processing_time = end_time - start_time
+        processing_time = time.time() - start_time
         print(f"OCR Error: Unexpected exception during Google Cloud Vision API call (took {processing_time:.2f}s): {e}")
-        # Consider logging the full traceback here in a real application for better debugging
-        # import traceback
-        # print(traceback.format_exc())
+        current_span().set(error=str(e))
         return ""
 
+def extract_text_from_image(image_path_or_bytes):
+    """Sync wrapper around extract_text_from_image_async for existing callers."""
+    return run_sync(extract_text_from_image_async(image_path_or_bytes))
+
 
 # --- Functions related to PIL, Pytesseract, and local cropping ---
 # These are not currently used by extract_text_from_image but kept for reference
@@ -0,0 +1,221 @@
+"""
+Opt-in statistical profiler for the reply pipeline.
+
+    with profiling("huddle_play.reply") as profile:   # profile is None when not enabled
+        ...
+
+While a profile is open, a daemon thread samples the Python stacks of the pipeline's
+threads (the caller's thread, the async core loop, tone/encoder workers) every
+PROFILER_INTERVAL_MS using sys._current_frames(). Nothing runs when no profile is open.
+
+Samples parked in a blocking call get a synthetic leaf frame, "[wait: network]" (socket,
+ssl, selector) or "[wait: lock]" (locks, queues, futures). That separates I/O waits from
+CPU time (PIL decode, PyMuPDF, MiniLM encode, rendering). Idle pool workers waiting for
+work are dropped.
+
+The last PROFILER_MAX_PROFILES profiles are kept in memory. Each can be exported as
+speedscope JSON (https://www.speedscope.app) or as collapsed stacks for flamegraph.pl/inferno.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+PROFILER_MAX_PROFILES = int(os.getenv("PROFILER_MAX_PROFILES", "10"))
+PROFILER_MAX_SAMPLES = int(os.getenv("PROFILER_MAX_SAMPLES", "200000"))
+PROFILER_MAX_DEPTH = 128
+
+# Threads that run pipeline work besides the thread that opened the profile (name prefixes).
+PIPELINE_THREAD_PREFIXES = (
+    "async-core", "encoder-worker", "tone-prefetch", "candidate-pool-refill", "asyncio_",
+)
+
+_NETWORK_WAITS = {("selectors.py", "select"), ("ssl.py", "read"), ("ssl.py", "recv_into"),
+                  ("socket.py", "readinto"), ("socket.py", "recv_into"), ("socket.py", "create_connection")}
+_LOCK_WAITS = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+               ("_base.py", "result"), ("_base.py", "wait")}
+
+
+def _wait_kind(frame):
+    key = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+    if key in _NETWORK_WAITS:
+        return "[wait: network]"
+    if key in _LOCK_WAITS:
+        return "[wait: lock]"
+    return None
+
+
+def _is_idle_worker(frame):
+    # Pool threads parked on their work queue between jobs: only queue/lock frames above the worker loop.
+    while frame is not None and os.path.basename(frame.f_code.co_filename) in ("threading.py", "queue.py"):
+        frame = frame.f_back
+    if frame is None:
+        return False
+    code = frame.f_code
+    return (code.co_name == "_worker" and code.co_filename.endswith(os.path.join("concurrent", "futures", "thread.py"))) \
+        or (code.co_name == "_run_worker" and code.co_filename.endswith("encoder.py"))
+
+
+class Profile:
+    def __init__(self, name, interval_ms):
+        self.name = name
+        self.interval_ms = interval_ms
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+        self.trace_id = None
+        self.frames = []          # [(function, file, line)]
+        self._frame_index = {}
+        self.samples = []         # [(elapsed ms, thread name, (frame indexes root -> leaf), weight ms)]
+        self.truncated = False
+
+    def _frame_id(self, key):
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def add_sample(self, elapsed_ms, thread_name, frame, weight_ms):
+        if len(self.samples) >= PROFILER_MAX_SAMPLES:
+            self.truncated = True
+            return
+        if _is_idle_worker(frame):
+            return
+        wait_kind = _wait_kind(frame)
+        stack = []
+        while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+            code = frame.f_code
+            stack.append(self._frame_id((code.co_name, code.co_filename, frame.f_lineno)))
+            frame = frame.f_back
+        stack.reverse()
+        if wait_kind:
+            stack.append(self._frame_id((wait_kind, "", 0)))
+        self.samples.append((elapsed_ms, thread_name, tuple(stack), weight_ms))
+
+    def summary(self):
+        threads = sorted({thread for _, thread, _, _ in self.samples})
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1),
+            "samples": len(self.samples),
+            "threads": threads,
+            "truncated": self.truncated,
+        }
+
+    def to_speedscope(self):
+        """speedscope file format: one sampled profile per thread, sharing one frame table."""
+        by_thread = {}
+        for elapsed_ms, thread, stack, weight_ms in self.samples:
+            by_thread.setdefault(thread, []).append((elapsed_ms, stack, weight_ms))
+        profiles = []
+        for thread, samples in sorted(by_thread.items()):
+            profiles.append({
+                "type": "sampled",
+                "name": thread,
+                "unit": "milliseconds",
+                "startValue": samples[0][0],
+                "endValue": samples[-1][0] + samples[-1][2],
+                "samples": [list(stack) for _, stack, _ in samples],
+                "weights": [round(weight, 3) for _, _, weight in samples],
+            })
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "huddle-assistant profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [
+                {"name": name, "file": filename, "line": line} if filename else {"name": name}
+                for name, filename, line in self.frames
+            ]},
+            "profiles": profiles,
+        })
+
+    def to_collapsed(self):
+        """Folded stacks ("thread;frame;frame <weight>") for flamegraph.pl, inferno or speedscope."""
+        totals = {}
+        for _, thread, stack, weight_ms in self.samples:
+            key = (thread, stack)
+            totals[key] = totals.get(key, 0.0) + weight_ms
+        lines = []
+        for (thread, stack), weight_ms in totals.items():
+            names = [thread] + [
+                f"{name} ({os.path.basename(filename)}:{line})" if filename else name
+                for name, filename, line in (self.frames[i] for i in stack)
+            ]
+            # Integer weights (microseconds), as the flamegraph tools expect.
+            lines.append(f"{';'.join(n.replace(';', ':') for n in names)} {int(round(weight_ms * 1000))}")
+        return "\n".join(sorted(lines)) + "\n"
+
+
+class SamplingProfiler:
+    def __init__(self, name, interval_ms=PROFILER_INTERVAL_MS, thread_ids=None):
+        self.profile = Profile(name, interval_ms)
+        self._interval = interval_ms / 1000.0
+        self._thread_ids = set(thread_ids or ())
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def _wanted(self, thread):
+        return thread.ident in self._thread_ids or thread.name.startswith(PIPELINE_THREAD_PREFIXES)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self._interval):
+            now = time.perf_counter()
+            weight_ms = (now - last) * 1000
+            last = now
+            elapsed_ms = (now - self._started) * 1000
+            threads = {t.ident: t for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                thread = threads.get(thread_id)
+                if thread_id == own_id or thread is None or not self._wanted(thread):
+                    continue
+                self.profile.add_sample(elapsed_ms, thread.name, frame, weight_ms)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.profile.duration_ms = (time.perf_counter() - self._started) * 1000
+        return self.profile
+
+
+# ====== STORE ======
+
+_profiles = deque(maxlen=PROFILER_MAX_PROFILES)
+_profiles_lock = threading.Lock()
+
+
+def recent_profiles():
+    """Stored profiles, newest first."""
+    with _profiles_lock:
+        return list(reversed(_profiles))
+
+
+@contextmanager
+def profiling(name, enabled=True, interval_ms=PROFILER_INTERVAL_MS):
+    """Samples the pipeline while the block runs and stores the profile. Yields None (and costs nothing) if disabled."""
+    if not enabled:
+        yield None
+        return
+    profiler = SamplingProfiler(name, interval_ms, thread_ids=[threading.get_ident()]).start()
+    try:
+        yield profiler.profile
+    finally:
+        profile = profiler.stop()
+        with _profiles_lock:
+            _profiles.append(profile)
+        print(f"🔬 Profile '{name}': {len(profile.samples)} samples over {profile.duration_ms / 1000:.2f}s")
@@ -0,0 +1,118 @@
+"""
+Token counting and budgeted prompt assembly for the reply generator.
+
+Sections are filled in priority order, each up to its own cap and the remaining
+overall budget, and trimmed at sentence boundaries instead of mid-word.
+"""
+import os
+import re
+
+PROMPT_CONTEXT_BUDGET = int(os.getenv("PROMPT_CONTEXT_BUDGET", "1350"))
+
+# (section name, priority, max tokens). Lower priority number is filled first.
+DEFAULT_SECTION_BUDGETS = [
+    ("draft", 1, int(os.getenv("PROMPT_BUDGET_DRAFT", "200"))),
+    ("screenshot", 2, int(os.getenv("PROMPT_BUDGET_SCREENSHOT", "400"))),
+    ("huddles", 3, int(os.getenv("PROMPT_BUDGET_HUDDLES", "450"))),
+    ("docs", 4, int(os.getenv("PROMPT_BUDGET_DOCS", "300"))),
+]
+
+# A section squeezed below this many tokens is dropped rather than sent as a fragment.
+MIN_SECTION_TOKENS = 16
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_encoders = {}
+
+
+def _get_encoding(model_name):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    if model_name not in _encoders:
+        try:
+            try:
+                _encoders[model_name] = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                _encoders[model_name] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # The BPE file is downloaded on first use; offline, estimate instead of failing the request.
+            print(f"⚠️ tiktoken encoding unavailable for {model_name} ({e}). Estimating tokens.")
+            _encoders[model_name] = None
+    return _encoders[model_name]
+
+
+def count_tokens(text, model_name="gpt-4o"):
+    """Counts tokens with tiktoken, or estimates ~4 characters per token without it."""
+    if not text:
+        return 0
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def trim_to_sentences(text, max_tokens, model_name="gpt-4o"):
+    """
+    Keeps whole sentences from the start of text until max_tokens is reached.
+    Falls back to a word-boundary cut if even the first sentence is too long.
+    """
+    text = (text or "").strip()
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text, model_name) <= max_tokens:
+        return text
+
+    kept = ""
+    for match in re.finditer(r".+?(?:[.!?](?=\s)|\n+|$)", text, flags=re.DOTALL):
+        candidate = text[:match.end()].rstrip()
+        if count_tokens(candidate, model_name) > max_tokens:
+            break
+        kept = candidate
+    if kept:
+        return kept
+
+    words = text.split()
+    while words and count_tokens(" ".join(words), model_name) > max_tokens:
+        words = words[:max(1, int(len(words) * 0.8))] if len(words) > 1 else []
+    return " ".join(words)
+
+
+def trim_chars_to_sentence(text, max_chars):
+    """Character-capped variant used at retrieval time: cuts at the last sentence end within max_chars."""
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return text
+    window = text[:max_chars]
+    ends = [m.start() for m in _SENTENCE_END_RE.finditer(window)]
+    if ends and ends[-1] > max_chars // 3:
+        return window[:ends[-1]].strip()
+    return window.rsplit(" ", 1)[0].strip()
+
+
+def assemble_context(sections, budget=None, section_budgets=None, model_name="gpt-4o"):
+    """
+    Allocates a token budget across prompt sections by priority.
+    :param sections: {section name: text}
+    :return: ({section name: trimmed text}, {section name: tokens used, "total": ...})
+    """
+    budget = PROMPT_CONTEXT_BUDGET if budget is None else budget
+    section_budgets = section_budgets or DEFAULT_SECTION_BUDGETS
+    remaining = budget
+    trimmed = {}
+    usage = {}
+    for name, _, cap in sorted(section_budgets, key=lambda item: item[1]):
+        text = sections.get(name, "")
+        allowed = min(cap, remaining)
+        if allowed < MIN_SECTION_TOKENS and count_tokens(text, model_name) > allowed:
+            allowed = 0
+        trimmed[name] = trim_to_sentences(text, allowed, model_name)
+        usage[name] = count_tokens(trimmed[name], model_name)
+        remaining -= usage[name]
+    # Sections without a declared budget pass through untouched.
+    for name, text in sections.items():
+        if name not in trimmed:
+            trimmed[name] = text
+            usage[name] = count_tokens(text, model_name)
+    usage["total"] = sum(v for k, v in usage.items() if k != "total")
+    return trimmed, usage
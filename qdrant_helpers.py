@@ -1,11 +1,192 @@
-from qdrant_client import QdrantClient  # ✅ just use official package
+from qdrant_client import AsyncQdrantClient, QdrantClient  # ✅ just use official package
+from qdrant_client.models import FieldCondition
+import base64
 import os
+from collections import defaultdict
 from dotenv import load_dotenv
+from async_runtime import loop_local
 
 load_dotenv()
 
+# ====== PAYLOAD INDEXES ======
+# Every payload field used in a query/scroll filter must be indexed, otherwise Qdrant
+# evaluates the filter point-by-point and may fall back to slow filtered HNSW traversal.
+PAYLOAD_INDEXES = {
+    "tone_training_memory": {
+        "tone": "keyword",
+        "source": "keyword",
+        "page_id": "keyword",
+        "last_edited": "datetime",
+    },
+    "huddle_memory": {
+        "source": "keyword",
+        "page_id": "keyword",
+        "last_edited": "datetime",
+        "created_at": "datetime",
+    },
+    "docs_memory": {
+        "source": "keyword",
+    },
+}
+
+# Every payload field a query/scroll/delete filter is built on, per collection. Declared statically
+# so report_unindexed_filters can check them from any process, including ones (like memory_sync)
+# that never build the filters themselves; tests/test_qdrant_helpers.py keeps it in step with the
+# field_condition() call sites.
+FILTERED_FIELDS = {
+    "tone_training_memory": {"tone", "page_id"},
+    "huddle_memory": {"page_id"},
+}
+
+# Payload fields this process has actually filtered on, per collection.
+_filtered_fields = defaultdict(set)
+
+def field_condition(collection_name, key, match):
+    """A FieldCondition on `key`; warns once if the field is undeclared in FILTERED_FIELDS or PAYLOAD_INDEXES."""
+    if key not in _filtered_fields[collection_name]:
+        _filtered_fields[collection_name].add(key)
+        if key not in FILTERED_FIELDS.get(collection_name, set()):
+            print(f"⚠️ Filtering '{collection_name}' on '{key}', which has no entry in FILTERED_FIELDS.")
+        if key not in PAYLOAD_INDEXES.get(collection_name, {}):
+            print(f"⚠️ Filtering '{collection_name}' on '{key}', which has no entry in PAYLOAD_INDEXES.")
+    return FieldCondition(key=key, match=match)
+
+# Short server-side preview stored at ingest so searches don't have to ship the full text.
+PREVIEW_MAX_CHARS = 400
+
+def make_preview(text, max_chars=PREVIEW_MAX_CHARS):
+    text = (text or "").strip()
+    return text[:max_chars].strip()
+
+# Set QDRANT_PAYLOAD_COMPRESSION=zstd to store long texts as base64 zstd in "<field>_zstd"
+# (needs the optional `zstandard` package; falls back to plain text without it).
+PAYLOAD_COMPRESSION = os.getenv("QDRANT_PAYLOAD_COMPRESSION", "none").lower()
+
+def compress_text_field(payload, field_name, text):
+    """Stores text under field_name, or zstd-compressed under f"{field_name}_zstd" if enabled."""
+    if PAYLOAD_COMPRESSION == "zstd" and text:
+        try:
+            import zstandard
+            compressed = zstandard.ZstdCompressor(level=10).compress(text.encode("utf-8"))
+            payload[f"{field_name}_zstd"] = base64.b64encode(compressed).decode("ascii")
+            return payload
+        except ImportError:
+            print("⚠️ zstandard not installed; storing payload text uncompressed.")
+    payload[field_name] = text
+    return payload
+
+def read_text_field(payload, field_name):
+    """Reads a text field written by compress_text_field (plain or zstd)."""
+    if payload.get(field_name):
+        return payload[field_name]
+    compressed = payload.get(f"{field_name}_zstd")
+    if not compressed:
+        return ""
+    try:
+        import zstandard
+        raw = zstandard.ZstdDecompressor().decompress(base64.b64decode(compressed))
+        return raw.decode("utf-8")
+    except Exception as e:
+        print(f"⚠️ Failed to decompress {field_name}: {e}")
+        return ""
+
 def get_qdrant_client():
     return QdrantClient(
         url=os.getenv("QDRANT_URL"),
         api_key=os.getenv("QDRANT_API_KEY")
     )
+
+def get_async_qdrant_client():
+    """One AsyncQdrantClient per event loop (its HTTP connection pool is loop-bound)."""
+    return loop_local("qdrant", lambda: AsyncQdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY")
+    ))
+
+def load_payload_map(client, collection_name, key_field, value_field, page_size=256):
+    """
+    Scrolls a whole collection once and returns {payload[key_field]: payload[value_field]}.
+    Only the two payload fields are fetched, never vectors.
+    """
+    mapping = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=[key_field, value_field],
+            with_vectors=False,
+        )
+        for point in points:
+            payload = point.payload or {}
+            if payload.get(key_field) is not None:
+                mapping[payload[key_field]] = payload.get(value_field)
+        if offset is None:
+            break
+    return mapping
+
+def upsert_in_batches(client, collection_name, points, batch_size=64):
+    """Upserts points in fixed-size batches. Returns the number of points written."""
+    written = 0
+    for i in range(0, len(points), batch_size):
+        batch = points[i:i + batch_size]
+        client.upsert(collection_name=collection_name, points=batch)
+        written += len(batch)
+        print(f"✅ Upserted batch {i // batch_size + 1} with {len(batch)} points into '{collection_name}'")
+    return written
+
+def ensure_payload_indexes(client, collection_name, indexes=None):
+    """
+    Creates any declared payload index that the collection is missing.
+    Returns the list of fields that were created.
+    """
+    indexes = PAYLOAD_INDEXES.get(collection_name, {}) if indexes is None else indexes
+    try:
+        existing = client.get_collection(collection_name).payload_schema or {}
+    except Exception as e:
+        print(f"⚠️ Could not read payload schema for '{collection_name}': {e}")
+        return []
+
+    created = []
+    for field_name, field_schema in indexes.items():
+        if field_name in existing:
+            continue
+        try:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema
+            )
+            created.append(field_name)
+            print(f"✅ Index created on {collection_name}.{field_name} ({field_schema})")
+        except Exception as e:
+            print(f"⚠️ Failed to create index {collection_name}.{field_name}: {e}")
+    return created
+
+def report_unindexed_filters(client=None):
+    """
+    Compares the declared payload indexes and filtered fields, plus any field filtered on so far
+    in this process, with each collection's payload schema. Returns {collection_name: [unindexed fields]} and prints a
+    warning for each gap.
+    """
+    client = client or get_qdrant_client()
+    report = {}
+    for collection_name in sorted(set(PAYLOAD_INDEXES) | set(FILTERED_FIELDS) | set(_filtered_fields)):
+        fields = sorted(
+            set(PAYLOAD_INDEXES.get(collection_name, {}))
+            | FILTERED_FIELDS.get(collection_name, set())
+            | _filtered_fields[collection_name]
+        )
+        try:
+            existing = client.get_collection(collection_name).payload_schema or {}
+        except Exception as e:
+            print(f"⚠️ Index check skipped for '{collection_name}': {e}")
+            continue
+        missing = [f for f in fields if f not in existing]
+        if missing:
+            report[collection_name] = missing
+            print(f"⚠️ Unindexed filter fields on '{collection_name}': {', '.join(missing)}")
+    if not report:
+        print("✅ All filtered payload fields are indexed.")
+    return report
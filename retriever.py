@@ -1,10 +1,8 @@
 import os
 import pandas as pd
-from sentence_transformers import SentenceTransformer, util
-
-# ✅ Load model inside a function to avoid Streamlit file-watcher issues
-def get_model():
-    return SentenceTransformer("all-MiniLM-L6-v2")
+from sentence_transformers import util
+# ✅ Shared process-wide encoder (loaded once, micro-batched across sessions)
+from encoder import encode, get_model
 
 def retrieve_similar_human_edit(new_text, csv_path="tone_training_log.csv", top_k=1):
     if not os.path.exists(csv_path):
@@ -17,9 +15,8 @@ def retrieve_similar_human_edit(new_text, csv_path="tone_training_log.csv", top_
     if not texts:
         return None, None
 
-    model = get_model()
-    query_embedding = model.encode(new_text, convert_to_tensor=True)
-    corpus_embeddings = model.encode(texts, convert_to_tensor=True)
+    query_embedding = encode(new_text)
+    corpus_embeddings = encode(texts)
 
     hits = util.semantic_search(query_embedding, corpus_embeddings, top_k=top_k)[0]
 
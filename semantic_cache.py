@@ -0,0 +1,104 @@
+"""
+Opt-in semantic cache for generated replies.
+
+Requests are embedded with the shared local MiniLM encoder and matched against earlier
+requests with the same scope (team or user), model and prompt version. A hit needs a cosine
+similarity at or above SEMANTIC_CACHE_THRESHOLD and an entry younger than the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from encoder import encode, encode_async
+from metrics import CACHE_EVENTS
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))
+# "team" shares hits across everyone; "user" only matches a user's own earlier requests. The user is
+# the API's user_id or the signed-in Streamlit viewer; anonymous Streamlit sessions are scoped per session.
+SEMANTIC_CACHE_SCOPE = os.getenv("SEMANTIC_CACHE_SCOPE", "team").lower()
+
+
+def resolve_scope(user_id=None):
+    if SEMANTIC_CACHE_SCOPE == "user" and user_id:
+        return f"user:{user_id}"
+    return "team"
+
+
+class SemanticCache:
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # entry id -> (partition, vector, reply, created_at)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @classmethod
+    def _vector(cls, screenshot_text, user_draft):
+        return cls._normalize(encode(f"{screenshot_text}\n\n{user_draft}"))
+
+    @classmethod
+    async def _vector_async(cls, screenshot_text, user_draft):
+        return cls._normalize(await encode_async(f"{screenshot_text}\n\n{user_draft}"))
+
+    def _expire_locked(self, now):
+        expired = [eid for eid, entry in self._entries.items() if now - entry[3] > self.ttl]
+        for eid in expired:
+            del self._entries[eid]
+
+    def lookup(self, partition, screenshot_text, user_draft):
+        """Returns (reply, similarity) for the closest fresh entry above threshold, else (None, best similarity)."""
+        return self._lookup_vector(partition, self._vector(screenshot_text, user_draft))
+
+    async def lookup_async(self, partition, screenshot_text, user_draft):
+        return self._lookup_vector(partition, await self._vector_async(screenshot_text, user_draft))
+
+    def _lookup_vector(self, partition, vector):
+        now = time.time()
+        with self._lock:
+            self._expire_locked(now)
+            best_id, best_score = None, -1.0
+            for eid, (entry_partition, entry_vector, _, _) in self._entries.items():
+                if entry_partition != partition:
+                    continue
+                score = float(np.dot(vector, entry_vector))
+                if score > best_score:
+                    best_id, best_score = eid, score
+            if best_id is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best_id)
+                self.stats["hits"] += 1
+                return self._entries[best_id][2], best_score
+            self.stats["misses"] += 1
+        return None, best_score
+
+    def store(self, partition, screenshot_text, user_draft, reply):
+        self._store_vector(partition, self._vector(screenshot_text, user_draft), reply)
+
+    async def store_async(self, partition, screenshot_text, user_draft, reply):
+        self._store_vector(partition, await self._vector_async(screenshot_text, user_draft), reply)
+
+    def _store_vector(self, partition, vector, reply):
+        with self._lock:
+            self._entries[self._next_id] = (partition, vector, reply, time.time())
+            self._next_id += 1
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+reply_cache = SemanticCache()
+CACHE_EVENTS.add_source(lambda: [({"cache": "semantic_reply", "event": k}, v) for k, v in reply_cache.stats.items()])
@@ -0,0 +1,172 @@
+"""
+Conversation starters for Instagram story replies.
+
+Shared by the Interruptions tab and the HTTP API. One request returns n starters
+(one choice each), optionally streamed. Generated sets are cached process-wide by
+(image hash, OCR text, tone guidance, prompt version, n).
+"""
+import asyncio
+import os
+import random
+import threading
+import textwrap
+
+from cachetools import TTLCache
+
+from llm_backend import llm
+from metrics import CACHE_EVENTS
+
+STARTER_MODEL = os.getenv("STARTER_MODEL", "gpt-4o")
+PROMPT_VERSIONS = ("A", "B")
+STARTER_SYSTEM_PROMPTS = {
+    "A": (
+        "You are an observant and thoughtful friend crafting Instagram story replies. "
+        "Your goal is to start genuine, warm, and curious conversations based strictly on the visible content. "
+        "Always reference what's actually there—no guessing or speculation. "
+        "Keep replies authentic, friendly, and simple. Use at most one emoji, only if it fits naturally."
+    ),
+    "B": (
+        "You are a friendly and engaging buddy replying to Instagram stories. "
+        "Your aim is to spark a fun and lighthearted chat by noticing something specific in the story. "
+        "Be curious and ask a simple question about what you see. "
+        "Keep it casual and use a single emoji to add a bit of personality."
+    ),
+}
+
+STARTER_USER_PROMPT = textwrap.dedent("""
+    A friend posted an Instagram story.
+
+    {story_content_line}
+
+    Guidance from past similar interactions:
+    {guidance_line}
+
+    Your Task:
+    Write a short, warm, and curious reply based strictly on the visible story (or text, if present). The reply should feel human and authentic.
+
+    Instructions:
+    - If image only: Mention or ask about something clearly visible. Don't speculate beyond what's shown. If unclear, use a general but positive line.
+    - If text: Respond thoughtfully to the text. Use past guidance if helpful.
+    - Where possible, include a question at the end to prompt conversation.
+    - Be authentic and simple. Avoid being overly clever, eccentric, or bubbly.
+    - Use at most one emoji, only if it fits.
+    - Do **not** use quotation marks in your draft.
+    - Do **not** use any preamble—just write the message directly.
+    - If the image contains overlays, music tags, or device UI, **ignore** them and focus only on the central, main scene or food.
+
+    Examples:
+    Good: "That breakfast looks amazing! Enjoy!"
+    Bad: "Cool project! What are you building?"
+""").strip()
+
+# Process-wide cache of generated starter sets, shared across sessions and API requests.
+_starter_cache = TTLCache(
+    maxsize=int(os.getenv("STARTER_CACHE_MAX_ENTRIES", "256")),
+    ttl=int(os.getenv("STARTER_CACHE_TTL_SECONDS", "3600")),
+)
+_starter_cache_lock = threading.Lock()
+STARTER_CACHE_STATS = {"hits": 0, "misses": 0, "bypassed": 0}
+CACHE_EVENTS.add_source(lambda: [({"cache": "starters", "event": k}, v) for k, v in STARTER_CACHE_STATS.items()])
+
+
+def _lookup_cached_starters(image_hash, text, guidance_line, n):
+    """Returns (starters, prompt_version) for any cached prompt version, or (None, None)."""
+    with _starter_cache_lock:
+        for version in PROMPT_VERSIONS:
+            cached = _starter_cache.get((image_hash, text, guidance_line, version, n))
+            if cached:
+                STARTER_CACHE_STATS["hits"] += 1
+                return list(cached), version
+        STARTER_CACHE_STATS["misses"] += 1
+    return None, None
+
+
+def _store_cached_starters(image_hash, text, guidance_line, prompt_version, n, starters):
+    if not starters:
+        return
+    with _starter_cache_lock:
+        _starter_cache[(image_hash, text, guidance_line, prompt_version, n)] = tuple(starters)
+
+
+def starter_guidance(text):
+    """One-line guidance from the most similar human-edited reply, if any."""
+    if not text.strip():
+        return "No text provided for specific guidance retrieval."
+    try:
+        from tone_fetcher import retrieve_similar_tone_example
+        human_example, _ = retrieve_similar_tone_example(text, "")
+        if human_example:
+            return f"Previously, a human reply to similar text was: {human_example}"
+        return "No similar past reply available."
+    except Exception:
+        return "No guidance available."
+
+
+def build_starter_messages(text, image_url, guidance_line, prompt_version):
+    story_content_line = (
+        f"Story Content: {text.strip() if text.strip() else 'This is an IMAGE. Before replying, list to yourself the main objects, scene, or food you *see*. Your reply must mention or ask about one of these visible elements.'}"
+    )
+    user_prompt = STARTER_USER_PROMPT.format(story_content_line=story_content_line, guidance_line=guidance_line)
+    user_content = user_prompt
+    if image_url:
+        user_content = [
+            {"type": "text", "text": user_prompt},
+            {"type": "image_url", "image_url": {"url": image_url}},
+        ]
+    return [
+        {"role": "system", "content": STARTER_SYSTEM_PROMPTS[prompt_version]},
+        {"role": "user", "content": user_content},
+    ]
+
+
+def _cached(image_hash, text, guidance_line, n, bypass_cache):
+    if bypass_cache:
+        STARTER_CACHE_STATS["bypassed"] += 1
+        return None, None
+    cached_starters, cached_version = _lookup_cached_starters(image_hash, text.strip(), guidance_line, n)
+    print(f"Starter cache: {'hit' if cached_starters else 'miss'} {STARTER_CACHE_STATS}")
+    return cached_starters, cached_version
+
+
+def generate_starters(text, image_hash, image_url=None, n=3, on_partial=None, bypass_cache=False):
+    """
+    Generates n starters in one request and returns (starters, prompt_version).
+    If on_partial is given the request is streamed and on_partial(index, text_so_far)
+    is called as each choice grows. Cached sets are reused unless bypass_cache is set.
+    """
+    guidance_line = starter_guidance(text)
+    cached_starters, cached_version = _cached(image_hash, text, guidance_line, n, bypass_cache)
+    if cached_starters:
+        # Reuse the A/B version the cached set was generated with.
+        return cached_starters, cached_version
+
+    prompt_version = random.choice(PROMPT_VERSIONS)
+    messages = build_starter_messages(text, image_url, guidance_line, prompt_version)
+    if on_partial is None:
+        result = llm.complete(messages, STARTER_MODEL, temperature=1.0, max_tokens=150, n=n)
+        completions = [t.strip() for t in result.texts if t and t.strip()]
+    else:
+        # One streamed n-choice request; chunks are demultiplexed by choice index.
+        completions = [""] * n
+        for index, delta in llm.stream(messages, STARTER_MODEL, temperature=1.0, max_tokens=150, n=n):
+            if delta and index < n:
+                completions[index] += delta
+                on_partial(index, completions[index])
+        completions = [c.strip() for c in completions if c.strip()]
+    _store_cached_starters(image_hash, text.strip(), guidance_line, prompt_version, n, completions)
+    return completions, prompt_version
+
+
+async def generate_starters_async(text, image_hash, image_url=None, n=3, bypass_cache=False):
+    """Async generate_starters (non-streaming). Returns (starters, prompt_version)."""
+    guidance_line = await asyncio.to_thread(starter_guidance, text)
+    cached_starters, cached_version = _cached(image_hash, text, guidance_line, n, bypass_cache)
+    if cached_starters:
+        return cached_starters, cached_version
+
+    prompt_version = random.choice(PROMPT_VERSIONS)
+    messages = build_starter_messages(text, image_url, guidance_line, prompt_version)
+    result = await llm.acomplete(messages, STARTER_MODEL, temperature=1.0, max_tokens=150, n=n)
+    completions = [t.strip() for t in result.texts if t and t.strip()]
+    _store_cached_starters(image_hash, text.strip(), guidance_line, prompt_version, n, completions)
+    return completions, prompt_version
@@ -1,36 +1,57 @@
-import openai
+import asyncio
 import os
 import re
+import time
+from types import SimpleNamespace
 from dotenv import load_dotenv
-from openai import OpenAI # Updated import
-from qdrant_client import QdrantClient
 # Assuming vectorizer.py contains embed_single
-from vectorizer import embed_single # Make sure this import is correct and vectorizer.py is in your project path
-import google.generativeai as genai
+from vectorizer import embed_batch_async # Make sure this import is correct and vectorizer.py is in your project path
+from async_runtime import run_sync
+from lexical_index import get_lexical_index, reciprocal_rank_fusion
+from prompt_budget import assemble_context, count_tokens, trim_chars_to_sentence
+from semantic_cache import SEMANTIC_CACHE_ENABLED, reply_cache
+from model_router import LARGE_MODEL, SMALL_MODEL, is_auto, is_downgrade, router
+from qdrant_helpers import PREVIEW_MAX_CHARS, get_async_qdrant_client, read_text_field
+# ✅ Provider-agnostic LLM backend (OpenAI primary, Gemini failover/hedge)
+from llm_backend import LLMUnavailableError, llm
+from metrics import QDRANT_LATENCY, QDRANT_REQUESTS, track
+from tracing import current_span, span, traced
 
 load_dotenv()
 
-# ====== API CLIENT INITIALIZATION ======
-# Initialize client once
-try:
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-    if not OPENAI_API_KEY:
-        raise ValueError("OPENAI_API_KEY environment variable not set.")
-    client = OpenAI(api_key=OPENAI_API_KEY)
-except Exception as e:
-    print(f"Critical Error initializing OpenAI client: {e}. Suggestor functions will not work.")
-    client = None
+if not llm.available():
+    print("Critical Error: no LLM provider configured (OPENAI_API_KEY / GEMINI_API_KEY). Suggestor functions will not work.")
 
 # ====== CONSTANTS =======
 MAX_HUDDLES_CONTEXT = 3 
 MAX_DOCS_CONTEXT = 2    
 MAX_CHUNK_LEN_CONTEXT = 400 
 VECTOR_SIZE = 1536 
+# Hybrid retrieval: dense and BM25 candidates per collection, fused with RRF down to the MAX_* limits.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "8"))
+
+# Bump whenever SYSTEM_PROMPT or the reply prompt layout changes, so cached replies aren't reused.
+PROMPT_VERSION = "reply-v3"
+
+# Reply principles used by the UI and the HTTP API (kept byte-identical so the prompt prefix stays cacheable).
+DEFAULT_PRINCIPLES = '''
+            1.  **Clarity & Impact:** Is the core message instantly understandable and engaging?
+            2.  **Curiosity, Not Persuasion:** Does the reply invite dialogue with genuine questions rather than trying to sell or convince?
+            3.  **Build Rapport:** Does it strengthen the connection with the recipient, reflecting empathy and understanding?
+            4.  **Concise & Authentic:** Is it brief, warm, and does it sound like a real person, not a script?
+            5.  **Strategic Next Step:** Does it naturally guide the conversation towards understanding their needs or openness, in line with the Huddle flow?
+            '''
 
 # Collection names for Qdrant
 HUDDLE_MEMORY_COLLECTION = "huddle_memory"
 DOCS_MEMORY_COLLECTION = "docs_memory"
 
+# Payload fields fetched per context hit. Full texts are only fetched for points
+# ingested before the "preview" field existed.
+CONTEXT_PAYLOAD_FIELDS = ["preview", "source"]
+CONTEXT_FALLBACK_PAYLOAD_FIELDS = ["document", "document_zstd", "text", "source"]
+
 SYSTEM_PROMPT = (
     "You are a warm, emotionally intelligent, and concise assistant trained for network marketing conversations. "
     "Your replies should sound human, personal, and naturally flowing—never robotic, scripted, or overly formal. "
@@ -81,11 +102,12 @@ def zip_qdrant_results_for_context(results, max_chunk_len):
 
     for r in results:
         if r.payload: 
-            doc_content = r.payload.get("document", r.payload.get("text", "")) 
+            doc_content = r.payload.get("preview") if max_chunk_len <= PREVIEW_MAX_CHARS else None
+            doc_content = doc_content or read_text_field(r.payload, "document") or r.payload.get("text", "")
             source_info = r.payload.get("source", "unknown source")
             
             if doc_content and isinstance(doc_content, str):
-                truncated_doc = doc_content[:max_chunk_len].strip()
+                truncated_doc = trim_chars_to_sentence(doc_content, max_chunk_len)
                 if truncated_doc and truncated_doc not in seen_content_for_context:
                     out.append({
                         "document": truncated_doc,
@@ -94,14 +116,76 @@ def zip_qdrant_results_for_context(results, max_chunk_len):
                     seen_content_for_context.add(truncated_doc)
     return out
 
+async def fill_missing_previews(qdrant_client, collection_name, results):
+    """
+    Fetches full text for hits that were ingested without a "preview" field,
+    in a single retrieve call, and merges it into their payloads.
+    """
+    missing_ids = [r.id for r in results if r.payload is not None and not r.payload.get("preview")]
+    if not missing_ids:
+        return results
+    try:
+        with span("qdrant.retrieve", collection=collection_name, ids=len(missing_ids)), \
+                track(QDRANT_REQUESTS, QDRANT_LATENCY, operation="retrieve", collection=collection_name):
+            records = await qdrant_client.retrieve(
+                collection_name=collection_name,
+                ids=missing_ids,
+                with_payload=CONTEXT_FALLBACK_PAYLOAD_FIELDS,
+                with_vectors=False
+            )
+        full_payloads = {rec.id: rec.payload or {} for rec in records}
+        for r in results:
+            if r.id in full_payloads:
+                r.payload.update(full_payloads[r.id])
+    except Exception as e:
+        print(f"Error fetching full payloads from {collection_name}: {e}")
+    return results
+
+async def hybrid_search(qdrant_client, collection_name, query_vector, query_text, limit):
+    """
+    Dense search plus BM25 over the same collection, fused with reciprocal rank fusion.
+    Returns up to `limit` hits (dense ScoredPoints or lexical-only stand-ins with .id/.payload/.score).
+    """
+    dense_limit = HYBRID_CANDIDATES if HYBRID_SEARCH else limit
+    with span("qdrant.search", collection=collection_name, limit=dense_limit) as s, \
+            track(QDRANT_REQUESTS, QDRANT_LATENCY, operation="search", collection=collection_name):
+        dense_hits = await qdrant_client.search(
+            collection_name=collection_name,
+            query_vector=query_vector,
+            limit=dense_limit,
+            with_payload=CONTEXT_PAYLOAD_FIELDS
+        )
+        s.set(hits=len(dense_hits))
+    if not HYBRID_SEARCH:
+        return await fill_missing_previews(qdrant_client, collection_name, dense_hits)
+
+    # The BM25 index is in-process; only a (TTL-driven) rebuild touches Qdrant, via the sync client.
+    with span("lexical.search", collection=collection_name) as s:
+        lexical_index = await asyncio.to_thread(get_lexical_index, collection_name)
+        # BM25 scoring is CPU work; keep it off the loop thread that every request shares.
+        lexical_hits = await asyncio.to_thread(lexical_index.search, query_text, HYBRID_CANDIDATES)
+        s.set(hits=len(lexical_hits))
+
+    dense_by_id = {hit.id: hit for hit in dense_hits}
+    fused = reciprocal_rank_fusion([
+        [hit.id for hit in dense_hits],
+        [point_id for point_id, _ in lexical_hits],
+    ])[:limit]
+
+    results = []
+    for point_id, fused_score in fused:
+        hit = dense_by_id.get(point_id)
+        if hit is None:
+            hit = SimpleNamespace(id=point_id, payload=dict(lexical_index.payloads.get(point_id, {})), score=fused_score)
+        results.append(hit)
+    return await fill_missing_previews(qdrant_client, collection_name, results)
+
 # ====== RETRIEVAL LOGIC FOR LLM CONTEXT ======
 
-def get_context_for_reply(screenshot_text, user_draft):
+@traced("retrieve")
+async def get_context_for_reply_async(screenshot_text, user_draft):
     try:
-        qdrant_client = QdrantClient(
-            url=os.getenv("QDRANT_URL"),
-            api_key=os.getenv("QDRANT_API_KEY")
-        )
+        qdrant_client = get_async_qdrant_client()
     except Exception as e:
         print(f"Error initializing Qdrant client in get_context_for_reply: {e}")
         return "", "", [] 
@@ -110,37 +194,27 @@ def get_context_for_reply(screenshot_text, user_draft):
     query_for_docs = user_draft 
 
     try:
-        huddle_query_vector = embed_single(combined_query_for_huddles)
-        doc_query_vector = embed_single(query_for_docs)
+        # One embeddings request for both queries.
+        huddle_query_vector, doc_query_vector = await embed_batch_async([combined_query_for_huddles, query_for_docs])
     except Exception as e:
         print(f"Error embedding query text in get_context_for_reply: {e}")
         return "", "", []
 
-    huddle_matches_qdrant = []
-    doc_matches_qdrant = []
-
-    try:
-        if huddle_query_vector:
-            huddle_matches_qdrant = qdrant_client.search(
-                collection_name=HUDDLE_MEMORY_COLLECTION,
-                query_vector=huddle_query_vector,
-                limit=MAX_HUDDLES_CONTEXT,
-                with_payload=True
-            )
-    except Exception as e:
-        print(f"Error searching {HUDDLE_MEMORY_COLLECTION}: {e}")
+    async def _search(collection_name, query_vector, query_text, limit):
+        if not query_vector:
+            return []
+        try:
+            return await hybrid_search(qdrant_client, collection_name, query_vector, query_text, limit)
+        except Exception as e:
+            print(f"Error searching {collection_name}: {e}")
+            return []
+
+    # Both collections are searched concurrently on the event loop.
+    huddle_matches_qdrant, doc_matches_qdrant = await asyncio.gather(
+        _search(HUDDLE_MEMORY_COLLECTION, huddle_query_vector, combined_query_for_huddles, MAX_HUDDLES_CONTEXT),
+        _search(DOCS_MEMORY_COLLECTION, doc_query_vector, query_for_docs, MAX_DOCS_CONTEXT),
+    )
 
-    try:
-        if doc_query_vector:
-            doc_matches_qdrant = qdrant_client.search(
-                collection_name=DOCS_MEMORY_COLLECTION,
-                query_vector=doc_query_vector,
-                limit=MAX_DOCS_CONTEXT,
-                with_payload=True
-            )
-    except Exception as e:
-        print(f"Error searching {DOCS_MEMORY_COLLECTION}: {e}")
-        
     huddle_examples_for_context = zip_qdrant_results_for_context(huddle_matches_qdrant, MAX_CHUNK_LEN_CONTEXT)
     doc_examples_for_context = zip_qdrant_results_for_context(doc_matches_qdrant, MAX_CHUNK_LEN_CONTEXT)
     
@@ -167,66 +241,223 @@ def get_context_for_reply(screenshot_text, user_draft):
     
     return huddle_context_str, doc_context_str, doc_matches_for_display
 
+def get_context_for_reply(screenshot_text, user_draft):
+    """Sync wrapper around get_context_for_reply_async for existing callers."""
+    return run_sync(get_context_for_reply_async(screenshot_text, user_draft))
+
+
+# ====== PROMPT LAYOUT ======
+# Everything up to the variable context is byte-stable across requests (system prompt,
+# principles, task block), so the provider's automatic prompt-prefix cache can reuse it.
+# Per-request content (retrieved context, screenshot, draft, regeneration note) goes last.
+
+REPLY_TASK_BLOCK = (
+    "YOUR TASK:\n"
+    "You will be given context from similar past huddles and relevant documents, the current conversation "
+    "(from a screenshot) and the user's draft idea. Use the draft for inspiration on topic/intent. "
+    "Improve it based on the principles and context. Do NOT just rephrase the draft if it's weak or misses the mark.\n"
+    "Craft the best, most natural, and human reply for this scenario. "
+    "Adhere strictly to the system prompt and the key principles. "
+    "Be direct—do not reference that this is a draft or a suggestion. "
+    "Write the message exactly as if you were sending it to the person in the conversation."
+)
 
-# ====== NON-STREAMING SUGGESTION (MODIFIED FOR REGENERATION) ======
-def generate_suggested_reply(screenshot_text, user_draft, principles, model_name, 
-                             huddle_context_str, doc_context_str,
-                             is_regeneration=False): # Added is_regeneration flag
+REGENERATION_INSTRUCTION = (
+    "IMPORTANT REGENERATION INSTRUCTION:\n"
+    "You have provided a suggestion before for this scenario. "
+    "Now, please provide a *significantly different* angle or approach. "
+    "Explore alternative ways to phrase the core message or focus on different aspects of the user's draft or the conversation context. "
+    "Be creative, offer a fresh perspective, and ensure this new suggestion is distinct from any previous ones for this exact request."
+)
+
+def build_static_prefix(principles):
+    """System message shared by every reply request with the same principles."""
+    normalized_principles = "\n".join(line.strip() for line in (principles or "").strip().splitlines())
+    return (
+        f"{SYSTEM_PROMPT}\n\n"
+        f"KEY PRINCIPLES FOR YOUR REPLY (Strictly Follow These):\n{normalized_principles}\n\n"
+        f"{REPLY_TASK_BLOCK}"
+    )
+
+def build_reply_messages(screenshot_text, user_draft, principles, huddle_context_str, doc_context_str,
+                         model_name, is_regeneration=False):
     """
-    Generates an AI reply suggestion (non-streaming).
-    If is_regeneration is True, it adjusts the prompt and temperature for a different angle.
+    Returns (messages, section token usage) for a reply request:
+    a byte-stable system prefix followed by the token-budgeted variable context.
     """
-    if not client:
-        print("Error: OpenAI client not initialized in suggestor.")
-        return "Error: OpenAI client not initialized."
-
-    truncated_screenshot = screenshot_text[:1200] 
-    truncated_draft = user_draft[:600]        
+    # Token-budgeted context: sections filled by priority, trimmed at sentence boundaries.
+    budgeted, section_tokens = assemble_context({
+        "draft": user_draft,
+        "screenshot": screenshot_text,
+        "huddles": huddle_context_str,
+        "docs": doc_context_str,
+    }, model_name=model_name)
 
     user_prompt_content = (
-        f"KEY PRINCIPLES FOR YOUR REPLY (Strictly Follow These):\n{principles}\n\n"
         "CONTEXT FROM SIMILAR PAST HUDDLES:\n"
-        f"{huddle_context_str}\n\n" 
+        f"{budgeted['huddles'] or 'No relevant past huddle examples found.'}\n\n"
         "CONTEXT FROM RELEVANT DOCUMENTS:\n"
-        f"{doc_context_str}\n\n"     
+        f"{budgeted['docs'] or 'No relevant documents found.'}\n\n"
         "CURRENT CONVERSATION (FROM SCREENSHOT):\n"
-        f"{truncated_screenshot}\n\n"
-        "USER'S DRAFT IDEA (Use for inspiration on topic/intent. Improve it based on principles and context. Do NOT just rephrase the draft if it's weak or misses the mark.):\n"
-        f"{truncated_draft}\n\n"
-        "YOUR TASK:\n"
-        "Craft the best, most natural, and human reply for this scenario. "
-        "Adhere strictly to the system prompt and the key principles. "
-        "Be direct—do not reference that this is a draft or a suggestion. "
-        "Write the message exactly as if you were sending it to the person in the conversation."
+        f"{budgeted['screenshot']}\n\n"
+        "USER'S DRAFT IDEA:\n"
+        f"{budgeted['draft']}"
+    )
+    if is_regeneration:
+        user_prompt_content += f"\n\n{REGENERATION_INSTRUCTION}"
+
+    messages = [
+        {"role": "system", "content": build_static_prefix(principles)},
+        {"role": "user", "content": user_prompt_content},
+    ]
+    return messages, section_tokens
+
+def log_usage(label, result):
+    """Logs prompt/completion tokens and how many prompt tokens the provider served from its prefix cache."""
+    usage = result.usage
+    current_span().set(provider=result.provider, model=result.model, **(usage or {}))
+    if not usage:
+        return
+    print(
+        f"LLM usage [{label}] provider={result.provider} model={result.model} prompt={usage.get('prompt_tokens')} "
+        f"(cached={usage.get('cached_tokens', 0)}) completion={usage.get('completion_tokens')}"
     )
 
-    current_temperature = 0.65 # Default temperature
+@traced("llm")
+async def routed_completion(label, model_name, messages, allow_downgrade=False, **kwargs):
+    """
+    Runs a completion through the LLM backend with the router's per-model deadline and records
+    its latency/outcome. If allow_downgrade is set and every provider misses the deadline or is
+    unavailable, retries once on the router's fallback model. Returns (LLMResult, model requested).
+    """
+    current_span().set(label=label, requested_model=model_name)
+    start = time.time()
+    try:
+        result = await llm.acomplete(messages, model_name, timeout=router.deadline(model_name), **kwargs)
+        router.record(model_name, time.time() - start, ok=True)
+        log_usage(label, result)
+        return result, model_name
+    except LLMUnavailableError as e:
+        router.record(model_name, time.time() - start, ok=False)
+        fallback_model = router.fallback(model_name) if allow_downgrade else None
+        if not fallback_model:
+            raise
+        print(f"Router: {model_name} missed its deadline or failed ({e}); downgrading to {fallback_model}")
+        current_span().set(downgraded_to=fallback_model)
+
+    start = time.time()
+    try:
+        result = await llm.acomplete(messages, fallback_model, timeout=router.deadline(fallback_model), **kwargs)
+    except Exception:
+        router.record(fallback_model, time.time() - start, ok=False)
+        raise
+    router.record(fallback_model, time.time() - start, ok=True)
+    log_usage(label, result)
+    return result, fallback_model
+
+# ====== SEMANTIC CACHE LOOKUP ======
+async def _cached_reply(cache_partition, screenshot_text, user_draft):
+    try:
+        cached_reply, similarity = await reply_cache.lookup_async(cache_partition, screenshot_text, user_draft)
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return None
+    if cached_reply:
+        print(f"Suggestor: semantic cache hit (similarity {similarity:.3f}) {reply_cache.stats}")
+        current_span().set(cache_hit=True, similarity=round(similarity, 4))
+    return cached_reply
+
+@traced("cache.lookup")
+async def lookup_cached_reply_async(screenshot_text, user_draft, model_name, cache_scope="team", use_cache=None):
+    """
+    Checks the semantic cache before any context is retrieved. The key is the screenshot text and
+    draft, encoded locally, so a hit skips the embedding call, the Qdrant searches and BM25 as well
+    as the LLM. Returns the cached reply or None. Pass cache_checked=True to the generate call after
+    a miss so the lookup isn't repeated.
+    """
+    use_cache = SEMANTIC_CACHE_ENABLED if use_cache is None else use_cache
+    if not use_cache:
+        return None
+    # Nothing is sent to the model here, so don't claim the router's probe of an unhealthy model.
+    selected_model = router.choose(screenshot_text, user_draft, probe=False)[0] if is_auto(model_name) else model_name
+    return await _cached_reply((cache_scope, selected_model, PROMPT_VERSION), screenshot_text, user_draft)
+
+def lookup_cached_reply(screenshot_text, user_draft, model_name, cache_scope="team", use_cache=None):
+    """Sync wrapper around lookup_cached_reply_async."""
+    return run_sync(lookup_cached_reply_async(screenshot_text, user_draft, model_name, cache_scope, use_cache))
 
-    if is_regeneration:
-        user_prompt_content += (
-            "\n\nIMPORTANT REGENERATION INSTRUCTION:\n"
-            "You have provided a suggestion before for this scenario. "
-            "Now, please provide a *significantly different* angle or approach. "
-            "Explore alternative ways to phrase the core message or focus on different aspects of the user's draft or the conversation context. "
-            "Be creative, offer a fresh perspective, and ensure this new suggestion is distinct from any previous ones for this exact request."
+# ====== NON-STREAMING SUGGESTION (MODIFIED FOR REGENERATION) ======
+@traced("generate")
+async def generate_suggested_reply_async(screenshot_text, user_draft, principles, model_name, 
+                                   huddle_context_str, doc_context_str,
+                                   is_regeneration=False, # Added is_regeneration flag
+                                   fresh=False, cache_scope="team", use_cache=None, cache_checked=False):
+    """
+    Generates an AI reply suggestion (non-streaming).
+    If is_regeneration is True, it adjusts the prompt and temperature for a different angle.
+    With the semantic cache enabled (SEMANTIC_CACHE=true or use_cache=True), a near-identical
+    earlier request in the same scope is answered from cache. fresh=True (always set for
+    regenerations) skips the lookup but still stores the new reply. cache_checked=True means the
+    caller already missed in lookup_cached_reply_async before retrieving context; only the store runs.
+    model_name "Auto" (or None) lets the model router pick per request, with downgrade on deadline.
+    """
+    if not llm.available():
+        print("Error: No LLM provider initialized in suggestor.")
+        return "Error: No LLM provider initialized."
+
+    auto_routed = is_auto(model_name)
+    route_downgraded = False
+    if auto_routed:
+        selected_model, route_reason = router.choose(screenshot_text, user_draft, is_regeneration)
+        route_downgraded = is_downgrade(route_reason)
+        print(f"Router: {selected_model} ({route_reason})")
+    else:
+        selected_model = model_name
+
+    use_cache = SEMANTIC_CACHE_ENABLED if use_cache is None else use_cache
+    # Partitioned by the model that answers, so an Auto request never gets another model's reply.
+    cache_partition = (cache_scope, selected_model, PROMPT_VERSION)
+    if use_cache and not cache_checked:
+        if fresh or is_regeneration:
+            reply_cache.stats["bypassed"] += 1
+        else:
+            cached_reply = await _cached_reply(cache_partition, screenshot_text, user_draft)
+            if cached_reply:
+                return cached_reply
+
+    def _build_prompt():
+        # Tokenizing and trimming the context is CPU work; it runs in a worker thread, not on the shared loop.
+        messages, section_tokens = build_reply_messages(
+            screenshot_text, user_draft, principles, huddle_context_str, doc_context_str,
+            selected_model, is_regeneration=is_regeneration
         )
-        current_temperature = 0.75 # Slightly higher temperature for more varied regeneration
-    selected_model = model_name or os.getenv("OPENAI_MODEL", "gpt-4o")
-    
+        return messages, section_tokens, sum(count_tokens(m["content"], selected_model) for m in messages)
+
+    messages, section_tokens, prompt_tokens = await asyncio.to_thread(_build_prompt)
+    current_temperature = 0.75 if is_regeneration else 0.65 # Slightly higher temperature for more varied regeneration
+
+    print(f"Suggestor: prompt ~{prompt_tokens} tokens (context sections: {section_tokens})")
+    current_span().set(model=selected_model, estimated_prompt_tokens=prompt_tokens)
+
     try:
-        response = client.chat.completions.create( 
-            model=selected_model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt_content}
-            ],
+        result, _ = await routed_completion(
+            "reply", selected_model, messages, allow_downgrade=auto_routed,
             temperature=current_temperature, # Use the determined temperature
-            max_tokens=400  
+            max_tokens=400
         )
-        raw_reply = response.choices[0].message.content
-        return clean_reply(raw_reply) 
-    except openai.APIError as e: 
-        error_message = f"OpenAI API Error generating suggestion: {e}"
+        raw_reply = result.text
+        reply = clean_reply(raw_reply)
+        # Replies from a downgrade (router, deadline fallback or provider failover) are not the
+        # partition model's own answers; caching them would keep serving the degraded reply.
+        produced_by_selected = result.model == selected_model and not route_downgraded
+        if use_cache and reply and produced_by_selected:
+            try:
+                await reply_cache.store_async(cache_partition, screenshot_text, user_draft, reply)
+            except Exception as e:
+                print(f"Semantic cache store failed: {e}")
+        return reply
+    except LLMUnavailableError as e: 
+        error_message = f"LLM unavailable generating suggestion: {e}"
         print(error_message)
         return f"Error: {error_message}" 
     except Exception as e:
@@ -234,14 +465,62 @@ def generate_suggested_reply(screenshot_text, user_draft, principles, model_name
         print(error_message)
         return f"Error: {error_message}"
 
+def generate_suggested_reply(screenshot_text, user_draft, principles, model_name,
+                             huddle_context_str, doc_context_str,
+                             is_regeneration=False, fresh=False, cache_scope="team", use_cache=None,
+                             cache_checked=False):
+    """Sync wrapper around generate_suggested_reply_async for existing callers."""
+    return run_sync(generate_suggested_reply_async(
+        screenshot_text, user_draft, principles, model_name, huddle_context_str, doc_context_str,
+        is_regeneration=is_regeneration, fresh=fresh, cache_scope=cache_scope, use_cache=use_cache,
+        cache_checked=cache_checked
+    ))
+
+
+# ====== REGENERATION CANDIDATES ======
+@traced("generate.candidates")
+async def generate_reply_candidates_async(screenshot_text, user_draft, principles, model_name,
+                                         huddle_context_str, doc_context_str, n=3):
+    """
+    Generates n alternative replies in a single request (one choice per candidate)
+    for the Regenerate pool. Returns a list of cleaned replies; empty on error.
+    """
+    if not llm.available():
+        return []
+    auto_routed = is_auto(model_name)
+    selected_model = LARGE_MODEL if auto_routed else model_name
+    messages, _ = await asyncio.to_thread(
+        build_reply_messages, screenshot_text, user_draft, principles, huddle_context_str, doc_context_str,
+        selected_model, is_regeneration=True
+    )
+    try:
+        result, _ = await routed_completion(
+            "candidates", selected_model, messages, allow_downgrade=auto_routed,
+            temperature=0.9, # Higher than a single regeneration to spread the angles
+            max_tokens=400,
+            n=n
+        )
+        return [clean_reply(text) for text in result.texts if text]
+    except Exception as e:
+        print(f"Error generating reply candidates: {e}")
+        return []
+
+def generate_reply_candidates(screenshot_text, user_draft, principles, model_name,
+                              huddle_context_str, doc_context_str, n=3):
+    """Sync wrapper around generate_reply_candidates_async for existing callers."""
+    return run_sync(generate_reply_candidates_async(
+        screenshot_text, user_draft, principles, model_name, huddle_context_str, doc_context_str, n=n
+    ))
+
 
 # ====== NON-STREAMING TONE ADJUSTMENT ======
-def generate_adjusted_tone(original_reply, selected_tone, model_name=None):
+@traced("tone")
+async def generate_adjusted_tone_async(original_reply, selected_tone, model_name=None):
     """
     Adjusts the tone of the original reply (non-streaming).
     """
-    if not client:
-        print("Error: OpenAI client not initialized in suggestor.")
+    if not llm.available():
+        print("Error: No LLM provider initialized in suggestor.")
         return original_reply 
 
     if not selected_tone or selected_tone.lower() == "none":
@@ -264,25 +543,36 @@ def generate_adjusted_tone(original_reply, selected_tone, model_name=None):
         f"Original Message to rephrase:\n\"\"\"\n{truncated_original_reply}\n\"\"\""
     )
 
-    selected_model_for_tone = model_name or os.getenv("OPENAI_MODEL_TONE", os.getenv("OPENAI_MODEL", "gpt-4o"))
+    auto_routed = is_auto(model_name)
+    if auto_routed:
+        selected_model_for_tone = os.getenv("OPENAI_MODEL_TONE", LARGE_MODEL)
+        if not router.admit(selected_model_for_tone):
+            selected_model_for_tone = SMALL_MODEL
+    else:
+        selected_model_for_tone = model_name
 
     try:
-        response = client.chat.completions.create( 
-            model=selected_model_for_tone,
-            messages=[
+        result, _ = await routed_completion(
+            "tone", selected_model_for_tone,
+            [
                 {"role": "system", "content": tone_system_prompt},
                 {"role": "user", "content": tone_user_prompt}
             ],
+            allow_downgrade=auto_routed,
             temperature=0.7, 
             max_tokens=400 
         )
-        raw_adjusted_reply = response.choices[0].message.content
+        raw_adjusted_reply = result.text
         return clean_reply(raw_adjusted_reply) 
-    except openai.APIError as e: 
-        error_message = f"OpenAI API Error adjusting tone: {e}"
+    except LLMUnavailableError as e: 
+        error_message = f"LLM unavailable adjusting tone: {e}"
         print(error_message)
         return original_reply 
     except Exception as e:
         error_message = f"Unexpected error adjusting tone: {e}"
         print(error_message)
-        return original_reply
\ No newline at end of file
+        return original_reply
+
+def generate_adjusted_tone(original_reply, selected_tone, model_name=None):
+    """Sync wrapper around generate_adjusted_tone_async for existing callers."""
+    return run_sync(generate_adjusted_tone_async(original_reply, selected_tone, model_name))
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+api = pytest.importorskip("api")
+from api import Overloaded, WorkerPool  # noqa: E402
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_admits_up_to_concurrency_plus_queue_then_rejects():
+    async def scenario():
+        pool = WorkerPool(max_concurrency=1, max_queue=1, queue_timeout=5)
+        first = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        assert (pool.active, pool.queued) == (1, 1)
+
+        with pytest.raises(Overloaded) as rejected:
+            await pool.acquire()
+        assert rejected.value.retry_after >= 1
+
+        pool.release(first)
+        await waiter
+        assert (pool.active, pool.queued) == (1, 0)
+        return pool.stats
+
+    assert _run(scenario()) == {"accepted": 2, "rejected": 1, "timed_out": 0}
+
+
+def test_queue_timeout_raises_overloaded():
+    async def scenario():
+        pool = WorkerPool(max_concurrency=1, max_queue=5, queue_timeout=0.01)
+        await pool.acquire()
+        with pytest.raises(Overloaded):
+            await pool.acquire()
+        return pool
+
+    pool = _run(scenario())
+    assert pool.queued == 0
+    assert pool.stats["timed_out"] == 1
+
+
+def test_retry_after_scales_with_backlog():
+    pool = WorkerPool(max_concurrency=2, max_queue=10)
+    pool.avg_seconds = 3.0
+    assert pool.retry_after() == 1
+    pool.active, pool.queued = 2, 4
+    assert pool.retry_after() == 9  # 6 requests ahead, 2 at a time, 3s each
+
+
+def test_slot_release_runs_once(monkeypatch):
+    async def scenario():
+        pool = WorkerPool(max_concurrency=1, max_queue=0)
+        monkeypatch.setattr(api, "pool", pool)
+        release = api.slot_release(await pool.acquire())
+        await release()
+        await release()
+        return pool.active
+
+    assert _run(scenario()) == 0
+
+
+def test_streaming_reply_releases_slot_when_setup_fails(monkeypatch):
+    testclient = pytest.importorskip("fastapi.testclient")
+    pool = WorkerPool(max_concurrency=1, max_queue=0)
+    monkeypatch.setattr(api, "pool", pool)
+
+    async def no_context(body):
+        return "", ""
+
+    def broken_choose(*args, **kwargs):
+        raise RuntimeError("router down")
+
+    monkeypatch.setattr(api, "_resolve_context", no_context)
+    monkeypatch.setattr(api.router, "choose", broken_choose)
+    client = testclient.TestClient(api.app, raise_server_exceptions=False)
+    for _ in range(3):
+        response = client.post("/v1/reply", json={"screenshot_text": "hi", "model": "Auto", "stream": True})
+        assert response.status_code == 500
+    assert pool.active == 0
+    assert pool.stats["rejected"] == 0
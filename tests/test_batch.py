@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import batch
+
+
+def _write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def test_load_completed_ids_keeps_only_ok_records(tmp_path):
+    out = tmp_path / "results.jsonl"
+    _write_lines(out, [
+        json.dumps({"id": "a.png", "status": "ok"}),
+        json.dumps({"id": "b.png", "status": "error", "error": "boom"}),
+        json.dumps({"id": "c.png", "status": "ok"}),
+        '{"id": "d.png", "sta',  # torn last line from an interrupted run
+    ])
+    assert batch.load_completed_ids(str(out)) == {"a.png", "c.png"}
+
+
+def test_load_completed_ids_without_output(tmp_path):
+    assert batch.load_completed_ids(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_load_items_from_folder_reads_sidecar_drafts(tmp_path):
+    (tmp_path / "one.png").write_bytes(b"")
+    (tmp_path / "one.txt").write_text("my draft\n", encoding="utf-8")
+    (tmp_path / "two.jpg").write_bytes(b"")
+    (tmp_path / "notes.md").write_text("ignored", encoding="utf-8")
+    items = batch.load_items(str(tmp_path), default_draft="default")
+    assert [(i["id"], i["draft"]) for i in items] == [("one.png", "my draft"), ("two.jpg", "default")]
+
+
+def test_load_items_from_csv_manifest_resolves_relative_paths(tmp_path):
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("image,draft,id\nshots/a.png,hello,first\n,skipped,\n", encoding="utf-8")
+    items = batch.load_items(str(manifest))
+    assert items == [{"id": "first", "image": str(tmp_path / "shots" / "a.png"), "draft": "hello"}]
+
+
+def test_run_batch_resumes_and_retries_errors(tmp_path, monkeypatch):
+    out = tmp_path / "results.jsonl"
+    _write_lines(out, [
+        json.dumps({"id": "done", "status": "ok"}),
+        json.dumps({"id": "failed", "status": "error", "error": "timeout"}),
+    ])
+    processed = []
+
+    async def fake_process_item(item, model_name, principles):
+        processed.append(item["id"])
+        return {"id": item["id"], "image": item["image"], "status": "ok", "timings": {}}
+
+    monkeypatch.setattr(batch, "process_item", fake_process_item)
+    monkeypatch.setattr(batch, "print_report", lambda records, elapsed: None)
+    items = [{"id": i, "image": f"{i}.png", "draft": ""} for i in ("done", "failed", "new")]
+    asyncio.run(batch.run_batch(items, str(out), concurrency=2, principles="Be brief."))
+
+    assert sorted(processed) == ["failed", "new"]
+    assert batch.load_completed_ids(str(out)) == {"done", "failed", "new"}
@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+import candidate_pool
+from candidate_pool import CandidatePool
+
+
+@pytest.fixture(autouse=True)
+def enabled_pool(monkeypatch):
+    monkeypatch.setattr(candidate_pool, "CANDIDATE_POOL_ENABLED", True)
+    monkeypatch.setattr(candidate_pool, "CANDIDATE_POOL_MAX_REFILLS_PER_REQUEST", 2)
+    monkeypatch.setattr(candidate_pool, "CANDIDATE_POOL_MAX_REFILLS_PER_HOUR", 100)
+    monkeypatch.setattr(candidate_pool, "_refill_calls", candidate_pool.deque())
+    # Every candidate is distinct, so no encoder is needed for the dedupe step.
+    monkeypatch.setattr(candidate_pool, "dedupe_by_similarity", lambda candidates, existing: list(candidates))
+
+
+def _refill_and_wait(pool, generate):
+    before = {t for t in threading.enumerate() if t.name == candidate_pool.REFILL_THREAD_NAME}
+    started = pool.refill_async(generate)
+    for thread in threading.enumerate():
+        if thread.name == candidate_pool.REFILL_THREAD_NAME and thread not in before:
+            thread.join(5)
+    return started
+
+
+def test_refills_stop_at_the_per_request_limit():
+    calls = []
+
+    def generate(n):
+        calls.append(n)
+        return [f"reply {len(calls)}.{i}" for i in range(n)]
+
+    pool = CandidatePool("key", shown_reply="first")
+    assert _refill_and_wait(pool, generate)
+    assert _refill_and_wait(pool, generate)
+    assert not pool.needs_refill()
+    assert _refill_and_wait(pool, generate) is False
+    assert len(calls) == 2
+
+
+def test_disabled_pool_never_calls_the_model(monkeypatch):
+    monkeypatch.setattr(candidate_pool, "CANDIDATE_POOL_ENABLED", False)
+    calls = []
+    pool = CandidatePool("key")
+    assert not pool.needs_refill()
+    assert pool.refill_async(lambda n: calls.append(n) or []) is False
+    assert calls == []
+
+
+def test_hourly_cap_is_shared_across_pools(monkeypatch):
+    monkeypatch.setattr(candidate_pool, "CANDIDATE_POOL_MAX_REFILLS_PER_HOUR", 1)
+    calls = []
+
+    def generate(n):
+        calls.append(n)
+        return []
+
+    assert _refill_and_wait(CandidatePool("a"), generate)
+    assert _refill_and_wait(CandidatePool("b"), generate) is False
+    assert len(calls) == 1
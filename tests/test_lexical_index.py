@@ -0,0 +1,95 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import lexical_index
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_bigrams_with_stopwords():
+    terms = tokenize("How much do you make?")
+    assert "much" in terms
+    assert "do you" in terms
+    assert "the" not in tokenize("the plan")
+
+
+def test_bm25_ranks_exact_phrase_first():
+    index = BM25Index()
+    index.add(1, "Is this a pyramid scheme?")
+    index.add(2, "The scheme for the pyramid trip is set.")
+    index.add(3, "Totally unrelated text about coffee.")
+    hits = index.search("pyramid scheme", limit=10)
+    assert [point_id for point_id, _ in hits][:2] == [1, 2]
+    assert 3 not in dict(hits)
+
+
+def test_bm25_add_replaces_existing_document():
+    index = BM25Index()
+    index.add(1, "pyramid scheme")
+    index.add(1, "coffee chat")
+    assert index.search("pyramid") == []
+    assert index.search("coffee")[0][0] == 1
+    assert index.total_length == index.doc_lengths[1]
+
+
+def test_bm25_empty_query_or_index():
+    assert BM25Index().search("anything") == []
+    index = BM25Index()
+    index.add(1, "text")
+    assert index.search("") == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    ids = [point_id for point_id, _ in fused]
+    assert ids[0] == "b"
+    assert set(ids) == {"a", "b", "c", "d"}
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+
+
+class _FakeQdrant:
+    def __init__(self):
+        self.fail = False
+        self.scrolls = 0
+
+    def scroll(self, **kwargs):
+        self.scrolls += 1
+        if self.fail:
+            raise RuntimeError("qdrant down")
+        return [SimpleNamespace(id=1, payload={"text": "pyramid scheme", "source": "doc"})], None
+
+
+@pytest.fixture
+def fresh_indexes(monkeypatch):
+    monkeypatch.setattr(lexical_index, "_indexes", {})
+    monkeypatch.setattr(lexical_index, "_build_locks", {})
+    monkeypatch.setattr(lexical_index, "_rebuilding", set())
+    monkeypatch.setattr(lexical_index, "_failures", {})
+
+
+def _wait_for_rebuild(collection_name):
+    deadline = time.time() + 5
+    while collection_name in lexical_index._rebuilding and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_stale_index_is_served_while_rebuilding(fresh_indexes):
+    client = _FakeQdrant()
+    index = lexical_index.get_lexical_index("docs", client)
+    assert client.scrolls == 1
+    index.loaded_at = 0
+    assert lexical_index.get_lexical_index("docs", client) is index
+    _wait_for_rebuild("docs")
+    rebuilt = lexical_index.get_lexical_index("docs", client)
+    assert rebuilt is not index
+    assert rebuilt.search("pyramid")[0][0] == 1
+
+
+def test_failed_build_backs_off(fresh_indexes):
+    client = _FakeQdrant()
+    client.fail = True
+    for _ in range(3):
+        assert lexical_index.get_lexical_index("docs", client).search("pyramid") == []
+    assert client.scrolls == 1
+    assert lexical_index._failures["docs"][1] == lexical_index.LEXICAL_INDEX_RETRY_SECONDS
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+import llm_backend
+from llm_backend import CircuitBreaker, LLMBackend, LLMResult, LLMUnavailableError
+
+
+def test_breaker_opens_after_threshold_and_blocks():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.is_available()
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_one_trial(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_backend.time, "time", lambda: now[0])
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+    now[0] += 31
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+
+    breaker.record_failure()  # failed trial re-opens for another cooldown
+    assert breaker.state == "open"
+    now[0] += 31
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+class FakeProvider:
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def model_for(self, model_name):
+        return model_name
+
+    async def acomplete(self, messages, model, temperature, max_tokens, n, timeout):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.name} failed")
+        return LLMResult([self.name], self.name, model)
+
+
+def test_complete_fails_over_to_secondary():
+    primary, secondary = FakeProvider("primary", fail=True), FakeProvider("secondary")
+    backend = LLMBackend([primary, secondary])
+    result = backend.complete([], "gpt-4o", timeout=5)
+    assert result.provider == "secondary"
+    assert backend.stats["failovers"] == 1
+
+
+def test_complete_hedges_a_slow_primary(monkeypatch):
+    monkeypatch.setattr(llm_backend, "LLM_HEDGE_DEFAULT_DELAY_SECONDS", 0.05)
+    primary, secondary = FakeProvider("primary", delay=1.0), FakeProvider("secondary")
+    backend = LLMBackend([primary, secondary])
+    result = backend.complete([], "gpt-4o", timeout=5, hedge=True)
+    assert result.provider == "secondary"
+    assert backend.stats == {"hedged": 1, "hedge_wins": 1, "failovers": 0}
+
+
+def test_complete_raises_when_every_provider_fails():
+    backend = LLMBackend([FakeProvider("primary", fail=True), FakeProvider("secondary", fail=True)])
+    with pytest.raises(LLMUnavailableError, match="primary: primary failed; secondary: secondary failed"):
+        backend.complete([], "gpt-4o", timeout=5)
+
+
+def test_open_breakers_short_circuit():
+    provider = FakeProvider("primary")
+    backend = LLMBackend([provider])
+    backend.breakers["primary"]._opened_at = llm_backend.time.time()
+    with pytest.raises(LLMUnavailableError):
+        backend.complete([], "gpt-4o", timeout=5)
+    assert provider.calls == 0
+
+
+def _half_open(backend, name):
+    breaker = backend.breakers[name]
+    breaker._opened_at = llm_backend.time.time() - breaker.cooldown - 1
+    assert breaker.state == "half-open"
+    return breaker
+
+
+def test_cancelled_hedge_loser_frees_the_half_open_trial(monkeypatch):
+    monkeypatch.setattr(llm_backend, "LLM_HEDGE_DEFAULT_DELAY_SECONDS", 0.05)
+    primary, secondary = FakeProvider("primary", delay=1.0), FakeProvider("secondary")
+    backend = LLMBackend([primary, secondary])
+    breaker = _half_open(backend, "primary")
+    assert backend.complete([], "gpt-4o", timeout=5, hedge=True).provider == "secondary"
+    # The primary's trial was cancelled, not failed: another trial may go through.
+    assert breaker.allow()
+
+
+class StreamingProvider(FakeProvider):
+    def stream(self, messages, model, temperature, max_tokens, n, timeout):
+        for word in ("one", "two", "three"):
+            yield 0, word
+
+
+def test_stream_closed_early_frees_the_half_open_trial():
+    backend = LLMBackend([StreamingProvider("primary")])
+    breaker = _half_open(backend, "primary")
+    chunks = backend.stream([], "gpt-4o")
+    assert next(chunks) == (0, "one")
+    chunks.close()
+    assert breaker.allow()
@@ -0,0 +1,46 @@
+import pytest
+
+from metrics import Counter, Histogram, track
+
+
+def _observed(histogram, **match):
+    return sum(count for labels, _, count, _ in histogram.series() if all(labels[k] == v for k, v in match.items()))
+
+
+def test_quantile_interpolates_within_buckets():
+    histogram = Histogram("test_seconds", "test", buckets=(0.1, 0.5, 1.0))
+    for _ in range(5):
+        histogram.observe(0.05)
+        histogram.observe(0.3)
+    assert histogram.quantile(0.5) == pytest.approx(0.1)
+    assert histogram.quantile(0.75) == pytest.approx(0.3)
+    assert histogram.quantile(1.0) == pytest.approx(0.5)
+
+
+def test_quantile_beyond_last_bucket_returns_last_bound():
+    histogram = Histogram("test_seconds", "test", buckets=(0.1, 0.5, 1.0))
+    histogram.observe(5.0)
+    assert histogram.quantile(0.99) == 1.0
+
+
+def test_quantile_merges_matching_series_only():
+    histogram = Histogram("test_seconds", "test", labelnames=("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="fast")
+    histogram.observe(0.9, stage="slow")
+    assert histogram.quantile(0.5, stage="fast") == pytest.approx(0.05)
+    assert histogram.quantile(0.5, stage="slow") == pytest.approx(0.55)
+    assert histogram.quantile(0.5, stage="missing") is None
+    assert Histogram("empty", "test").quantile(0.5) is None
+
+
+def test_track_counts_outcomes_and_observes_latency():
+    requests = Counter("test_requests_total", "test", ("stage", "status"))
+    latency = Histogram("test_latency_seconds", "test", ("stage",))
+    with track(requests, latency, stage="ocr"):
+        pass
+    with pytest.raises(ValueError):
+        with track(requests, latency, stage="ocr"):
+            raise ValueError("bad image")
+    assert requests.value(stage="ocr", status="ok") == 1
+    assert requests.value(stage="ocr", status="error") == 1
+    assert _observed(latency, stage="ocr") == 2
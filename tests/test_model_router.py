@@ -0,0 +1,50 @@
+import pytest
+
+import model_router
+from model_router import LARGE_MODEL, SMALL_MODEL, ModelRouter, is_downgrade
+
+REGENERATION = ("Thanks, sounds good.", "Great, talk soon.", True)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(model_router.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_unhealthy_large_model_is_probed_and_recovers(clock):
+    router = ModelRouter()
+    router.record(LARGE_MODEL, 0.5, ok=False)
+    router.record(LARGE_MODEL, 0.5, ok=False)
+    assert not router.is_healthy(LARGE_MODEL)
+
+    model, reason = router.choose(*REGENERATION)
+    assert model == SMALL_MODEL and is_downgrade(reason)
+
+    clock[0] += model_router.ROUTER_PROBE_SECONDS
+    model, reason = router.choose(*REGENERATION)
+    assert model == LARGE_MODEL and not is_downgrade(reason)
+    # Only one probe per interval.
+    assert router.choose(*REGENERATION)[0] == SMALL_MODEL
+
+    # Successful probes bring the error EWMA back under the limit.
+    while not router.is_healthy(LARGE_MODEL):
+        clock[0] += model_router.ROUTER_PROBE_SECONDS
+        assert router.choose(*REGENERATION)[0] == LARGE_MODEL
+        router.record(LARGE_MODEL, 0.5, ok=True)
+    assert router.choose(*REGENERATION) == (LARGE_MODEL, "regeneration")
+
+
+def test_probe_clock_restarts_after_recovery(clock):
+    router = ModelRouter()
+    router.record(LARGE_MODEL, 20.0)
+    assert not router.admit(LARGE_MODEL)
+
+    router.latency_ewma[LARGE_MODEL] = 1.0
+    assert router.admit(LARGE_MODEL)
+
+    clock[0] += 10 * model_router.ROUTER_PROBE_SECONDS
+    router.record(LARGE_MODEL, 100.0)
+    # A fresh unhealthy period waits a full interval before its first probe.
+    assert not router.admit(LARGE_MODEL)
@@ -0,0 +1,72 @@
+import json
+import sys
+import threading
+import time
+
+import profiler
+from profiler import Profile, profiling, recent_profiles
+
+
+def _leaf():
+    return sys._getframe()
+
+
+def _profile_with_samples():
+    profile = Profile("unit", interval_ms=5)
+    frame = _leaf()
+    # One call site, so every sample records the same (live) caller line.
+    for elapsed_ms, thread_name, weight_ms in [(0.0, "MainThread", 5.0), (5.0, "MainThread", 5.0), (5.0, "async-core", 2.5)]:
+        profile.add_sample(elapsed_ms, thread_name, frame, weight_ms)
+    return profile
+
+
+def test_speedscope_has_one_profile_per_thread_and_shared_frames():
+    document = json.loads(_profile_with_samples().to_speedscope())
+    assert document["$schema"] == "https://www.speedscope.app/file-format-schema.json"
+    frames = document["shared"]["frames"]
+    profiles = {p["name"]: p for p in document["profiles"]}
+    assert set(profiles) == {"MainThread", "async-core"}
+
+    main = profiles["MainThread"]
+    assert main["type"] == "sampled" and main["unit"] == "milliseconds"
+    assert main["weights"] == [5.0, 5.0]
+    assert main["endValue"] == 10.0
+    # Stacks run root -> leaf and index into the shared frame table.
+    assert frames[main["samples"][0][-1]]["name"] == "_leaf"
+    assert all(0 <= i < len(frames) for stack in main["samples"] for i in stack)
+
+
+def test_collapsed_stacks_merge_identical_samples():
+    lines = _profile_with_samples().to_collapsed().strip().splitlines()
+    assert len(lines) == 2
+    stacks = dict(line.rsplit(" ", 1) for line in lines)
+    main = next(stack for stack in stacks if stack.startswith("MainThread;"))
+    assert main.split(";")[-1].startswith("_leaf (test_profiler.py:")
+    assert stacks[main] == "10000"  # two 5 ms samples, in microseconds
+
+
+def test_blocked_thread_gets_wait_leaf():
+    release = threading.Event()
+    waiter = threading.Thread(target=release.wait, name="tone-prefetch-test", daemon=True)
+    waiter.start()
+    time.sleep(0.05)
+    try:
+        profile = Profile("wait", interval_ms=5)
+        profile.add_sample(0.0, waiter.name, sys._current_frames()[waiter.ident], 5.0)
+    finally:
+        release.set()
+    name, _, _ = profile.frames[profile.samples[0][2][-1]]
+    assert name == "[wait: lock]"
+
+
+def test_profiling_stores_profile_only_when_enabled(monkeypatch):
+    monkeypatch.setattr(profiler, "_profiles", profiler.deque(maxlen=3))
+    with profiling("off", enabled=False) as profile:
+        assert profile is None
+    with profiling("on", interval_ms=1) as profile:
+        deadline = time.time() + 0.05
+        while time.time() < deadline:
+            sum(range(1000))
+    stored = recent_profiles()
+    assert [p.name for p in stored] == ["on"]
+    assert stored[0].samples and stored[0].duration_ms > 0
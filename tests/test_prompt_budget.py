@@ -0,0 +1,58 @@
+import pytest
+
+import prompt_budget
+from prompt_budget import assemble_context, count_tokens, trim_to_sentences
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # ~4 characters per token, independent of whether tiktoken can load its BPE file here.
+    monkeypatch.setattr(prompt_budget, "_get_encoding", lambda model_name: None)
+
+
+def test_count_tokens_estimate():
+    assert count_tokens("") == 0
+    assert count_tokens("abcd" * 10) == 10
+
+
+def test_trim_keeps_whole_sentences():
+    text = "First sentence here. Second sentence is here. Third one."
+    assert trim_to_sentences(text, 100) == text
+    assert trim_to_sentences(text, 12) == "First sentence here. Second sentence is here."
+    assert trim_to_sentences(text, 5) == "First sentence here."
+
+
+def test_trim_falls_back_to_word_boundary():
+    text = "one two three four five six seven eight nine ten eleven twelve"
+    trimmed = trim_to_sentences(text, 5)
+    assert trimmed and text.startswith(trimmed)
+    assert count_tokens(trimmed) <= 5
+    assert not trimmed.endswith(" ")
+
+
+def test_trim_with_no_budget():
+    assert trim_to_sentences("Anything.", 0) == ""
+
+
+def test_assemble_context_fills_by_priority_within_budget():
+    budgets = [("draft", 1, 10), ("docs", 2, 100)]
+    sections = {
+        "draft": "Short draft.",
+        "docs": "Doc sentence number one. " * 20,
+    }
+    trimmed, usage = assemble_context(sections, budget=30, section_budgets=budgets)
+    assert trimmed["draft"] == "Short draft."
+    assert usage["draft"] == 3
+    assert usage["docs"] <= 27
+    assert trimmed["docs"].endswith(".")
+    assert usage["total"] == usage["draft"] + usage["docs"]
+
+
+def test_assemble_context_drops_squeezed_sections_and_passes_unknown_ones():
+    budgets = [("draft", 1, 100), ("docs", 2, 100)]
+    sections = {"draft": "x" * 380, "docs": "Some doc text. " * 10, "extra": "untouched"}
+    trimmed, usage = assemble_context(sections, budget=100, section_budgets=budgets)
+    # Only 5 tokens are left for docs, below MIN_SECTION_TOKENS, so it is dropped, not fragmented.
+    assert trimmed["docs"] == ""
+    assert trimmed["extra"] == "untouched"
+    assert usage["extra"] == count_tokens("untouched")
@@ -0,0 +1,46 @@
+import pathlib
+import re
+from types import SimpleNamespace
+
+import pytest
+
+qdrant_helpers = pytest.importorskip("qdrant_helpers")
+from qdrant_helpers import FILTERED_FIELDS, PAYLOAD_INDEXES, report_unindexed_filters  # noqa: E402
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def _filter_sites():
+    """(collection, field) for every field_condition() call, using each module's collection_name literal."""
+    sites = set()
+    for path in ROOT.glob("*.py"):
+        source = path.read_text(encoding="utf-8", errors="ignore")
+        keys = re.findall(r'field_condition\(\s*collection_name\s*,\s*"(\w+)"', source)
+        if not keys:
+            continue
+        collections = set(re.findall(r'collection_name = "(\w+)"', source))
+        assert len(collections) == 1, f"{path.name}: can't tell which collection its filters use"
+        collection = collections.pop()
+        sites.update((collection, key) for key in keys)
+    return sites
+
+
+def test_filtered_fields_cover_every_filter_site():
+    sites = _filter_sites()
+    assert sites
+    declared = {(collection, key) for collection, keys in FILTERED_FIELDS.items() for key in keys}
+    assert sites <= declared
+
+
+def test_filtered_fields_have_payload_indexes():
+    for collection, keys in FILTERED_FIELDS.items():
+        assert keys <= set(PAYLOAD_INDEXES.get(collection, {})), collection
+
+
+def test_report_checks_declared_filters_without_any_filter_built(monkeypatch):
+    # Like the memory_sync process: no filter has been built here, and no index is declared.
+    monkeypatch.setattr(qdrant_helpers, "_filtered_fields", qdrant_helpers.defaultdict(set))
+    monkeypatch.setattr(qdrant_helpers, "PAYLOAD_INDEXES", {})
+    client = SimpleNamespace(get_collection=lambda name: SimpleNamespace(payload_schema={}))
+
+    assert report_unindexed_filters(client) == {name: sorted(keys) for name, keys in FILTERED_FIELDS.items()}
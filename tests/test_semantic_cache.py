@@ -0,0 +1,65 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+suggestor = pytest.importorskip("suggestor")
+import batch  # noqa: E402
+import semantic_cache  # noqa: E402
+from semantic_cache import SemanticCache  # noqa: E402
+
+SCREENSHOT = "Prospect: I don't have time for this right now."
+DRAFT = "Totally get it, when is a better time?"
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    async def fake_encode_async(text):
+        # Same text, same vector; different texts are near-orthogonal.
+        return np.random.default_rng(sum(text.encode())).normal(size=64)
+
+    monkeypatch.setattr(semantic_cache, "encode_async", fake_encode_async)
+    monkeypatch.setattr(suggestor, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(suggestor, "reply_cache", SemanticCache())
+    return suggestor.reply_cache
+
+
+def test_hit_skips_retrieval_and_generation(monkeypatch, cache):
+    asyncio.run(cache.store_async(("team", "gpt-4o", suggestor.PROMPT_VERSION), SCREENSHOT, DRAFT, "Cached reply"))
+
+    async def fake_ocr(image):
+        return SCREENSHOT
+
+    async def must_not_run(*args, **kwargs):
+        raise AssertionError("retrieval or generation ran on a cache hit")
+
+    monkeypatch.setattr("ocr.extract_text_from_image_async", fake_ocr)
+    monkeypatch.setattr(suggestor, "get_context_for_reply_async", must_not_run)
+    monkeypatch.setattr(suggestor, "generate_suggested_reply_async", must_not_run)
+
+    item = {"id": "a", "image": "a.png", "draft": DRAFT}
+    record = asyncio.run(batch.process_item(item, "gpt-4o", "Be brief."))
+
+    assert record["status"] == "ok" and record["cached"]
+    assert record["reply"] == "Cached reply"
+    assert "context" not in record["timings"]
+
+
+def test_checked_miss_is_not_looked_up_again_but_is_stored(monkeypatch, cache):
+    async def fake_completion(label, model_name, messages, allow_downgrade=False, **kwargs):
+        return SimpleNamespace(text="Fresh reply", model=model_name), model_name
+
+    monkeypatch.setattr(suggestor.llm, "available", lambda: True)
+    monkeypatch.setattr(suggestor, "routed_completion", fake_completion)
+
+    async def scenario():
+        assert await suggestor.lookup_cached_reply_async(SCREENSHOT, DRAFT, "gpt-4o") is None
+        reply = await suggestor.generate_suggested_reply_async(
+            SCREENSHOT, DRAFT, "Be brief.", "gpt-4o", "", "", cache_checked=True
+        )
+        return reply, await suggestor.lookup_cached_reply_async(SCREENSHOT, DRAFT, "gpt-4o")
+
+    reply, cached = asyncio.run(scenario())
+    assert reply == "Fresh reply" and cached == "Fresh reply"
+    assert cache.stats == {"hits": 1, "misses": 1, "bypassed": 0, "stores": 1}
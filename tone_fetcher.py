@@ -1,17 +1,16 @@
 import os
-from uuid import uuid4
+import uuid
+from datetime import datetime, timedelta, timezone
 from qdrant_client import QdrantClient
 from qdrant_client.models import (
-    Filter, FieldCondition, MatchValue,
-    PointStruct, VectorParams, Distance
+    Filter, MatchValue, MatchAny,
+    FilterSelector, PointStruct, VectorParams, Distance
 )
 from notion_client import Client
-from vectorizer import embed_batch
-
-# ✅ Lazy-load SentenceTransformer to avoid Streamlit/Torch reload issues
-def get_model():
-    from sentence_transformers import SentenceTransformer
-    return SentenceTransformer("all-MiniLM-L6-v2")
+from qdrant_helpers import ensure_payload_indexes, field_condition, load_payload_map, upsert_in_batches
+# ✅ Shared process-wide MiniLM encoder; the tone collection is embedded with it
+# on both ingest and query so the vectors live in the same space.
+from encoder import encode, embedding_dimension, get_model
 
 # ✅ Qdrant and Notion setup
 client = QdrantClient(
@@ -23,30 +22,52 @@ collection_name = "tone_training_memory"
 notion = Client(auth=os.getenv("NOTION_API_KEY"))
 TONE_TRAINING_DB = os.getenv("NOTION_TONE_DB_ID")
 
-# ✅ Fetch tone training examples from Notion
-def fetch_tone_training_examples():
-    pages = notion.databases.query(database_id=TONE_TRAINING_DB)["results"]
+# Fixed id of the point that stores when the last successful sync started (the next run's watermark).
+SYNC_STATE_POINT_ID = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{collection_name}/sync_state"))
+# Margin for clock skew between this host and Notion; re-fetched pages are dropped by the last_edited diff.
+SYNC_WATERMARK_MARGIN = timedelta(minutes=5)
 
+# ✅ Fetch tone training examples from Notion (paginated, optionally only those edited since a watermark)
+def fetch_tone_training_examples(edited_since=None):
     examples = []
-    for page in pages:
-        props = page["properties"]
-        examples.append({
-            "id": page["id"],
-            "text": props["Story Text"]["title"][0]["plain_text"] if props["Story Text"]["title"] else "",
-            "tone": props["Tone"]["rich_text"][0]["plain_text"] if props["Tone"]["rich_text"] else "",
-            "your_message": props["Your Message"]["rich_text"][0]["plain_text"] if props["Your Message"]["rich_text"] else "",
-            "ai_message": props["AI Message"]["rich_text"][0]["plain_text"] if props["AI Message"]["rich_text"] else "",
-            "last_edited": page["last_edited_time"]
-        })
+    start_cursor = None
+    query_filter = None
+    if edited_since:
+        query_filter = {
+            "timestamp": "last_edited_time",
+            "last_edited_time": {"on_or_after": edited_since}
+        }
+
+    while True:
+        query_kwargs = {"database_id": TONE_TRAINING_DB, "page_size": 100}
+        if start_cursor:
+            query_kwargs["start_cursor"] = start_cursor
+        if query_filter:
+            query_kwargs["filter"] = query_filter
+        response = notion.databases.query(**query_kwargs)
+
+        for page in response.get("results", []):
+            props = page["properties"]
+            examples.append({
+                "id": page["id"],
+                "text": props["Story Text"]["title"][0]["plain_text"] if props["Story Text"]["title"] else "",
+                "tone": props["Tone"]["rich_text"][0]["plain_text"] if props["Tone"]["rich_text"] else "",
+                "your_message": props["Your Message"]["rich_text"][0]["plain_text"] if props["Your Message"]["rich_text"] else "",
+                "ai_message": props["AI Message"]["rich_text"][0]["plain_text"] if props["AI Message"]["rich_text"] else "",
+                "last_edited": page["last_edited_time"]
+            })
+
+        if not response.get("has_more"):
+            break
+        start_cursor = response.get("next_cursor")
     return examples
 
 # ✅ Retrieve most similar tone-matching entry from Qdrant
 def retrieve_similar_tone_example(query_text, tone, top_k=1):
-    model = get_model()
-    query_vector = model.encode(f"{query_text} — {tone}").tolist()
+    query_vector = encode(f"{query_text} — {tone}").tolist()
 
     search_filter = Filter(
-        must=[FieldCondition(key="tone", match=MatchValue(value=tone))]
+        must=[field_condition(collection_name, "tone", MatchValue(value=tone))]
     )
 
     try:
@@ -55,7 +76,7 @@ def retrieve_similar_tone_example(query_text, tone, top_k=1):
             query_vector=query_vector,
             limit=top_k,
             query_filter=search_filter,
-            with_payload=True
+            with_payload=["your_message", "tone"]
         )
         if results:
             best = results[0].payload
@@ -64,66 +85,90 @@ def retrieve_similar_tone_example(query_text, tone, top_k=1):
         print(f"⚠️ Retrieval failed: {e}")
     return None, None
 
+def _load_sync_watermark():
+    try:
+        points = client.retrieve(collection_name, ids=[SYNC_STATE_POINT_ID], with_payload=True, with_vectors=False)
+    except Exception as e:
+        print(f"⚠️ Could not read the tone sync watermark: {e}")
+        return None
+    return points[0].payload.get("last_sync_started") if points else None
+
+def _save_sync_watermark(started_at, vector_size):
+    # A unit vector: the point only carries payload, and it has no tone so tone searches never match it.
+    client.upsert(collection_name, points=[PointStruct(
+        id=SYNC_STATE_POINT_ID,
+        vector=[1.0] + [0.0] * (vector_size - 1),
+        payload={"source": "sync_state", "last_sync_started": started_at},
+    )])
+
 # ✅ Embed and upload tone training examples to Qdrant
-def embed_tone_training_qdrant():
+def embed_tone_training_qdrant(full_sync=False):
+    """
+    Incrementally syncs the Notion tone table into Qdrant.
+    Only pages edited since the last successful sync started are fetched and re-embedded;
+    pass full_sync=True to re-check the whole table. The watermark is saved only after
+    every changed page has been written, so a failed run is retried in full next time.
+    """
+    started_at = (datetime.now(timezone.utc) - SYNC_WATERMARK_MARGIN).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    vector_size = embedding_dimension()
     try:
-        client.get_collection(collection_name)
+        existing_size = client.get_collection(collection_name).config.params.vectors.size
+        if existing_size != vector_size:
+            # Older collections were embedded with 1536-d OpenAI vectors; rebuild from Notion.
+            print(f"⚠️ {collection_name} has {existing_size}-d vectors, encoder is {vector_size}-d. Recreating.")
+            raise ValueError("vector size mismatch")
     except:
         client.recreate_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
+            vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE),
         )
-        client.create_payload_index(
-            collection_name=collection_name,
-            field_name="page_id",
-            field_schema="keyword"
-        )
-
-    all_examples = fetch_tone_training_examples()
-    print(f"🔎 Found {len(all_examples)} tone examples from Notion")
-
-    to_embed = []
-    for ex in all_examples:
-        try:
-            existing = client.scroll(
-                collection_name=collection_name,
-                scroll_filter=Filter(
-                    must=[FieldCondition(key="page_id", match=MatchValue(value=ex["id"]))]
-                ),
-                limit=1
-            )
-            existing_payload = existing[0][0].payload if existing[0] else None
-        except Exception as e:
-            print(f"⚠️ Scroll failed for tone entry {ex['id']}: {e}")
-            existing_payload = None
-
-        if not existing_payload or existing_payload.get("last_edited") != ex["last_edited"]:
-            to_embed.append(ex)
+    ensure_payload_indexes(client, collection_name)
 
+    # One bulk scroll gives every synced page and its last edit.
+    try:
+        synced = load_payload_map(client, collection_name, "page_id", "last_edited")
+    except Exception as e:
+        print(f"⚠️ Could not load synced tone entries, doing a full sync: {e}")
+        synced = {}
+    watermark = None if full_sync else _load_sync_watermark()
+    # Notion filters at minute granularity, so on_or_after may return a few already-synced pages;
+    # the last_edited diff below drops them.
+    candidates = fetch_tone_training_examples(edited_since=watermark)
+    print(f"🔎 Found {len(candidates)} tone examples from Notion edited since {watermark or 'the beginning'}")
+
+    to_embed = [ex for ex in candidates if synced.get(ex["id"]) != ex["last_edited"]]
     print(f"🧐 {len(to_embed)} new or updated tone entries to embed")
+    if not to_embed:
+        _save_sync_watermark(started_at, vector_size)
+        print("✅ Tone training sync complete. Nothing changed.")
+        return
+
+    vectors = encode([f"{ex['text']} — {ex['tone']}" for ex in to_embed]).tolist()
+    points = [
+        PointStruct(
+            id=ex["id"],  # Notion page ids are UUIDs, so updates overwrite in place
+            vector=vec,
+            payload={
+                "source": "notion",
+                "page_id": ex["id"],
+                "last_edited": ex["last_edited"],
+                "tone": ex["tone"],
+                "your_message": ex["your_message"]
+            }
+        )
+        for ex, vec in zip(to_embed, vectors)
+    ]
 
-    batch_size = 20
-    for i in range(0, len(to_embed), batch_size):
-        batch = to_embed[i:i+batch_size]
-        texts = [f"{ex['text']} — {ex['tone']}" for ex in batch]
-        vectors = embed_batch(texts)
-
-        points = [
-            PointStruct(
-                id=str(uuid4()),
-                vector=vec,
-                payload={
-                    "source": "notion",
-                    "page_id": ex["id"],
-                    "last_edited": ex["last_edited"],
-                    "tone": ex["tone"],
-                    "your_message": ex["your_message"]
-                }
+    # Points written before ids were keyed by page id have random ids; drop them before re-inserting.
+    updated_ids = [ex["id"] for ex in to_embed if ex["id"] in synced]
+    if updated_ids:
+        client.delete(
+            collection_name=collection_name,
+            points_selector=FilterSelector(
+                filter=Filter(must=[field_condition(collection_name, "page_id", MatchAny(any=updated_ids))])
             )
-            for ex, vec in zip(batch, vectors)
-        ]
-
-        client.upsert(collection_name=collection_name, points=points)
-        print(f"✅ Uploaded batch {i // batch_size + 1} with {len(points)} examples")
+        )
 
+    upsert_in_batches(client, collection_name, points)
+    _save_sync_watermark(started_at, vector_size)
     print(f"✅ Tone training sync complete. {len(to_embed)} examples embedded.")
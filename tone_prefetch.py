@@ -0,0 +1,128 @@
+"""
+Speculative tone variants for the suggested reply.
+
+Opt-in (TONE_PREFETCH=true). When a reply is shown, the most-used tones are generated
+concurrently in the background and cached against the reply's hash, so "Regenerate with
+Tone" is usually instant.
+Which tones are prefetched follows process-wide usage counts, and speculative calls are
+capped per hour so prefetching can't run away with spend.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import TTLCache
+
+from metrics import CACHE_EVENTS, QUEUE_DEPTH
+from suggestor import generate_adjusted_tone
+from tracing import span, wrap
+
+TONE_PREFETCH_ENABLED = os.getenv("TONE_PREFETCH", "false").lower() == "true"
+TONE_PREFETCH_COUNT = int(os.getenv("TONE_PREFETCH_COUNT", "2"))
+TONE_PREFETCH_MAX_CALLS_PER_HOUR = int(os.getenv("TONE_PREFETCH_MAX_CALLS_PER_HOUR", "120"))
+# Used until real usage has been recorded.
+DEFAULT_TONE_PRIORITY = ["Casual", "Empathetic", "Professional", "Direct", "Inspiring"]
+
+_variants = TTLCache(maxsize=512, ttl=3600)
+_inflight = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tone-prefetch")
+_speculative_calls = deque()
+_tone_usage = Counter()
+PREFETCH_STATS = {"prefetched": 0, "hits": 0, "waited": 0, "misses": 0, "skipped_budget": 0}
+CACHE_EVENTS.add_source(lambda: [({"cache": "tone_prefetch", "event": k}, v) for k, v in PREFETCH_STATS.items()])
+QUEUE_DEPTH.add_source(lambda: [({"queue": "tone_prefetch"}, len(_inflight))])
+
+
+def _key(reply, tone, model_name):
+    reply_hash = hashlib.sha256(reply.encode("utf-8")).hexdigest()
+    return reply_hash, tone.lower(), model_name or ""
+
+
+def record_tone_use(tone):
+    if tone and tone.lower() != "none":
+        with _lock:
+            _tone_usage[tone] += 1
+
+
+def select_tones_to_prefetch(tone_options, count=TONE_PREFETCH_COUNT):
+    """Most-used tones first, then the default priority, limited to available options."""
+    options = [t for t in tone_options if t and t.lower() != "none"]
+    with _lock:
+        ranked = [tone for tone, _ in _tone_usage.most_common() if tone in options]
+    ranked += [t for t in DEFAULT_TONE_PRIORITY if t in options and t not in ranked]
+    ranked += [t for t in options if t not in ranked]
+    return ranked[:count]
+
+
+def _take_speculative_budget_locked():
+    now = time.time()
+    while _speculative_calls and now - _speculative_calls[0] > 3600:
+        _speculative_calls.popleft()
+    if len(_speculative_calls) >= TONE_PREFETCH_MAX_CALLS_PER_HOUR:
+        return False
+    _speculative_calls.append(now)
+    return True
+
+
+def _run_and_cache(key, reply, tone, model_name):
+    try:
+        with span("tone.prefetch", tone=tone):
+            adjusted = generate_adjusted_tone(reply, tone, model_name)
+        if adjusted and adjusted != reply:
+            with _lock:
+                _variants[key] = adjusted
+        return adjusted
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+
+
+def prefetch_tones_async(reply, tone_options, model_name=None):
+    """Starts background generation of the likeliest tones for reply. Returns the tones started."""
+    if not TONE_PREFETCH_ENABLED or not reply:
+        return []
+    started = []
+    for tone in select_tones_to_prefetch(tone_options):
+        key = _key(reply, tone, model_name)
+        with _lock:
+            if key in _variants or key in _inflight:
+                continue
+            if not _take_speculative_budget_locked():
+                PREFETCH_STATS["skipped_budget"] += 1
+                break
+            _inflight[key] = _executor.submit(wrap(_run_and_cache), key, reply, tone, model_name)
+            PREFETCH_STATS["prefetched"] += 1
+        started.append(tone)
+    if started:
+        print(f"Tone prefetch: started {started} {PREFETCH_STATS}")
+    return started
+
+
+def get_adjusted_tone(reply, tone, model_name=None):
+    """Returns the tone variant from cache, waits for an in-flight prefetch, or generates it now."""
+    key = _key(reply, tone, model_name)
+    with _lock:
+        cached = _variants.get(key)
+        future = _inflight.get(key)
+        if cached:
+            PREFETCH_STATS["hits"] += 1
+        elif future:
+            PREFETCH_STATS["waited"] += 1
+        else:
+            PREFETCH_STATS["misses"] += 1
+    if cached:
+        return cached
+    if future:
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Tone prefetch failed, generating directly: {e}")
+    adjusted = generate_adjusted_tone(reply, tone, model_name)
+    if adjusted and adjusted != reply:
+        with _lock:
+            _variants[key] = adjusted
+    return adjusted
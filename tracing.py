@@ -0,0 +1,296 @@
+"""
+Lightweight request tracing: request IDs, nested spans and pluggable exporters.
+
+    with start_trace("huddle_play.generate") as root:      # new request id (root.trace_id)
+        with span("ocr", bytes=len(image)) as s:
+            text = extract(...)
+            s.set(chars=len(text))
+
+The current span lives in a contextvar, so nesting follows asyncio tasks automatically.
+Work handed to other threads keeps its parent if submitted through wrap() (the shared
+async loop, the LLM backend, candidate pool and tone prefetch already do this).
+
+Exporters are chosen with TRACING_EXPORTERS (comma-separated, default "ring"):
+  ring   - in-memory ring buffer of recent spans (TRACE_RING_SIZE), read via recent_traces()
+  log    - one JSON line per span to stdout, or to TRACE_LOG_PATH
+  otlp   - OTLP/JSON lines (one ExportTraceServiceRequest per span) to TRACE_OTLP_PATH
+Set TRACING_EXPORTERS=none to disable tracing entirely.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+TRACING_EXPORTERS = os.getenv("TRACING_EXPORTERS", "ring").lower()
+TRACE_RING_SIZE = int(os.getenv("TRACE_RING_SIZE", "2000"))
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+TRACE_OTLP_PATH = os.getenv("TRACE_OTLP_PATH", "traces.otlp.jsonl")
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "huddle-assistant")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attributes", "status", "error", "thread")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "error": self.error,
+            "thread": self.thread,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        return self
+
+
+_NOOP = _NoopSpan()
+
+
+# ====== EXPORTERS ======
+
+class RingBufferExporter:
+    def __init__(self, size=TRACE_RING_SIZE):
+        self._spans = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def traces(self, limit=50):
+        """Most recent traces first: [{"trace_id", "root", "spans": [span dicts]}]."""
+        grouped = OrderedDict()
+        for s in self.spans():
+            grouped.setdefault(s.trace_id, []).append(s)
+        traces = []
+        for trace_id, spans in reversed(grouped.items()):
+            spans.sort(key=lambda s: s.start_ns)
+            root = next((s for s in spans if s.parent_id is None), spans[0])
+            traces.append({"trace_id": trace_id, "root": root.to_dict(), "spans": [s.to_dict() for s in spans]})
+            if len(traces) >= limit:
+                break
+        return traces
+
+
+class JsonLogExporter:
+    def __init__(self, path=TRACE_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps({"type": "span", **span.to_dict()}, default=str)
+        with self._lock:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                print(line, file=sys.stdout, flush=True)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPFileExporter:
+    """Writes spans in the OTLP/JSON encoding read by the OpenTelemetry collector's file receiver."""
+
+    def __init__(self, path=TRACE_OTLP_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "huddle.tracing"}, "spans": [otlp_span]}],
+        }]}
+        line = json.dumps(request, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def _build_exporters(names):
+    exporters = []
+    for name in [n.strip() for n in names.split(",") if n.strip()]:
+        if name == "none":
+            return []
+        if name == "ring":
+            exporters.append(RingBufferExporter())
+        elif name == "log":
+            exporters.append(JsonLogExporter())
+        elif name == "otlp":
+            exporters.append(OTLPFileExporter())
+        else:
+            print(f"⚠️ Unknown tracing exporter '{name}' ignored.")
+    return exporters
+
+
+exporters = _build_exporters(TRACING_EXPORTERS)
+ring_buffer = next((e for e in exporters if isinstance(e, RingBufferExporter)), None)
+
+
+def add_exporter(exporter):
+    exporters.append(exporter)
+
+
+def enabled():
+    return bool(exporters)
+
+
+def _export(span):
+    for exporter in list(exporters):
+        try:
+            exporter.export(span)
+        except Exception as e:
+            print(f"⚠️ Trace exporter {type(exporter).__name__} failed: {e}")
+
+
+# ====== SPANS ======
+
+class _SpanContext:
+    def __init__(self, name, attributes, new_trace=False, trace_id=None):
+        self.name = name
+        self.attributes = attributes
+        self.new_trace = new_trace
+        self.trace_id = trace_id
+        self.span = None
+        self._token = None
+
+    def __enter__(self):
+        if not exporters:
+            return _NOOP
+        parent = _current_span.get()
+        if self.new_trace or parent is None:
+            self.span = Span(self.name, self.trace_id or secrets.token_hex(16), None, self.attributes)
+        else:
+            self.span = Span(self.name, parent.trace_id, parent.span_id, self.attributes)
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is None:
+            return False
+        self.span.end_ns = time.time_ns()
+        if exc is not None:
+            self.span.status = "error"
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        _export(self.span)
+        return False
+
+
+def span(name, **attributes):
+    """Child span of the current span (or a new trace if there is none)."""
+    return _SpanContext(name, attributes)
+
+
+def start_trace(name, request_id=None, **attributes):
+    """Root span of a new request; its trace_id is the request id."""
+    return _SpanContext(name, attributes, new_trace=True, trace_id=request_id)
+
+
+def current_span():
+    return _current_span.get() or _NOOP
+
+
+def current_request_id():
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def traced(name=None, root=False):
+    """Decorator form of span()/start_trace() for sync and async functions."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+        open_span = start_trace if root else span
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with open_span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with open_span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def wrap(fn):
+    """Binds fn to the caller's context so spans it opens on another thread nest under the current span."""
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return wrapper
+
+
+def recent_traces(limit=50):
+    return ring_buffer.traces(limit) if ring_buffer else []
@@ -1,5 +1,6 @@
 # utils/state.py
 
+import uuid
 import streamlit as st
 
 def init_session_state():
@@ -18,14 +19,28 @@ def init_session_state():
         "huddle_context_for_regen": None,
         "doc_context_for_regen": None,
         "principles_for_regen": None,
+        "regen_candidate_pool": None,
         "uploader_key": 0,
         "uploader_key_tab2": 0,
         "conversation_starters": None,
         "last_uploaded_story_name": None,
         "scroll_to_story_text": False,
+        "story_assets": None,
         "user_edit": "",
         "draft_feedback": [],
+        "session_user_id": uuid.uuid4().hex,
     }
     for key, default in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = default
+
+def cache_user_id():
+    """
+    Stable identity for per-user caching: the signed-in viewer's email when Streamlit auth
+    provides one (st.user), else this session's random id, which makes the scope per-session.
+    """
+    try:
+        email = st.user.get("email")
+    except Exception:
+        email = None
+    return email or st.session_state.get("session_user_id")
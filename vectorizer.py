@@ -1,14 +1,26 @@
 import openai
 import os
+from openai import AsyncOpenAI
+from async_runtime import loop_local, run_sync
+from metrics import EMBED_LATENCY, EMBED_REQUESTS, record_embedding_usage, track
+from tracing import span
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 #======may need to remove?
-def embed_batch(texts, model="text-embedding-3-small"):
-    response = openai.embeddings.create(
-        model=model,
-        input=texts
-    )
+async def embed_batch_async(texts, model="text-embedding-3-small"):
+    client = loop_local("openai-embeddings", lambda: AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+    with span("embed", model=model, inputs=len(texts)) as s, track(EMBED_REQUESTS, EMBED_LATENCY, model=model):
+        response = await client.embeddings.create(
+            model=model,
+            input=texts
+        )
+        tokens = response.usage.prompt_tokens if response.usage else 0
+        s.set(prompt_tokens=tokens)
+    record_embedding_usage(model, len(texts), tokens)
     return [r.embedding for r in response.data]
 
+def embed_batch(texts, model="text-embedding-3-small"):
+    return run_sync(embed_batch_async(texts, model))
+
 def embed_single(text, model="text-embedding-3-small"):
     return embed_batch([text])[0]